@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+"""
+File: mock_docker_engine.py
+Author: 4ndr0666
+Desc: Offline check for vacuum.py's Docker/Podman cleanup (clear_docker_images).
+======================================== // MOCK_DOCKER_ENGINE.PY //
+
+Serves a fake engine API on a unix socket: /system/df, container inspect
+and DELETE for containers, images and volumes. Like the real engine, an
+image still used by a container cannot be deleted (HTTP 409).
+
+    ./mock_docker_engine.py                  run the planner against the fixture
+    ./mock_docker_engine.py --serve SOCKET   only serve, for manual runs with
+                                             DOCKER_HOST=unix://SOCKET
+"""
+
+import argparse
+import http.server
+import json
+import os
+import re
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+DAY = 86400
+
+
+def iso(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%S.123456789Z", time.gmtime(ts))
+
+
+def fixture(now=None):
+    """
+    Engine state exercising every retention rule. EXPECTED lists what the
+    planner must remove with the default rules (2 per repo, 7 days) and
+    remove_volumes=True.
+    """
+    now = now or time.time()
+    images = [
+        # app: four versions; the two newest are kept per repo.
+        {"Id": "sha256:app4", "RepoTags": ["app:4"], "Created": int(now - 30 * DAY), "Size": 400, "SharedSize": 100},
+        {"Id": "sha256:app3", "RepoTags": ["app:3"], "Created": int(now - 40 * DAY), "Size": 400, "SharedSize": 100},
+        {"Id": "sha256:app2", "RepoTags": ["app:2"], "Created": int(now - 50 * DAY), "Size": 400, "SharedSize": 100},
+        {"Id": "sha256:app1", "RepoTags": ["app:1"], "Created": int(now - 60 * DAY), "Size": 400, "SharedSize": 100},
+        # Registry with a port: the repo is "registry:5000/tool".
+        {"Id": "sha256:tool1", "RepoTags": ["registry:5000/tool:1"], "Created": int(now - 90 * DAY), "Size": 50, "SharedSize": -1},
+        # Dangling, old: removed.
+        {"Id": "sha256:dangling", "RepoTags": ["<none>:<none>"], "Created": int(now - 20 * DAY), "Size": 70, "SharedSize": 0},
+        # Dangling but recent: kept.
+        {"Id": "sha256:fresh", "RepoTags": None, "Created": int(now - 1 * DAY), "Size": 80, "SharedSize": 0},
+        # Untagged, only used by a container that ran yesterday: kept.
+        {"Id": "sha256:usedbase", "RepoTags": [], "Created": int(now - 100 * DAY), "Size": 90, "SharedSize": 0},
+        # Untagged, used by an old stopped container: removed after it.
+        {"Id": "sha256:oldbase", "RepoTags": [], "Created": int(now - 100 * DAY), "Size": 60, "SharedSize": 0},
+    ]
+    containers = [
+        {"Id": "c-running", "Names": ["/web"], "ImageID": "sha256:app1", "State": "running",
+         "Created": int(now - 60 * DAY), "SizeRw": 5},
+        {"Id": "c-recent", "Names": ["/job"], "ImageID": "sha256:usedbase", "State": "exited",
+         "Created": int(now - 90 * DAY), "SizeRw": 6, "_finished": iso(now - 1 * DAY)},
+        {"Id": "c-old", "Names": ["/old"], "ImageID": "sha256:oldbase", "State": "exited",
+         "Created": int(now - 90 * DAY), "SizeRw": 7, "_finished": iso(now - 30 * DAY)},
+        {"Id": "c-never", "Names": ["/never"], "ImageID": "sha256:app2", "State": "created",
+         "Created": int(now - 45 * DAY), "SizeRw": 0, "_finished": "0001-01-01T00:00:00Z"},
+    ]
+    volumes = [
+        {"Name": "orphan", "CreatedAt": iso(now - 30 * DAY), "UsageData": {"RefCount": 0, "Size": 300}},
+        {"Name": "attached", "CreatedAt": iso(now - 30 * DAY), "UsageData": {"RefCount": 1, "Size": 200}},
+        {"Name": "new", "CreatedAt": iso(now - 1 * DAY), "UsageData": {"RefCount": 0, "Size": 100}},
+    ]
+    return {"images": images, "containers": containers, "volumes": volumes}
+
+
+# app1 is pinned by the running container and tool1 is the newest of its
+# repo; app2 and oldbase only become deletable once their containers are.
+EXPECTED = {
+    "containers": {"c-old", "c-never"},
+    "images": {"sha256:app2", "sha256:dangling", "sha256:oldbase"},
+    "volumes": {"orphan"},
+}
+EXPECTED_BYTES = (7 + 0) + (300 + 70 + 60) + 300  # containers, images, volumes
+
+
+class MockEngine:
+    """Engine state plus the requests it has seen."""
+
+    def __init__(self, state):
+        self.state = state
+        self.lock = threading.Lock()
+        self.deleted = {"containers": [], "images": [], "volumes": []}
+
+    def df(self):
+        with self.lock:
+            return {
+                "Images": self.state["images"],
+                "Containers": [
+                    {k: v for k, v in c.items() if not k.startswith("_")}
+                    for c in self.state["containers"]
+                ],
+                "Volumes": self.state["volumes"],
+            }
+
+    def inspect(self, container_id):
+        with self.lock:
+            for c in self.state["containers"]:
+                if c["Id"] == container_id:
+                    return {"Id": c["Id"], "State": {"FinishedAt": c.get("_finished", "")}}
+        return None
+
+    def delete(self, kind, obj_id):
+        """Returns an HTTP status like the engine would."""
+        key = "Name" if kind == "volumes" else "Id"
+        with self.lock:
+            objs = self.state[kind]
+            match = [o for o in objs if o[key] == obj_id]
+            if not match:
+                return 404
+            if kind == "images" and any(c["ImageID"] == obj_id for c in self.state["containers"]):
+                return 409
+            if kind == "containers" and match[0]["State"] == "running":
+                return 409
+            objs.remove(match[0])
+            self.deleted[kind].append(obj_id)
+        return 204
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        return "unix"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/system/df":
+            return self._reply(200, self.server.engine.df())
+        match = re.fullmatch(r"/containers/([^/]+)/json", path)
+        if match:
+            info = self.server.engine.inspect(match.group(1))
+            if info is None:
+                return self._reply(404, {"message": "No such container"})
+            return self._reply(200, info)
+        self._reply(404, {"message": f"page not found: {path}"})
+
+    def do_DELETE(self):
+        match = re.fullmatch(r"/(containers|images|volumes)/([^/?]+)", self.path.split("?", 1)[0])
+        if not match:
+            return self._reply(404, {"message": "page not found"})
+        status = self.server.engine.delete(match.group(1), match.group(2))
+        if status == 204:
+            return self._reply(204)
+        self._reply(status, {"message": f"cannot remove {match.group(2)}"})
+
+
+class MockEngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, engine):
+        self.engine = engine
+        super().__init__(socket_path, _Handler)
+
+
+def serve(socket_path, engine):
+    """Start the server on a background thread; returns it (call shutdown())."""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = MockEngineServer(socket_path, engine)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check():
+    """Plan, dry-run and execute against the fixture; returns failures."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import vacuum
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "engine.sock")
+        engine = MockEngine(fixture())
+        server = serve(socket_path, engine)
+        try:
+            plan = vacuum.plan_docker_reclaim(
+                vacuum.docker_inventory(socket_path), remove_volumes=True
+            )
+            for kind, expected in EXPECTED.items():
+                planned = {obj_id for obj_id, _, _ in plan[kind]}
+                if planned != expected:
+                    failures.append(f"plan {kind}: got {sorted(planned)}, want {sorted(expected)}")
+            if plan["bytes"] != EXPECTED_BYTES:
+                failures.append(f"plan bytes: got {plan['bytes']}, want {EXPECTED_BYTES}")
+
+            os.environ["DOCKER_HOST"] = f"unix://{socket_path}"
+            vacuum.clear_docker_images(dry_run=True, remove_volumes=True)
+            if any(engine.deleted.values()):
+                failures.append(f"dry run deleted {engine.deleted}")
+
+            reclaimed = vacuum.execute_docker_reclaim(plan, socket_path)
+            for kind, expected in EXPECTED.items():
+                if set(engine.deleted[kind]) != expected:
+                    failures.append(
+                        f"deleted {kind}: got {sorted(engine.deleted[kind])}, want {sorted(expected)}"
+                    )
+            if reclaimed != EXPECTED_BYTES:
+                failures.append(f"reclaimed: got {reclaimed}, want {EXPECTED_BYTES}")
+        finally:
+            server.shutdown()
+            server.server_close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Docker engine for vacuum.py.")
+    parser.add_argument("--serve", metavar="SOCKET", help="serve the fixture until interrupted")
+    args = parser.parse_args()
+    if args.serve:
+        server = serve(args.serve, MockEngine(fixture()))
+        print(f"Mock engine on {args.serve}; DOCKER_HOST=unix://{args.serve}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            server.server_close()
+            os.unlink(args.serve)
+        return 0
+    failures = check()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("FAIL" if failures else "OK: plan, dry run and reclaim match the fixture")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+"""
+File: pkgverify.py
+Author: 4ndr0666
+Desc: mtree verification worker for vacuum.py's file integrity check.
+======================================== // PKGVERIFY.PY //
+
+Kept apart from vacuum.py so the process-pool workers only import this
+file: nothing here runs at import time (no log files, no directories).
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import stat
+
+
+def unescape_mtree_path(raw):
+    """Decode libarchive mtree octal escapes (\\ooo) in a path."""
+    decoded = re.sub(rb"\\([0-7]{3})", lambda m: bytes([int(m.group(1), 8)]), raw.encode("latin-1"))
+    return decoded.decode("utf-8", "surrogateescape")
+
+
+def parse_mtree(mtree_path):
+    """
+    Yield (path, attrs) for each entry of a pacman local-DB mtree file,
+    applying /set defaults. Package metadata (./.PKGINFO etc.) is skipped.
+    """
+    defaults = {}
+    with gzip.open(mtree_path, "rt", encoding="latin-1") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            if fields[0] == "/set":
+                defaults.update(kv.split("=", 1) for kv in fields[1:] if "=" in kv)
+                continue
+            if fields[0] == "/unset":
+                for key in fields[1:]:
+                    defaults.pop(key, None)
+                continue
+            if not fields[0].startswith("./") or fields[0].startswith("./."):
+                continue
+            attrs = dict(defaults)
+            attrs.update(kv.split("=", 1) for kv in fields[1:] if "=" in kv)
+            yield "/" + unescape_mtree_path(fields[0][2:]), attrs
+
+
+def read_local_desc(pkg_dir):
+    """Return (name, backup_paths) from a pacman local-DB desc file."""
+    name = os.path.basename(pkg_dir).rsplit("-", 2)[0]
+    backup = set()
+    section = None
+    with open(os.path.join(pkg_dir, "desc"), "r", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("%") and line.endswith("%"):
+                section = line
+            elif line and section == "%NAME%":
+                name = line
+            elif line and section == "%BACKUP%":
+                backup.add("/" + line.split("\t", 1)[0])
+    return name, backup
+
+
+def sha256_file(path):
+    """Stream a file through sha256."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_package_mtree(job):
+    """
+    Process-pool worker: verify one package against its mtree.
+    job is (pkg_dir, deep, previous_state). Every file is lstat'ed; size,
+    mode and mtime are compared first and sha256 is computed only for files
+    whose size or mtime disagree. When the mtree and the stat fingerprint of
+    all files match the previous run, the previous result is reused without
+    hashing anything. Returns (name, state, issues); issues are (kind, path).
+    """
+    pkg_dir, deep, previous = job
+    name, backup = read_local_desc(pkg_dir)
+    mtree_path = os.path.join(pkg_dir, "mtree")
+    mtree_mtime = os.stat(mtree_path).st_mtime_ns
+    entries = []
+    fingerprint = hashlib.sha1()
+    for path, attrs in parse_mtree(mtree_path):
+        try:
+            st = os.lstat(path)
+            fingerprint.update(
+                f"{path}\0{st.st_mode}\0{st.st_size}\0{st.st_mtime_ns}\0{st.st_ino}\0"
+                f"{st.st_uid}\0{st.st_gid}\n".encode("utf-8", "surrogateescape")
+            )
+        except OSError:
+            st = None
+            fingerprint.update(f"{path}\0missing\n".encode("utf-8", "surrogateescape"))
+        entries.append((path, attrs, st))
+    state = {"mtree": mtree_mtime, "deep": deep, "fingerprint": fingerprint.hexdigest()}
+    if (
+        previous
+        and previous.get("mtree") == mtree_mtime
+        and previous.get("fingerprint") == state["fingerprint"]
+        and previous.get("deep", False) >= deep
+    ):
+        state["deep"] = previous.get("deep", False)
+        state["issues"] = previous.get("issues", [])
+        issues = [tuple(i) for i in state["issues"]]
+        if not deep:
+            issues = [i for i in issues if i[0] == "missing"]
+        return name, state, issues
+    issues = []
+    for path, attrs, st in entries:
+        if st is None:
+            issues.append(("missing", path))
+            continue
+        if not deep:
+            continue
+        kind = attrs.get("type", "file")
+        if kind == "dir":
+            if not stat.S_ISDIR(st.st_mode):
+                issues.append(("type", path))
+            continue
+        if kind == "link":
+            if not stat.S_ISLNK(st.st_mode):
+                issues.append(("type", path))
+            elif "link" in attrs and os.readlink(path) != unescape_mtree_path(attrs["link"]):
+                issues.append(("modified", path))
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            issues.append(("type", path))
+            continue
+        if path in backup:
+            continue
+        if "mode" in attrs and stat.S_IMODE(st.st_mode) != int(attrs["mode"], 8):
+            issues.append(("mode", path))
+        if ("uid" in attrs and st.st_uid != int(attrs["uid"])) or (
+            "gid" in attrs and st.st_gid != int(attrs["gid"])
+        ):
+            issues.append(("owner", path))
+        size_ok = "size" not in attrs or st.st_size == int(attrs["size"])
+        time_ok = "time" not in attrs or int(st.st_mtime) == int(float(attrs["time"]))
+        if size_ok and time_ok:
+            continue
+        expected = attrs.get("sha256digest")
+        try:
+            if expected and sha256_file(path) != expected:
+                issues.append(("modified", path))
+            elif not size_ok:
+                issues.append(("modified", path))
+            else:
+                issues.append(("mtime", path))
+        except OSError:
+            issues.append(("unreadable", path))
+    state["issues"] = issues
+    return name, state, issues
@@ -6,38 +6,73 @@ Date: 12-13-24
 Desc: Arch Linux Maintenance Script (Unified Multi-Tier Audit & Safe Execution)
 ======================================== // VACUUM.PY //
 """
+import argparse
+import asyncio
+import base64
+import collections
+import cProfile
+import concurrent.futures
+import ctypes
 import datetime
+import difflib
+import errno
+import fnmatch
+import functools
+import gzip
+import hashlib
+import hmac
+import http.client
 import itertools
 import json
 import logging
+import multiprocessing
 import os
 import pexpect
 import pwd
+import queue
 import re
 import select
+import selectors
 import shutil
 import socket
+import sqlite3
+import stat
+import struct
 import subprocess
 import sys
+import tarfile
 import tempfile
 import threading
 import time
-from contextlib import contextmanager
+import types
+from contextlib import closing, contextmanager, redirect_stdout
+
+import pkgverify
 ############################
 # CONFIGURABLE PATHS/LOGS #
 ############################
 XDG_DATA_HOME = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
 LOG_BASE_DIR = os.path.join(XDG_DATA_HOME, "logs")
-os.makedirs(LOG_BASE_DIR, exist_ok=True)
+XDG_CACHE_HOME = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+# Rebuildable caches (ELF dependency records, indexes); safe to delete.
+CACHE_BASE_DIR = os.path.join(XDG_CACHE_HOME, "vacuum")
 log_file_path = os.path.join(
     LOG_BASE_DIR,
     datetime.datetime.now().strftime("%Y%m%d_%H%M%S_system_maintenance.log"),
 )
-logging.basicConfig(
-    filename=log_file_path,
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+def setup_logging():
+    """
+    Create the log/cache dirs and open this run's log file. Called from
+    main() rather than at import, so process-pool workers (which re-import
+    this script as __mp_main__) do not each create an empty log.
+    """
+    os.makedirs(LOG_BASE_DIR, exist_ok=True)
+    os.makedirs(CACHE_BASE_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=log_file_path,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
 ############################
 # SPINNER / COLORS / UTILS #
 ############################
@@ -47,6 +82,9 @@ SPINNER_STYLES = {
     "arrows": "←↖↑↗→↘↓↙",
 }
 DEFAULT_SPINNER_STYLE = SPINNER_STYLES["dots"]
+# Set while tasks run concurrently (run_all_tasks); several spinners writing
+# '\r' to the same tty would garble each other's output.
+_SPINNER_SUPPRESSED = threading.Event()
 @contextmanager
 def spinning_spinner(symbols=DEFAULT_SPINNER_STYLE, speed=0.1):
     """
@@ -54,6 +92,9 @@ def spinning_spinner(symbols=DEFAULT_SPINNER_STYLE, speed=0.1):
     The spinner automatically stops when the context is exited.
     IMPORTANT: Only use this when there is no user input prompt expected.
     """
+    if _SPINNER_SUPPRESSED.is_set():
+        yield
+        return
     spinner_running = threading.Event()
     spinner_running.set()
     spinner_symbols = itertools.cycle(symbols)
@@ -101,7 +142,7 @@ def execute_command(command, error_message=None):
     is logged as a warning, not treated as a failure.
     """
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = timed_run(command, capture_output=True, text=True, check=True)
         logging.info(result.stdout)
         if result.stderr:
             logging.warning(result.stderr)
@@ -121,7 +162,11 @@ def prompt_with_timeout(
     """
     Prompt the user for input with a timeout and default value.
     If persistent=True, it won't time out and will wait until user response.
+    In headless mode nothing is read and the default is returned.
     """
+    if is_headless():
+        logging.info(f"headless: '{prompt.strip()}' -> {default}")
+        return default
     if persistent:
         while True:
             user_input = input(prompt).strip()
@@ -146,6 +191,1369 @@ def prompt_with_timeout(
             log_and_print(f"{FAILURE} Error reading input: {str(e)}", "error")
             return default
 ###################################
+# POLICY
+###################################
+XDG_CONFIG_HOME = os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config"))
+POLICY_FILE = os.path.join(XDG_CONFIG_HOME, "vacuum", "policy.json")
+# Loaded policy and run mode. Rules are tried in order, first match wins:
+#   {"headless": false,
+#    "rules": [{"task": "clean_old_kernels", "match": "*-lts", "action": "n"},
+#              {"task": "handle_pacnew_pacsave", "match": "/etc/pacman.d/*", "action": "r"},
+#              {"task": "*", "match": "*", "action": "n"}]}
+# "task" is the task function name, "match" a glob over the item the task is
+# asking about (path, package, unit, kernel version or a fixed question id),
+# and "action" the answer that would have been typed at the prompt.
+_POLICY = {"rules": [], "headless": False, "path": None}
+def load_policy(path=None, headless=None):
+    """
+    Load the policy file (POLICY_FILE by default; a missing file is an empty
+    policy). headless=True makes every unanswered prompt take its default.
+    """
+    path = path or POLICY_FILE
+    rules = []
+    file_headless = False
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        rules = [
+            rule for rule in data.get("rules", [])
+            if isinstance(rule, dict) and "action" in rule
+        ]
+        file_headless = bool(data.get("headless", False))
+        log_and_print(f"{INFO} Loaded {len(rules)} policy rule(s) from {path}", "info")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError) as e:
+        log_and_print(f"{FAILURE} Ignoring unreadable policy {path}: {e}", "error")
+    _POLICY["rules"] = rules
+    _POLICY["path"] = path
+    _POLICY["headless"] = file_headless if headless is None else headless
+def is_headless():
+    return _POLICY["headless"]
+def policy_lookup(task, item):
+    """Answer from the first rule matching (task, item), or None."""
+    for rule in _POLICY["rules"]:
+        if fnmatch.fnmatchcase(task, rule.get("task", "*")) and fnmatch.fnmatchcase(
+            str(item), rule.get("match", "*")
+        ):
+            return str(rule["action"]).strip()
+    return None
+def policy_decide(task, item, prompt, default="n"):
+    """
+    Decide one prompt: policy rule first, then the default when headless,
+    otherwise ask. Answers are returned lower-cased.
+    """
+    action = policy_lookup(task, item)
+    if action is not None:
+        logging.info(f"policy: {task} {item} -> {action}")
+        return action.lower()
+    if is_headless():
+        logging.info(f"policy: {task} {item} -> {default} (headless default)")
+        return default.lower()
+    return prompt_with_timeout(prompt, persistent=True).lower()
+def policy_decide_all(task, items, prompt, default="n"):
+    """
+    Decide a whole candidate set at once: items covered by a rule get the
+    rule's answer, and everything else shares a single prompt (or the
+    default when headless). Returns {item: answer}.
+    """
+    decisions = {}
+    undecided = []
+    for item in items:
+        action = policy_lookup(task, item)
+        if action is None:
+            undecided.append(item)
+        else:
+            logging.info(f"policy: {task} {item} -> {action}")
+            decisions[item] = action.lower()
+    if undecided:
+        if is_headless():
+            logging.info(f"policy: {task} {len(undecided)} item(s) -> {default} (headless default)")
+            answer = default.lower()
+        else:
+            answer = prompt_with_timeout(prompt, persistent=True).lower()
+        for item in undecided:
+            decisions[item] = answer
+    return decisions
+###################################
+# TELEMETRY
+###################################
+METRICS_FILE = os.path.join(LOG_BASE_DIR, "vacuum_metrics.jsonl")
+# Set from the command line: Prometheus textfile-collector path and the
+# directory receiving one cProfile dump per task.
+_TELEMETRY = {"prom_textfile": None, "profile_dir": None, "latest": {}}
+_TELEMETRY_LOCK = threading.Lock()
+_TASK_CONTEXT = threading.local()
+_RUN_ID = datetime.datetime.now().strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+def _current_task():
+    return getattr(_TASK_CONTEXT, "record", None)
+def record_metric(name, amount=1):
+    """Add to a counter (e.g. bytes_freed, files_touched) of the running task."""
+    record = _current_task()
+    if record is None or not amount:
+        return
+    with _TELEMETRY_LOCK:
+        record[name] = record.get(name, 0) + amount
+def _write_metrics(records):
+    with _TELEMETRY_LOCK:
+        with open(METRICS_FILE, "a") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+def _record_subprocess(task, argv, start, status=None, rusage=None):
+    """
+    Append one subprocess record and add it to the task's totals. status
+    is the raw wait status and rusage the child's own os.wait4 usage;
+    either is None when the child was reaped elsewhere.
+    """
+    entry = {
+        "type": "subprocess",
+        "run_id": _RUN_ID,
+        "task": task["task"] if task else None,
+        "argv": [str(a) for a in argv[:8]],
+        "wall_s": round(time.monotonic() - start, 4),
+        "cpu_s": round(rusage.ru_utime + rusage.ru_stime, 4) if rusage else None,
+        "max_rss_kb": rusage.ru_maxrss if rusage else None,
+        "returncode": os.waitstatus_to_exitcode(status) if status is not None else None,
+    }
+    if task is not None:
+        with _TELEMETRY_LOCK:
+            task["subprocesses"] += 1
+            task["subprocess_wall_s"] += entry["wall_s"]
+            if rusage:
+                task["children_cpu_s"] += entry["cpu_s"]
+                task["children_max_rss_kb"] = max(task["children_max_rss_kb"], rusage.ru_maxrss)
+    try:
+        _write_metrics([entry])
+    except OSError as e:
+        logging.error(f"telemetry: could not write metrics: {e}")
+class TimedPopen(subprocess.Popen):
+    """
+    subprocess.Popen that reaps its child with os.wait4 instead of waitpid,
+    so each child's own CPU time and peak RSS are known, and records it
+    against the task that started it once it has been waited for. Only
+    the public poll()/wait() are overridden (communicate(), kill() and the
+    context manager go through them); subprocess itself is not patched.
+    """
+    def __init__(self, args, **kwargs):
+        self._telemetry = (_current_task(), args if isinstance(args, (list, tuple)) else [args])
+        self._started = time.monotonic()
+        self._reap_lock = threading.Lock()
+        self.rusage = None
+        super().__init__(args, **kwargs)
+    def _reap(self, block):
+        """Reap the child if it exited (or wait for it); True once reaped."""
+        if not self._reap_lock.acquire(block):
+            return False
+        try:
+            if self.returncode is not None:
+                return True
+            try:
+                pid, status, rusage = os.wait4(self.pid, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                # Reaped behind our back; subprocess reports 0 in this case.
+                self.returncode = 0
+                _record_subprocess(*self._telemetry, self._started)
+                return True
+            if not pid:
+                return False
+            self.rusage = rusage
+            self.returncode = os.waitstatus_to_exitcode(status)
+            _record_subprocess(*self._telemetry, self._started, status, rusage)
+            return True
+        finally:
+            self._reap_lock.release()
+    def poll(self):
+        self._reap(block=False)
+        return self.returncode
+    def wait(self, timeout=None):
+        if timeout is None:
+            self._reap(block=True)
+            return self.returncode
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+        while not self._reap(block=False):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return self.returncode
+def timed_run(command, input=None, capture_output=False, timeout=None, check=False, **kwargs):
+    """subprocess.run on top of TimedPopen, for every command a task runs."""
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    with TimedPopen(command, **kwargs) as proc:
+        try:
+            stdout, stderr = proc.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        except BaseException:
+            proc.kill()
+            raise
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args, stdout, stderr)
+    return subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr)
+def timed_check_output(command, **kwargs):
+    """subprocess.check_output on top of timed_run."""
+    return timed_run(command, stdout=subprocess.PIPE, check=True, **kwargs).stdout
+def timed_spawn(command, args, **kwargs):
+    """pexpect.spawn whose child is recorded once close_timed_spawn() reaps it."""
+    child = pexpect.spawn(command, args, **kwargs)
+    child.telemetry = (_current_task(), [command, *args], time.monotonic())
+    return child
+def close_timed_spawn(child, wait_s=5.0):
+    """
+    Close and record a timed_spawn() child; later calls do nothing. A child
+    that reached EOF is reaped here with os.wait4 (pexpect would use
+    waitpid and lose its rusage) and the result handed to pexpect, which
+    then only closes the pty. A child still running is left to pexpect's
+    close(), which terminates it; a failure to do so is logged.
+    """
+    if child.telemetry is None:
+        return
+    status = rusage = None
+    if child.flag_eof and not child.terminated:
+        deadline = time.monotonic() + wait_s
+        while True:
+            try:
+                pid, status, rusage = os.wait4(child.pid, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                ptyproc = child.ptyproc
+                ptyproc.status = status
+                ptyproc.exitstatus = os.WEXITSTATUS(status) if os.WIFEXITED(status) else None
+                ptyproc.signalstatus = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+                ptyproc.terminated = True
+                break
+            status = rusage = None
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+    try:
+        child.close()
+    except (pexpect.ExceptionPexpect, OSError) as e:
+        logging.warning(f"Could not close {child.telemetry[1][0]} (pid {child.pid}): {e}")
+    if status is None:
+        status = child.status
+    _record_subprocess(*child.telemetry, status, rusage)
+    child.telemetry = None
+def _write_prom_textfile(path):
+    """Write the latest record of each task in textfile-collector format."""
+    gauges = (
+        ("wall_seconds", "wall_s"),
+        ("cpu_seconds", "cpu_s"),
+        ("children_cpu_seconds", "children_cpu_s"),
+        ("children_max_rss_kilobytes", "children_max_rss_kb"),
+        ("subprocesses", "subprocesses"),
+        ("bytes_freed", "bytes_freed"),
+        ("files_touched", "files_touched"),
+        ("success", "success"),
+    )
+    lines = []
+    with _TELEMETRY_LOCK:
+        latest = list(_TELEMETRY["latest"].values())
+    for metric, field in gauges:
+        lines.append(f"# TYPE vacuum_task_{metric} gauge")
+        for record in latest:
+            if field == "success":
+                value = int(record["status"] == "ok")
+            else:
+                value = record.get(field, 0)
+            lines.append(
+                f'vacuum_task_{metric}{{task="{record["name"]}",key="{record["task"]}"}} {value}'
+            )
+    lines.append("# TYPE vacuum_last_run_timestamp_seconds gauge")
+    lines.append(f"vacuum_last_run_timestamp_seconds {time.time():.0f}")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+@contextmanager
+def task_telemetry(key, name):
+    """
+    Measure one task: wall time, the task thread's CPU time, the CPU time
+    and peak RSS of the commands it ran (TimedPopen and the wrappers built
+    on it), plus counters it reports with record_metric(). The record is appended to METRICS_FILE; with a profile
+    directory set, the task is also run under cProfile (run_task_graph then
+    runs one task at a time, since only one profiler can be active).
+    """
+    record = {
+        "type": "task",
+        "run_id": _RUN_ID,
+        "task": key,
+        "name": name,
+        "status": "ok",
+        "subprocesses": 0,
+        "subprocess_wall_s": 0.0,
+        "children_cpu_s": 0.0,
+        "children_max_rss_kb": 0,
+        "bytes_freed": 0,
+        "files_touched": 0,
+    }
+    profiler = None
+    previous = _current_task()
+    _TASK_CONTEXT.record = record
+    wall_start = time.monotonic()
+    cpu_start = time.thread_time()
+    try:
+        if _TELEMETRY["profile_dir"]:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                logging.warning(f"telemetry: not profiling task {key}: {e}")
+                profiler = None
+        yield record
+    except BaseException:
+        record["status"] = "error"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        record["wall_s"] = round(time.monotonic() - wall_start, 4)
+        record["cpu_s"] = round(time.thread_time() - cpu_start, 4)
+        record["subprocess_wall_s"] = round(record["subprocess_wall_s"], 4)
+        record["children_cpu_s"] = round(record["children_cpu_s"], 4)
+        record["ts"] = datetime.datetime.now().isoformat(timespec="seconds")
+        _TASK_CONTEXT.record = previous
+        try:
+            _write_metrics([record])
+            with _TELEMETRY_LOCK:
+                _TELEMETRY["latest"][key] = record
+            if profiler:
+                os.makedirs(_TELEMETRY["profile_dir"], exist_ok=True)
+                profiler.dump_stats(
+                    os.path.join(_TELEMETRY["profile_dir"], f"{_RUN_ID}_{key}_{name}.prof")
+                )
+            if _TELEMETRY["prom_textfile"]:
+                _write_prom_textfile(_TELEMETRY["prom_textfile"])
+        except OSError as e:
+            logging.error(f"telemetry: could not write metrics: {e}")
+###################################
+# PACMAN DATABASE READER
+###################################
+PACMAN_CONF = "/etc/pacman.conf"
+PACMAN_SYNC_DIR = "/var/lib/pacman/sync"
+PACMAN_LOCAL_DIR = "/var/lib/pacman/local"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+@contextmanager
+def open_pacman_archive(path):
+    """
+    Open a pacman sync DB or package tarball as a streaming tarfile.
+    gzip/xz/bzip2 are handled by tarfile itself; zstd, which the stdlib
+    cannot read, is streamed through a single 'zstd -dc' child.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic != ZSTD_MAGIC:
+        with tarfile.open(path, mode="r|*") as tar:
+            yield tar
+        return
+    proc = TimedPopen(
+        ["zstd", "-dcq", path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+            yield tar
+    finally:
+        proc.stdout.close()
+        proc.wait()
+def pacman_repo_order():
+    """Return repository names in pacman.conf order (its resolution priority)."""
+    repos = []
+    try:
+        with open(PACMAN_CONF, "r") as conf:
+            for line in conf:
+                match = re.match(r"^\s*\[([^\]]+)\]", line)
+                if match and match.group(1) != "options":
+                    repos.append(match.group(1))
+    except OSError:
+        pass
+    return repos
+def pacman_cache_dirs():
+    """CacheDir entries from pacman.conf, or pacman's built-in default."""
+    dirs = []
+    try:
+        with open(PACMAN_CONF, "r") as conf:
+            for line in conf:
+                match = re.match(r"^\s*CacheDir\s*=\s*(.+?)\s*$", line)
+                if match:
+                    dirs.extend(match.group(1).split())
+    except OSError:
+        pass
+    return dirs or ["/var/cache/pacman/pkg/"]
+def _rpmvercmp(a, b):
+    """Port of libalpm's rpmvercmp(): compare two version segments."""
+    if a == b:
+        return 0
+    one = two = 0
+    prev1 = prev2 = 0
+    while one < len(a) and two < len(b):
+        while one < len(a) and not a[one].isalnum():
+            one += 1
+        while two < len(b) and not b[two].isalnum():
+            two += 1
+        if one >= len(a) or two >= len(b):
+            break
+        # Differing separator runs decide the comparison on their own.
+        if one - prev1 != two - prev2:
+            return -1 if one - prev1 < two - prev2 else 1
+        end1, end2 = one, two
+        is_num = a[one].isdigit()
+        same_kind = str.isdigit if is_num else str.isalpha
+        while end1 < len(a) and same_kind(a[end1]):
+            end1 += 1
+        while end2 < len(b) and same_kind(b[end2]):
+            end2 += 1
+        seg1, seg2 = a[one:end1], b[two:end2]
+        if not seg2:
+            # Numeric segments are newer than alpha ones.
+            return 1 if is_num else -1
+        if is_num:
+            seg1, seg2 = seg1.lstrip("0"), seg2.lstrip("0")
+            if len(seg1) != len(seg2):
+                return 1 if len(seg1) > len(seg2) else -1
+        if seg1 != seg2:
+            return 1 if seg1 > seg2 else -1
+        one = prev1 = end1
+        two = prev2 = end2
+    if one >= len(a) and two >= len(b):
+        return 0
+    # A leftover alpha segment never beats an empty string ('1.0a' < '1.0').
+    rest1 = a[one:]
+    rest2 = b[two:]
+    if (not rest1 and not rest2[:1].isalpha()) or rest1[:1].isalpha():
+        return -1
+    return 1
+def _parse_evr(version):
+    """'1:2.3-4' -> ('1', '2.3', '4'); epoch defaults to '0', release may be None."""
+    epoch, sep, rest = version.partition(":")
+    if not sep or not epoch.isdigit():
+        epoch, rest = "0", version
+    ver, sep, rel = rest.rpartition("-")
+    if not sep:
+        return epoch or "0", rest, None
+    return epoch or "0", ver, rel
+def vercmp(a, b):
+    """pacman's vercmp: <0, 0 or >0 as version a is older, equal or newer than b."""
+    if a == b:
+        return 0
+    epoch1, ver1, rel1 = _parse_evr(a)
+    epoch2, ver2, rel2 = _parse_evr(b)
+    result = _rpmvercmp(epoch1, epoch2)
+    if result == 0:
+        result = _rpmvercmp(ver1, ver2)
+        if result == 0 and rel1 is not None and rel2 is not None:
+            result = _rpmvercmp(rel1, rel2)
+    return result
+# Parsed pacman DB state, loaded lazily and shared by every task in a run.
+_PACMAN_DB_CACHE = {}
+_PACMAN_DB_LOCK = threading.RLock()
+def _parse_pacman_desc(text):
+    """Parse a pacman 'desc' file into {"%FIELD%": [values]}."""
+    fields = {}
+    section = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("%") and line.endswith("%") and len(line) > 2:
+            section = fields.setdefault(line, [])
+        elif line and section is not None:
+            section.append(line)
+    return fields
+def _strip_dep_version(dep):
+    """'libfoo.so=1-64' / 'sh>=5' -> 'libfoo.so' / 'sh'."""
+    return re.split(r"[<>=]", dep, 1)[0]
+def pacman_local_packages():
+    """
+    Return {name: {"version", "provides", "dir"}} for every installed package,
+    read from /var/lib/pacman/local/*/desc once per run (replaces expac -Q
+    and pacman -Q/-Qi/-Qq calls).
+    """
+    with _PACMAN_DB_LOCK:
+        if "local" not in _PACMAN_DB_CACHE:
+            packages = {}
+            try:
+                entries = os.listdir(PACMAN_LOCAL_DIR)
+            except OSError as e:
+                logging.error(f"Cannot read pacman local DB {PACMAN_LOCAL_DIR}: {e}")
+                entries = []
+            for entry in entries:
+                pkg_dir = os.path.join(PACMAN_LOCAL_DIR, entry)
+                try:
+                    with open(os.path.join(pkg_dir, "desc"), "r", errors="replace") as f:
+                        desc = _parse_pacman_desc(f.read())
+                except OSError:
+                    continue
+                if not desc.get("%NAME%"):
+                    continue
+                packages[desc["%NAME%"][0]] = {
+                    "version": (desc.get("%VERSION%") or [""])[0],
+                    "provides": [_strip_dep_version(p) for p in desc.get("%PROVIDES%", [])],
+                    "dir": pkg_dir,
+                }
+            _PACMAN_DB_CACHE["local"] = packages
+        return _PACMAN_DB_CACHE["local"]
+def pacman_sync_packages():
+    """
+    Return {name: (repo, version)} for every package in the sync DBs,
+    streamed from /var/lib/pacman/sync/*.db once per run (replaces
+    pacman -Sl/-Si). Repos earlier in pacman.conf win on name clashes.
+    """
+    with _PACMAN_DB_LOCK:
+        if "sync" not in _PACMAN_DB_CACHE:
+            packages = {}
+            for repo in reversed(pacman_repo_order()):
+                db_path = os.path.join(PACMAN_SYNC_DIR, f"{repo}.db")
+                if not os.path.isfile(db_path):
+                    continue
+                try:
+                    with open_pacman_archive(db_path) as tar:
+                        for member in tar:
+                            if not member.isfile() or not member.name.endswith("/desc"):
+                                continue
+                            desc = _parse_pacman_desc(
+                                tar.extractfile(member).read().decode("utf-8", "replace")
+                            )
+                            if desc.get("%NAME%"):
+                                packages[desc["%NAME%"][0]] = (
+                                    repo,
+                                    (desc.get("%VERSION%") or [""])[0],
+                                )
+                except (OSError, tarfile.TarError) as e:
+                    logging.warning(f"Could not read sync DB {db_path}: {e}")
+            _PACMAN_DB_CACHE["sync"] = packages
+        return _PACMAN_DB_CACHE["sync"]
+def pacman_is_installed(name):
+    """True if 'name' is installed or provided by an installed package."""
+    local = pacman_local_packages()
+    if name in local:
+        return True
+    with _PACMAN_DB_LOCK:
+        if "provides" not in _PACMAN_DB_CACHE:
+            _PACMAN_DB_CACHE["provides"] = {
+                provided for info in local.values() for provided in info["provides"]
+            }
+        return _strip_dep_version(name) in _PACMAN_DB_CACHE["provides"]
+def pacman_file_owners(path):
+    """
+    Return the sorted names of installed packages owning 'path' (a file or a
+    directory), like 'pacman -Qo'. The file->package index is built from
+    local/*/files on first use only.
+    """
+    with _PACMAN_DB_LOCK:
+        if "owners" not in _PACMAN_DB_CACHE:
+            owners = {}
+            for name, info in pacman_local_packages().items():
+                try:
+                    with open(os.path.join(info["dir"], "files"), "r", errors="surrogateescape") as f:
+                        in_files = False
+                        for line in f:
+                            line = line.rstrip("\n")
+                            if line.startswith("%"):
+                                in_files = line == "%FILES%"
+                            elif line and in_files:
+                                owners.setdefault(line.rstrip("/"), []).append(name)
+                except OSError:
+                    continue
+            _PACMAN_DB_CACHE["owners"] = owners
+        return sorted(_PACMAN_DB_CACHE["owners"].get(path.strip("/"), []))
+def invalidate_pacman_db_cache():
+    """Drop cached DB state; call after any pacman transaction."""
+    with _PACMAN_DB_LOCK:
+        _PACMAN_DB_CACHE.clear()
+###################################
+# PACMAN TRANSACTIONS
+###################################
+PACMAN_LOCK_FILE = "/var/lib/pacman/db.lck"
+# Transactions opened while another is active join it; only the outermost one
+# commits. run_task_graph opens one around a whole run, so removals and
+# (re)installs queued by every task are resolved and committed together.
+_PACMAN_TXN_STACK = []
+_PACMAN_TXN_LOCK = threading.RLock()
+@contextmanager
+def pacman_transaction():
+    """
+    Collect package operations and commit them on exit of the outermost block:
+    one 'pacman -Rns' for all removals, one pacman run for all official
+    installs and one AUR-helper run for all AUR installs.
+    """
+    with _PACMAN_TXN_LOCK:
+        outermost = not _PACMAN_TXN_STACK
+        txn = {"ops": []} if outermost else _PACMAN_TXN_STACK[0]
+        _PACMAN_TXN_STACK.append(txn)
+    try:
+        yield txn
+    finally:
+        with _PACMAN_TXN_LOCK:
+            _PACMAN_TXN_STACK.pop()
+        if outermost:
+            commit_pacman_transaction(txn)
+def pacman_queue(action, packages, repo_class="official", on_success=None, on_failure=None):
+    """
+    Queue packages for removal ('remove') or (re)installation ('install')
+    with repo_class 'official' or 'aur'. Outside a transaction this commits
+    immediately. on_success/on_failure(packages) run after the commit of the
+    step the packages ended up in.
+    """
+    packages = [str(p) for p in packages]
+    if not packages:
+        return
+    with pacman_transaction() as txn:
+        with _PACMAN_TXN_LOCK:
+            deferred = len(_PACMAN_TXN_STACK) > 1
+            txn["ops"].append({
+                "action": action,
+                "repo_class": repo_class,
+                "packages": packages,
+                "on_success": on_success,
+                "on_failure": on_failure,
+            })
+        if deferred:
+            log_and_print(
+                f"{INFO} Queued {action} of {packages}; committed with the run's pacman transaction.",
+                "info",
+            )
+def _run_pacman_step(label, ops, packages, commit):
+    """Commit one step of a transaction and fire the queued callbacks."""
+    if not packages:
+        return
+    log_and_print(f"{INFO} Pacman transaction ({label}): {packages}", "info")
+    ok = commit(packages)
+    invalidate_pacman_db_cache()
+    for op in ops:
+        callback = op["on_success"] if ok else op["on_failure"]
+        if callback:
+            try:
+                callback(op["packages"])
+            except Exception as e:
+                log_and_print(f"{FAILURE} Transaction callback failed: {e}", "error")
+def _pacman_remove(packages):
+    result = timed_run(
+        ["sudo", "pacman", "-Rns", "--noconfirm", *packages],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        logging.error(result.stderr)
+        log_and_print(
+            f"{FAILURE} pacman -Rns failed: {result.stderr.strip()}", "error"
+        )
+    return result.returncode == 0
+def commit_pacman_transaction(txn):
+    """
+    Resolve queued operations once and commit them: removals first, then
+    official installs, then AUR installs. A package queued for removal is
+    not also reinstalled.
+    """
+    ops = txn["ops"]
+    if not ops:
+        return
+    txn["ops"] = []
+    if os.path.exists(PACMAN_LOCK_FILE):
+        log_and_print(
+            f"{FAILURE} Pacman lock at {PACMAN_LOCK_FILE} — another operation may be active; skipping queued transaction.",
+            "error",
+        )
+        for op in ops:
+            if op["on_failure"]:
+                op["on_failure"](op["packages"])
+        return
+    removals = [op for op in ops if op["action"] == "remove"]
+    removed = {pkg for op in removals for pkg in op["packages"]}
+    _run_pacman_step(
+        "remove",
+        removals,
+        sorted(removed),
+        _pacman_remove,
+    )
+    for repo_class in ("official", "aur"):
+        installs = [
+            op for op in ops
+            if op["action"] == "install" and op["repo_class"] == repo_class
+        ]
+        packages = sorted(
+            {pkg for op in installs for pkg in op["packages"]} - removed
+        )
+        if repo_class == "official":
+            commit = reinstall_packages_pexpect
+        else:
+            aur_helper = detect_aur_helper()
+            if not aur_helper and packages:
+                log_and_print(
+                    f"{FAILURE} AUR packages queued but no AUR helper found: {packages}",
+                    "error",
+                )
+                continue
+            commit = lambda pkgs, helper=aur_helper: reinstall_aur_packages(pkgs, helper)
+        _run_pacman_step(repo_class, installs, packages, commit)
+###################################
+# JOURNAL READER
+###################################
+JOURNAL_CURSOR_DIR = os.path.join(CACHE_BASE_DIR, "journal_cursors")
+JOURNAL_SAMPLE_SIZE = 50
+def _journal_cursor_path(cursor_name):
+    return os.path.join(JOURNAL_CURSOR_DIR, f"{cursor_name}.cursor")
+def iter_journal(args=(), cursor_name=None, since=None, follow=False):
+    """
+    Stream journal entries as dicts from 'journalctl -o json'.
+    With cursor_name, the last __CURSOR handed to the caller is persisted
+    when iteration ends, and the next call resumes right after it; 'since'
+    only applies when no cursor has been stored yet. Nothing is buffered:
+    each JSON line is parsed and yielded as journalctl writes it.
+    """
+    command = ["journalctl", "-o", "json", "--no-pager", *args]
+    cursor = None
+    if cursor_name:
+        try:
+            with open(_journal_cursor_path(cursor_name), "r") as f:
+                cursor = f.read().strip() or None
+        except OSError:
+            pass
+    if cursor:
+        command += ["--after-cursor", cursor]
+    elif since:
+        command += ["--since", since]
+    if follow:
+        command.append("--follow")
+    proc = TimedPopen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, errors="replace",
+    )
+    last_cursor = None
+    try:
+        for line in proc.stdout:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            last_cursor = entry.get("__CURSOR", last_cursor)
+            yield entry
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+        proc.stdout.close()
+        proc.wait()
+        if cursor_name and last_cursor:
+            os.makedirs(JOURNAL_CURSOR_DIR, exist_ok=True)
+            tmp_path = _journal_cursor_path(cursor_name) + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(last_cursor)
+            os.replace(tmp_path, _journal_cursor_path(cursor_name))
+def journal_message(entry):
+    """Return MESSAGE as text; journald emits non-UTF-8 data as a byte array."""
+    message = entry.get("MESSAGE", "")
+    if isinstance(message, list):
+        return bytes(message).decode("utf-8", "replace")
+    return message or ""
+def journal_unit(entry):
+    """Best-effort source name of an entry: unit, then syslog identifier."""
+    return (
+        entry.get("_SYSTEMD_UNIT")
+        or entry.get("UNIT")
+        or entry.get("SYSLOG_IDENTIFIER")
+        or entry.get("_COMM")
+        or "kernel"
+    )
+def format_journal_entry(entry):
+    """Render an entry like journalctl's short output."""
+    try:
+        stamp = datetime.datetime.fromtimestamp(
+            int(entry["__REALTIME_TIMESTAMP"]) / 1e6
+        ).strftime("%b %d %H:%M:%S")
+    except (KeyError, ValueError):
+        stamp = "?"
+    return f"{stamp} {journal_unit(entry)}: {journal_message(entry)}"
+def summarize_journal(entries, predicate=None, sample_size=JOURNAL_SAMPLE_SIZE, on_match=None):
+    """
+    Aggregate matching entries in constant memory.
+    Returns (total, Counter of matches per unit, deque of the last
+    'sample_size' matching entries). on_match is called for every match.
+    """
+    per_unit = collections.Counter()
+    sample = collections.deque(maxlen=sample_size)
+    total = 0
+    for entry in entries:
+        if predicate and not predicate(entry):
+            continue
+        total += 1
+        per_unit[journal_unit(entry)] += 1
+        sample.append(entry)
+        if on_match:
+            on_match(entry)
+    return total, per_unit, sample
+def is_failure_entry(entry):
+    """
+    True for entries describing a failed job: systemd's structured
+    EXIT_CODE/EXIT_STATUS result fields, or cron's 'FAILED' messages.
+    """
+    exit_code = entry.get("EXIT_CODE")
+    if exit_code in ("killed", "dumped"):
+        return True
+    if exit_code == "exited" and entry.get("EXIT_STATUS") not in (None, "0"):
+        return True
+    return "FAILED" in journal_message(entry).upper()
+###################################
+# SYSTEMD D-BUS CLIENT
+###################################
+# Minimal D-Bus wire-protocol client, enough to drive org.freedesktop.systemd1
+# over one connection instead of forking systemctl per unit. Addresses are
+# ';'-separated and tried in order, as in DBUS_SYSTEM_BUS_ADDRESS.
+SYSTEM_BUS_ADDRESS = os.environ.get(
+    "DBUS_SYSTEM_BUS_ADDRESS", "unix:path=/run/dbus/system_bus_socket"
+)
+DBUS_TIMEOUT = 30
+SYSTEMD_JOB_TIMEOUT = 120
+SYSTEMD_BUS_NAME = "org.freedesktop.systemd1"
+SYSTEMD_PATH = "/org/freedesktop/systemd1"
+SYSTEMD_MANAGER = "org.freedesktop.systemd1.Manager"
+_DBUS_METHOD_CALL, _DBUS_METHOD_RETURN, _DBUS_ERROR, _DBUS_SIGNAL = 1, 2, 3, 4
+_DBUS_NO_REPLY_EXPECTED = 0x1
+# type code -> (struct format, alignment) for fixed-size types
+_DBUS_FIXED = {
+    "y": ("B", 1), "b": ("I", 4), "n": ("h", 2), "q": ("H", 2), "i": ("i", 4),
+    "u": ("I", 4), "x": ("q", 8), "t": ("Q", 8), "d": ("d", 8), "h": ("I", 4),
+}
+_DBUS_ALIGN = {"s": 4, "o": 4, "g": 1, "v": 1, "a": 4, "(": 8, "{": 8}
+# header field code -> (name, signature)
+_DBUS_HEADER_FIELDS = {
+    1: ("path", "o"), 2: ("interface", "s"), 3: ("member", "s"),
+    4: ("error_name", "s"), 5: ("reply_serial", "u"), 6: ("destination", "s"),
+    7: ("sender", "s"), 8: ("signature", "g"),
+}
+def _dbus_split_signature(signature):
+    """'sa{sv}(ii)' -> ['s', 'a{sv}', '(ii)']"""
+    types_, i = [], 0
+    while i < len(signature):
+        end = _dbus_type_end(signature, i)
+        types_.append(signature[i:end])
+        i = end
+    return types_
+def _dbus_type_end(signature, i):
+    code = signature[i]
+    if code == "a":
+        return _dbus_type_end(signature, i + 1)
+    if code in "({":
+        depth = 0
+        for j in range(i, len(signature)):
+            if signature[j] in "({":
+                depth += 1
+            elif signature[j] in ")}":
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+        raise ValueError(f"unbalanced D-Bus signature: {signature}")
+    return i + 1
+def _dbus_pad(buf, alignment):
+    buf.extend(b"\0" * (-len(buf) % alignment))
+def _dbus_marshal(buf, type_, value):
+    """Append 'value' encoded as 'type_' (little endian) to 'buf'."""
+    code = type_[0]
+    if code in _DBUS_FIXED:
+        fmt, alignment = _DBUS_FIXED[code]
+        _dbus_pad(buf, alignment)
+        buf.extend(struct.pack("<" + fmt, value))
+    elif code in "so":
+        data = value.encode()
+        _dbus_pad(buf, 4)
+        buf.extend(struct.pack("<I", len(data)) + data + b"\0")
+    elif code == "g":
+        data = value.encode()
+        buf.extend(struct.pack("<B", len(data)) + data + b"\0")
+    elif code == "v":
+        signature, inner = value
+        _dbus_marshal(buf, "g", signature)
+        _dbus_marshal(buf, signature, inner)
+    elif code == "a":
+        element = type_[1:]
+        _dbus_pad(buf, 4)
+        length_at = len(buf)
+        buf.extend(b"\0\0\0\0")
+        _dbus_pad(buf, _DBUS_ALIGN.get(element[0]) or _DBUS_FIXED[element[0]][1])
+        start = len(buf)
+        items = value.items() if element[0] == "{" else value
+        for item in items:
+            _dbus_marshal(buf, element, item)
+        struct.pack_into("<I", buf, length_at, len(buf) - start)
+    elif code in "({":
+        _dbus_pad(buf, 8)
+        for member, item in zip(_dbus_split_signature(type_[1:-1]), value):
+            _dbus_marshal(buf, member, item)
+    else:
+        raise ValueError(f"unsupported D-Bus type: {type_}")
+def _dbus_unmarshal(data, type_, pos, endian="<"):
+    """Decode one 'type_' value at 'pos'; returns (value, new_pos)."""
+    code = type_[0]
+    if code in _DBUS_FIXED:
+        fmt, alignment = _DBUS_FIXED[code]
+        pos += -pos % alignment
+        value = struct.unpack_from(endian + fmt, data, pos)[0]
+        return (bool(value) if code == "b" else value), pos + struct.calcsize(fmt)
+    if code in "so":
+        pos += -pos % 4
+        (length,) = struct.unpack_from(endian + "I", data, pos)
+        pos += 4
+        return bytes(data[pos:pos + length]).decode(), pos + length + 1
+    if code == "g":
+        length = data[pos]
+        return bytes(data[pos + 1:pos + 1 + length]).decode(), pos + length + 2
+    if code == "v":
+        signature, pos = _dbus_unmarshal(data, "g", pos, endian)
+        return _dbus_unmarshal(data, signature, pos, endian)
+    if code == "a":
+        element = type_[1:]
+        pos += -pos % 4
+        (length,) = struct.unpack_from(endian + "I", data, pos)
+        pos += 4
+        pos += -pos % (_DBUS_ALIGN.get(element[0]) or _DBUS_FIXED[element[0]][1])
+        end, items = pos + length, []
+        while pos < end:
+            item, pos = _dbus_unmarshal(data, element, pos, endian)
+            items.append(item)
+        return (dict(items) if element[0] == "{" else items), pos
+    if code in "({":
+        pos += -pos % 8
+        items = []
+        for member in _dbus_split_signature(type_[1:-1]):
+            item, pos = _dbus_unmarshal(data, member, pos, endian)
+            items.append(item)
+        return tuple(items), pos
+    raise ValueError(f"unsupported D-Bus type: {type_}")
+def _dbus_recv_exact(bus, size):
+    while len(bus.buffer) < size:
+        chunk = bus.sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("D-Bus connection closed")
+        bus.buffer.extend(chunk)
+    data = bytes(bus.buffer[:size])
+    del bus.buffer[:size]
+    return data
+def _dbus_open_socket(address):
+    """Connect to the first reachable unix:path= / unix:abstract= address."""
+    last_error = OSError(f"no usable D-Bus address in {address!r}")
+    for entry in address.split(";"):
+        transport, _, params = entry.partition(":")
+        options = dict(p.split("=", 1) for p in params.split(",") if "=" in p)
+        if transport != "unix":
+            continue
+        if "path" in options:
+            target = options["path"]
+        elif "abstract" in options:
+            target = "\0" + options["abstract"]
+        else:
+            continue
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(DBUS_TIMEOUT)
+        try:
+            sock.connect(target)
+            return sock
+        except OSError as e:
+            sock.close()
+            last_error = e
+    raise last_error
+def dbus_connect(address=None):
+    """
+    Open and authenticate (SASL EXTERNAL) a bus connection and register with
+    Hello. Returns the connection namespace used by the other dbus_* calls.
+    """
+    sock = _dbus_open_socket(address or SYSTEM_BUS_ADDRESS)
+    bus = types.SimpleNamespace(sock=sock, buffer=bytearray(), serial=0,
+                                unique_name=None, signals=collections.deque())
+    try:
+        uid_hex = str(os.getuid()).encode().hex()
+        sock.sendall(b"\0AUTH EXTERNAL " + uid_hex.encode() + b"\r\n")
+        while b"\r\n" not in bus.buffer:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("D-Bus connection closed during authentication")
+            bus.buffer.extend(chunk)
+        line, _, rest = bytes(bus.buffer).partition(b"\r\n")
+        if not line.startswith(b"OK "):
+            raise PermissionError(f"D-Bus authentication rejected: {line.decode(errors='replace')}")
+        bus.buffer = bytearray(rest)
+        sock.sendall(b"BEGIN\r\n")
+        (bus.unique_name,) = dbus_call(
+            bus, "org.freedesktop.DBus", "/org/freedesktop/DBus",
+            "org.freedesktop.DBus", "Hello",
+        )
+    except BaseException:
+        sock.close()
+        raise
+    return bus
+def dbus_send(bus, msg_type, path=None, interface=None, member=None,
+              signature="", args=(), destination=None, reply_serial=None, flags=0):
+    """Send one message; returns its serial."""
+    bus.serial += 1
+    body = bytearray()
+    for type_, value in zip(_dbus_split_signature(signature), args):
+        _dbus_marshal(body, type_, value)
+    fields = []
+    for code, value in ((1, path), (2, interface), (3, member), (5, reply_serial),
+                        (6, destination), (8, signature or None)):
+        if value is not None:
+            fields.append((code, (_DBUS_HEADER_FIELDS[code][1], value)))
+    header = bytearray()
+    _dbus_marshal(header, "y", ord("l"))
+    _dbus_marshal(header, "y", msg_type)
+    _dbus_marshal(header, "y", flags)
+    _dbus_marshal(header, "y", 1)
+    _dbus_marshal(header, "u", len(body))
+    _dbus_marshal(header, "u", bus.serial)
+    _dbus_marshal(header, "a(yv)", fields)
+    _dbus_pad(header, 8)
+    bus.sock.sendall(bytes(header) + bytes(body))
+    return bus.serial
+def dbus_read_message(bus):
+    """Block for the next message; returns a namespace with type, serial, fields and body."""
+    fixed = _dbus_recv_exact(bus, 16)
+    endian = "<" if fixed[0:1] == b"l" else ">"
+    msg_type = fixed[1]
+    body_length, serial, fields_length = struct.unpack_from(endian + "III", fixed, 4)
+    header_length = 16 + fields_length + (-(16 + fields_length) % 8)
+    rest = _dbus_recv_exact(bus, header_length - 16 + body_length)
+    data = fixed + rest
+    raw_fields, _ = _dbus_unmarshal(data, "a(yv)", 12, endian)
+    fields = {
+        _DBUS_HEADER_FIELDS[code][0]: value
+        for code, value in raw_fields
+        if code in _DBUS_HEADER_FIELDS
+    }
+    body, pos = [], 0
+    body_data = data[header_length:]
+    for type_ in _dbus_split_signature(fields.get("signature", "")):
+        value, pos = _dbus_unmarshal(body_data, type_, pos, endian)
+        body.append(value)
+    return types.SimpleNamespace(type=msg_type, serial=serial, fields=fields, body=body)
+def _dbus_error(message):
+    text = message.body[0] if message.body and isinstance(message.body[0], str) else ""
+    return RuntimeError(f"{message.fields.get('error_name')}: {text}")
+def dbus_call_many(bus, calls):
+    """
+    Pipeline method calls: all are written before any reply is read. Each
+    call is (destination, path, interface, member, signature, args). Returns
+    a list of reply bodies, or RuntimeError instances for D-Bus errors, in
+    call order. Signals that arrive meanwhile are queued on bus.signals.
+    """
+    pending = {}
+    for index, (destination, path, interface, member, signature, args) in enumerate(calls):
+        serial = dbus_send(bus, _DBUS_METHOD_CALL, path, interface, member,
+                           signature, args, destination=destination)
+        pending[serial] = index
+    results = [None] * len(calls)
+    while pending:
+        message = dbus_read_message(bus)
+        if message.type == _DBUS_SIGNAL:
+            bus.signals.append(message)
+            continue
+        index = pending.pop(message.fields.get("reply_serial"), None)
+        if index is None:
+            continue
+        results[index] = _dbus_error(message) if message.type == _DBUS_ERROR else message.body
+    return results
+def dbus_call(bus, destination, path, interface, member, signature="", args=()):
+    """Single method call; returns the reply body or raises RuntimeError."""
+    (result,) = dbus_call_many(bus, [(destination, path, interface, member, signature, args)])
+    if isinstance(result, Exception):
+        raise result
+    return result
+def _systemd_call(bus, member, signature="", args=()):
+    return dbus_call(bus, SYSTEMD_BUS_NAME, SYSTEMD_PATH, SYSTEMD_MANAGER, member, signature, args)
+def systemd_failed_units(bus):
+    """Names of units in the 'failed' state (one ListUnitsFiltered call)."""
+    (units,) = _systemd_call(bus, "ListUnitsFiltered", "as", [["failed"]])
+    return [unit[0] for unit in units]
+def systemd_unit_file_states(bus, names):
+    """{unit: unit-file state} for 'names' in one call; missing units are absent."""
+    (files,) = _systemd_call(bus, "ListUnitFilesByPatterns", "asas", [[], list(names)])
+    return {os.path.basename(path): state for path, state in files}
+def systemd_unit_jobs(bus, method, units, mode="replace", timeout=SYSTEMD_JOB_TIMEOUT):
+    """
+    Queue 'method' (RestartUnit, StopUnit, ...) for every unit at once and
+    wait for the JobRemoved signals. Returns {unit: result}, where result is
+    systemd's job result ('done', 'failed', ...), 'timeout', or the D-Bus
+    error text when the job could not be queued.
+    """
+    dbus_call(bus, "org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+              "AddMatch", "s", [f"type='signal',sender='{SYSTEMD_BUS_NAME}',"
+                                f"interface='{SYSTEMD_MANAGER}',member='JobRemoved'"])
+    _systemd_call(bus, "Subscribe")
+    replies = dbus_call_many(bus, [
+        (SYSTEMD_BUS_NAME, SYSTEMD_PATH, SYSTEMD_MANAGER, method, "ss", [unit, mode])
+        for unit in units
+    ])
+    results, jobs = {}, {}
+    for unit, reply in zip(units, replies):
+        if isinstance(reply, Exception):
+            results[unit] = str(reply)
+        else:
+            jobs[reply[0]] = unit
+    deadline = time.monotonic() + timeout
+    try:
+        while jobs:
+            while bus.signals and jobs:
+                signal = bus.signals.popleft()
+                if signal.fields.get("member") != "JobRemoved":
+                    continue
+                _, job_path, _, result = signal.body
+                if job_path in jobs:
+                    results[jobs.pop(job_path)] = result
+            if not jobs:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            bus.sock.settimeout(remaining)
+            message = dbus_read_message(bus)
+            if message.type == _DBUS_SIGNAL:
+                bus.signals.append(message)
+    except socket.timeout:
+        pass
+    finally:
+        bus.sock.settimeout(DBUS_TIMEOUT)
+    for unit in jobs.values():
+        results[unit] = "timeout"
+    return results
+###################################
+# PURGE ENGINE
+###################################
+PURGE_WORKERS = 8
+# (class, level) applied to every purge worker thread; class 2 is best-effort,
+# class 3 idle. None leaves the I/O priority alone.
+PURGE_IOPRIO = (2, 7)
+# Upper bound on unlink/rmdir calls per second across all workers; 0 = none.
+PURGE_MAX_OPS_PER_SEC = 0
+_IOPRIO_SET_SYSCALL = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_DIR_OPEN_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+def _set_thread_ioprio(ioprio):
+    """
+    ioprio_set(2) for the calling thread only (who=0 is the caller's tid),
+    so the rest of the process keeps its normal I/O priority.
+    """
+    if not ioprio:
+        return
+    nr = _IOPRIO_SET_SYSCALL.get(os.uname().machine)
+    if nr is None:
+        return
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        ioprio_class, level = ioprio
+        libc.syscall(nr, _IOPRIO_WHO_PROCESS, 0, (ioprio_class << _IOPRIO_CLASS_SHIFT) | level)
+    except (OSError, AttributeError) as e:
+        logging.debug(f"purge: ioprio_set unavailable: {e}")
+def _rate_limiter(ops_per_sec):
+    """Token bucket shared by all workers; returns a blocking acquire()."""
+    if not ops_per_sec:
+        return lambda: None
+    lock = threading.Lock()
+    state = {"tokens": float(ops_per_sec), "stamp": time.monotonic()}
+    def acquire():
+        while True:
+            with lock:
+                now = time.monotonic()
+                state["tokens"] = min(
+                    float(ops_per_sec),
+                    state["tokens"] + (now - state["stamp"]) * ops_per_sec,
+                )
+                state["stamp"] = now
+                if state["tokens"] >= 1:
+                    state["tokens"] -= 1
+                    return
+                wait = (1 - state["tokens"]) / ops_per_sec
+            time.sleep(wait)
+    return acquire
+def purge_paths(
+    targets,
+    file_filter=None,
+    keep_root=False,
+    workers=PURGE_WORKERS,
+    ioprio=PURGE_IOPRIO,
+    max_ops_per_sec=PURGE_MAX_OPS_PER_SEC,
+):
+    """
+    Delete files and directory trees in parallel.
+    Every directory is opened once (O_NOFOLLOW) and its entries are listed,
+    stat'ed and unlinked relative to that descriptor, so no path is resolved
+    twice and a symlink swapped in mid-purge is never followed. Directories
+    are queued as (parent descriptor, name) and only opened when a worker
+    takes them, so wide directories do not hold a descriptor per child;
+    a directory stays open until its subdirectories are done and is then
+    removed. Workers take the most recently found directory first, so open
+    descriptors stay near tree depth times worker count.
+    file_filter(path, stat_result) -> bool limits which non-directories are
+    removed; when given, directories are only descended into, never removed.
+    keep_root empties a directory target but leaves the directory itself.
+    Returns {target: {"bytes": n, "files": n, "dirs": n, "errors": n}};
+    bytes counts allocated blocks of files with no other hard link.
+    """
+    remove_dirs = file_filter is None
+    acquire = _rate_limiter(max_ops_per_sec)
+    stats = {}
+    lock = threading.Lock()
+    pending = queue.LifoQueue()
+    outstanding = [0]
+    all_done = threading.Event()
+    def add(target, key, value):
+        with lock:
+            stats[target][key] += value
+    def finish_dir(node):
+        # Called once the directory's own scan and all child directories are done.
+        while node is not None:
+            with lock:
+                node["pending"] -= 1
+                if node["pending"]:
+                    return
+            parent = node["parent"]
+            if node["fd"] is None:
+                # Never opened; the failed open was already counted.
+                node = parent
+                continue
+            os.close(node["fd"])
+            if remove_dirs and not (keep_root and parent is None):
+                try:
+                    acquire()
+                    os.rmdir(node["name"], dir_fd=node["parent_fd"])
+                    add(node["target"], "dirs", 1)
+                except OSError as e:
+                    logging.debug(f"purge: rmdir {node['path']}: {e}")
+                    add(node["target"], "errors", 1)
+            if parent is None:
+                os.close(node["parent_fd"])
+            node = parent
+    def scan(node):
+        if node["fd"] is None:
+            node["fd"] = os.open(node["name"], _DIR_OPEN_FLAGS, dir_fd=node["parent_fd"])
+        fd = node["fd"]
+        target = node["target"]
+        with os.scandir(fd) as entries:
+            for entry in entries:
+                path = os.path.join(node["path"], entry.name)
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    add(target, "errors", 1)
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    with lock:
+                        node["pending"] += 1
+                    enqueue({
+                        "fd": None, "parent_fd": fd, "name": entry.name,
+                        "path": path, "parent": node, "target": target,
+                        "pending": 1,
+                    })
+                    continue
+                if file_filter and not file_filter(path, st):
+                    continue
+                try:
+                    acquire()
+                    os.unlink(entry.name, dir_fd=fd)
+                except OSError as e:
+                    logging.debug(f"purge: unlink {path}: {e}")
+                    add(target, "errors", 1)
+                    continue
+                with lock:
+                    stats[target]["files"] += 1
+                    if st.st_nlink <= 1:
+                        stats[target]["bytes"] += st.st_blocks * 512
+    def enqueue(node):
+        with lock:
+            outstanding[0] += 1
+        pending.put(node)
+    def worker():
+        _set_thread_ioprio(ioprio)
+        while True:
+            node = pending.get()
+            if node is None:
+                return
+            try:
+                scan(node)
+            except OSError as e:
+                logging.debug(f"purge: scanning {node['path']}: {e}")
+                add(node["target"], "errors", 1)
+            finally:
+                finish_dir(node)
+                with lock:
+                    outstanding[0] -= 1
+                    if outstanding[0] == 0:
+                        all_done.set()
+    for target in targets:
+        stats[target] = {"bytes": 0, "files": 0, "dirs": 0, "errors": 0}
+        parent_path, name = os.path.split(os.path.abspath(target).rstrip("/") or "/")
+        try:
+            parent_fd = os.open(parent_path or "/", _DIR_OPEN_FLAGS)
+        except OSError as e:
+            logging.debug(f"purge: open {parent_path}: {e}")
+            stats[target]["errors"] += 1
+            continue
+        try:
+            st = os.stat(name, dir_fd=parent_fd, follow_symlinks=False)
+            if stat.S_ISDIR(st.st_mode):
+                fd = os.open(name, _DIR_OPEN_FLAGS, dir_fd=parent_fd)
+            else:
+                if not file_filter or file_filter(target, st):
+                    acquire()
+                    os.unlink(name, dir_fd=parent_fd)
+                    stats[target]["files"] += 1
+                    if st.st_nlink <= 1:
+                        stats[target]["bytes"] += st.st_blocks * 512
+                os.close(parent_fd)
+                continue
+        except OSError as e:
+            logging.debug(f"purge: {target}: {e}")
+            if e.errno != errno.ENOENT:
+                stats[target]["errors"] += 1
+            os.close(parent_fd)
+            continue
+        enqueue({
+            "fd": fd, "parent_fd": parent_fd, "name": name,
+            "path": target, "parent": None, "target": target, "pending": 1,
+        })
+    if not outstanding[0]:
+        return stats
+    threads = [
+        threading.Thread(target=worker, name=f"vacuum-purge-{i}", daemon=True)
+        for i in range(max(1, workers))
+    ]
+    for t in threads:
+        t.start()
+    all_done.wait()
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        t.join()
+    return stats
+def format_size(num_bytes):
+    """Human-readable size, e.g. 1536 -> '1.5 KiB'."""
+    size = float(num_bytes)
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+def report_purge(stats):
+    """Log bytes freed per target and return the total."""
+    total = 0
+    for target, result in stats.items():
+        total += result["bytes"]
+        record_metric("bytes_freed", result["bytes"])
+        record_metric("files_touched", result["files"] + result["dirs"])
+        if not (result["files"] or result["dirs"] or result["errors"]):
+            continue
+        level = "warning" if result["errors"] else "info"
+        prefix = WARNING if result["errors"] else SUCCESS
+        message = (
+            f"{prefix} {target}: freed {format_size(result['bytes'])} "
+            f"({result['files']} files, {result['dirs']} dirs"
+        )
+        if result["errors"]:
+            message += f", {result['errors']} errors"
+        log_and_print(message + ")", level)
+    return total
+###################################
 # 1. process_dep_scan_log
 ###################################
 def process_dep_scan_log():
@@ -255,6 +1663,7 @@ def fix_permissions(
 def install_missing_dependency_batch(dependencies):
     """
     Batch install missing dependencies using pacman with --needed for idempotency.
+    The install joins the current pacman transaction when one is open.
     """
     log_and_print(
         f"{INFO} Attempting to install these missing dependencies: {dependencies}",
@@ -262,25 +1671,23 @@ def install_missing_dependency_batch(dependencies):
     )
     to_install = []
     for dep in dependencies:
-        success, _ = execute_command(["pacman", "-Qi", dep])
-        if success:
+        if pacman_is_installed(dep):
             log_and_print(f"{INFO} Dependency {dep} is already installed.", "info")
         else:
             to_install.append(dep)
     if to_install:
-        success, result_output = execute_command(
-            ["sudo", "pacman", "-S", "--needed", "--noconfirm"] + to_install
-        )
-        if success:
-            log_and_print(
-                f"{SUCCESS} Successfully installed missing dependencies: {to_install}",
+        pacman_queue(
+            "install",
+            to_install,
+            on_success=lambda pkgs: log_and_print(
+                f"{SUCCESS} Successfully installed missing dependencies: {pkgs}",
                 "info",
-            )
-        else:
-            log_and_print(
-                f"{FAILURE} Failed to install missing dependencies: {to_install}",
+            ),
+            on_failure=lambda pkgs: log_and_print(
+                f"{FAILURE} Failed to install missing dependencies: {pkgs}",
                 "error",
-            )
+            ),
+        )
     else:
         log_and_print(f"{INFO} All dependencies are already installed.", "info")
 def install_missing_dependency(dependency):
@@ -298,7 +1705,7 @@ def manage_cron_job():
     log_and_print(f"{INFO} Managing system cron jobs...", "info")
     existing_crons = []
     try:
-        result = subprocess.run(
+        result = timed_run(
             ["sudo", "crontab", "-l"], capture_output=True, text=True, check=True
         )
         raw_crons = result.stdout.strip().split("\n")
@@ -317,32 +1724,29 @@ def manage_cron_job():
     else:
         log_and_print(f"{INFO} No existing cron jobs found.", "info")
     try:
-        cron_logs = subprocess.check_output(
-            ["journalctl", "-u", "cronie", "--since", "24 hours ago"],
-            text=True,
-            stderr=subprocess.DEVNULL,
+        total, _, failed_jobs = summarize_journal(
+            iter_journal(["-u", "cronie"], since="24 hours ago"), is_failure_entry
         )
-        failed_jobs = [
-            line for line in cron_logs.split("\n") if "FAILED" in line.upper()
-        ]
-        if failed_jobs:
+        if total:
             log_and_print(
                 f"{WARNING} Failed cron jobs detected in last 24 hours:", "warning"
             )
             for job in failed_jobs:
-                log_and_print(f"{FAILURE} {job}", "error")
+                log_and_print(f"{FAILURE} {format_journal_entry(job)}", "error")
         else:
             log_and_print(f"{INFO} No failed cron jobs in the last 24 hours.", "info")
-    except subprocess.CalledProcessError:
+    except OSError:
         log_and_print(
             f"{INFO} No failed cron jobs detected or logs not accessible.", "info"
         )
-    choice = prompt_with_timeout(
+    choice = policy_decide(
+        "manage_cron_job",
+        "action",
         "Do you want to (a)dd a new cron job or (d)elete an existing one? (a/d/skip): ",
-        persistent=True,
-    ).lower()
+        default="skip",
+    )
     if choice == "a":
-        new_cron = input("Enter the new cron job entry: ").strip()
+        new_cron = "" if is_headless() else input("Enter the new cron job entry: ").strip()
         if new_cron:
             existing_crons.append(new_cron)
             new_crons = "\n".join(existing_crons) + "\n"
@@ -378,7 +1782,7 @@ def update_cron_jobs(new_crons):
         temp_file.write(new_crons)
         temp_file_path = temp_file.name
     try:
-        subprocess.run(["sudo", "crontab", temp_file_path], check=True)
+        timed_run(["sudo", "crontab", temp_file_path], check=True)
     except Exception as e:
         log_and_print(f"{FAILURE} Error updating cron jobs: {str(e)}", "error")
     finally:
@@ -387,55 +1791,217 @@ def update_cron_jobs(new_crons):
 ##########################
 # 5. remove_broken_symlinks
 ##########################
+# Pseudo filesystems and runtime state never hold links worth cleaning.
+WALK_PRUNE_PATHS = frozenset({"/proc", "/sys", "/run", "/dev"})
+# snapper (.snapshots), timeshift and common btrfs subvolume layouts.
+SNAPSHOT_DIR_NAMES = frozenset(
+    {".snapshots", ".snapshot", "@snapshots", "timeshift-btrfs"}
+)
+LOCAL_FSTYPES = frozenset(
+    {"ext2", "ext3", "ext4", "btrfs", "xfs", "f2fs", "jfs", "bcachefs", "zfs",
+     "vfat", "exfat", "ntfs3"}
+)
+WALK_WORKERS = 16
+def _parallel_walk(roots, scan_dir, workers=WALK_WORKERS):
+    """
+    Walk directory trees on a thread pool and stream results as they are found.
+    roots: iterable of (path, context) pairs; the context is handed unchanged
+    to every scan_dir call below that root.
+    scan_dir(path, context) -> (subdirs, results). Subdirectories are fanned
+    out to the pool; results are yielded to the caller immediately, so the
+    consumer can act on them while the walk is still running.
+    """
+    results = queue.Queue()
+    finished = object()
+    lock = threading.Lock()
+    outstanding = [1]  # held by the submitter until every root is queued
+    pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="vacuum-walk"
+    )
+    def release():
+        with lock:
+            outstanding[0] -= 1
+            if outstanding[0] == 0:
+                results.put(finished)
+    def submit(path, context):
+        with lock:
+            outstanding[0] += 1
+        try:
+            pool.submit(work, path, context)
+        except RuntimeError:  # pool shut down: consumer stopped early
+            release()
+    def work(path, context):
+        try:
+            subdirs, found = scan_dir(path, context)
+            for item in found:
+                results.put(item)
+            for sub in subdirs:
+                submit(sub, context)
+        except OSError as e:
+            logging.debug(f"walk: skipping {path}: {e}")
+        finally:
+            release()
+    for root, context in roots:
+        submit(root, context)
+    release()
+    try:
+        while True:
+            item = results.get()
+            if item is finished:
+                break
+            yield item
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+def _unescape_mountinfo(field):
+    """Decode the octal escapes (\\040 etc.) used in /proc/self/mountinfo."""
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), field)
+def _is_pruned_path(path):
+    """True for pseudo-fs paths and anything inside a snapshot directory."""
+    if any(path == p or path.startswith(p + "/") for p in WALK_PRUNE_PATHS):
+        return True
+    return any(part in SNAPSHOT_DIR_NAMES for part in path.split("/"))
+def _local_mount_roots(base="/"):
+    """
+    Return the mount points of local block filesystems at or below 'base',
+    skipping pseudo filesystems, network mounts and mounted btrfs snapshots.
+    """
+    roots = []
+    try:
+        with open("/proc/self/mountinfo", "r") as mountinfo:
+            for line in mountinfo:
+                pre, _, post = line.partition(" - ")
+                fields = pre.split()
+                post_fields = post.split()
+                if len(fields) < 5 or not post_fields:
+                    continue
+                fs_root = _unescape_mountinfo(fields[3])
+                mount_point = _unescape_mountinfo(fields[4])
+                if post_fields[0] not in LOCAL_FSTYPES:
+                    continue
+                if base != "/" and not (
+                    mount_point == base or mount_point.startswith(base.rstrip("/") + "/")
+                ):
+                    continue
+                if _is_pruned_path(mount_point) or _is_pruned_path(fs_root):
+                    continue
+                if mount_point not in roots:
+                    roots.append(mount_point)
+    except OSError as e:
+        logging.warning(f"Could not read mountinfo, walking {base} only: {e}")
+    if base not in roots:
+        roots.insert(0, base)
+    return roots
+def _scan_dir_for_broken_links(path, root_dev):
+    """
+    scan_dir callback for _parallel_walk: report dangling symlinks in 'path'
+    and return the subdirectories to descend into. When root_dev is set the
+    walk never crosses onto another device (btrfs subvolumes included).
+    """
+    subdirs = []
+    broken = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_symlink():
+                    if not os.path.exists(entry.path):
+                        broken.append(entry.path)
+                elif entry.is_dir(follow_symlinks=False):
+                    if entry.name in SNAPSHOT_DIR_NAMES or entry.path in WALK_PRUNE_PATHS:
+                        continue
+                    if (
+                        root_dev is not None
+                        and entry.stat(follow_symlinks=False).st_dev != root_dev
+                    ):
+                        continue
+                    subdirs.append(entry.path)
+            except OSError:
+                continue
+    return subdirs, broken
+def iter_broken_symlinks(base="/", one_filesystem=True):
+    """
+    Yield dangling symlinks below 'base' as the parallel walk finds them.
+    With one_filesystem=True every walk stays on the device of its root, and
+    each local mount below 'base' is walked as its own root instead of being
+    crossed into; pseudo filesystems and snapshot trees are never entered.
+    """
+    if one_filesystem:
+        roots = []
+        for mount_point in _local_mount_roots(base):
+            try:
+                roots.append((mount_point, os.stat(mount_point).st_dev))
+            except OSError:
+                continue
+    else:
+        roots = [(base, None)]
+    yield from _parallel_walk(roots, _scan_dir_for_broken_links)
+def _remove_symlink(link):
+    """Unlink one dangling symlink, logging the outcome. Returns True on success."""
+    try:
+        os.remove(link)
+        logging.info(f"Removed broken symlink: {link}")
+        record_metric("files_touched")
+        return True
+    except OSError as e:
+        logging.error(f"Failed to remove {link}: {str(e)}")
+        return False
 def remove_broken_symlinks():
     """
     Finds and removes broken symbolic links system-wide.
-    Bulk listing with a single persistent confirmation prompt.
+    Scans in-process with a parallel os.scandir walker, unless a daemon started
+    with --watch already tracks the live set. The operator chooses up
+    front between removing links as they stream in, or reviewing the complete
+    list behind a single persistent confirmation prompt. Policy rules keyed
+    by link path can pre-answer individual links in the review path.
     """
     log_and_print(f"{INFO} Searching for broken symbolic links...", "info")
-    search_path = "/"
-    broken_links = []
-    try:
-        command = ["find", search_path, "-xtype", "l"]
-        result = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True,
-            check=True,
-        )
-        broken_links = [
-            lnk for lnk in result.stdout.strip().split("\n") if lnk.strip()
-        ]
-        if not broken_links:
+    live = watched_paths("broken")
+    if live is not None:
+        log_and_print(f"{INFO} Using the vacuum daemon's live set of broken links.", "info")
+        find_links = lambda: iter(live)
+    else:
+        find_links = iter_broken_symlinks
+    remove_as_found = policy_decide(
+        "remove_broken_symlinks",
+        "stream",
+        "Remove broken symbolic links as they are found (y), or list them for review first (N)? [y/N]: ",
+        default="n",
+    ) == "y"
+    if remove_as_found:
+        found = removed = 0
+        with spinning_spinner():
+            for link in find_links():
+                found += 1
+                removed += _remove_symlink(link)
+        if not found:
             log_and_print(f"{SUCCESS} No broken symbolic links found.", "info")
-            return
-        log_and_print(
-            f"{INFO} Found {len(broken_links)} broken symbolic links:", "info"
-        )
-        for link in broken_links:
-            print(link)
-        confirm = prompt_with_timeout(
-            "Do you want to remove these broken symbolic links? [y/N]: ",
-            persistent=True,
-        ).lower()
-        if confirm != "y":
+        else:
             log_and_print(
-                f"{INFO} Broken symbolic link removal aborted by user.", "info"
+                f"{SUCCESS} Removed {removed}/{found} broken symbolic links.", "info"
             )
-            return
-        with spinning_spinner():
-            for link in broken_links:
-                try:
-                    os.remove(link)
-                    logging.info(f"Removed broken symlink: {link}")
-                except Exception as e:
-                    logging.error(f"Failed to remove {link}: {str(e)}")
-        log_and_print(f"{SUCCESS} Broken symbolic links removed.", "info")
-    except subprocess.CalledProcessError as e:
-        log_and_print(
-            f"{FAILURE} Error searching for broken symbolic links: {str(e)}", "error"
-        )
+        return
+    with spinning_spinner():
+        broken_links = sorted(find_links())
+    if not broken_links:
+        log_and_print(f"{SUCCESS} No broken symbolic links found.", "info")
+        return
+    log_and_print(f"{INFO} Found {len(broken_links)} broken symbolic links:", "info")
+    for link in broken_links:
+        print(link)
+    decisions = policy_decide_all(
+        "remove_broken_symlinks",
+        broken_links,
+        "Do you want to remove these broken symbolic links? [y/N]: ",
+        default="n",
+    )
+    to_remove = [link for link in broken_links if decisions[link] == "y"]
+    if not to_remove:
+        log_and_print(f"{INFO} Broken symbolic link removal aborted by user.", "info")
+        return
+    with spinning_spinner():
+        removed = sum(_remove_symlink(link) for link in to_remove)
+    log_and_print(
+        f"{SUCCESS} Removed {removed}/{len(broken_links)} broken symbolic links.", "info"
+    )
 ###############################################
 # 6. clean_old_kernels
 ###############################################
@@ -464,57 +2030,59 @@ def clean_old_kernels():
         log_and_print(
             f"{INFO} Found old kernel module versions: {old_versions}", "info"
         )
-        confirm = prompt_with_timeout(
+        decisions = policy_decide_all(
+            "clean_old_kernels",
+            old_versions,
             f"Do you want to remove these old kernels: {old_versions}? [y/N]: ",
-            persistent=True,
-        ).lower()
-        if confirm != "y":
+            default="n",
+        )
+        old_versions = [v for v in old_versions if decisions[v] == "y"]
+        if not old_versions:
             log_and_print(f"{INFO} Kernel cleanup aborted by user.", "info")
             return
         with spinning_spinner():
+            packages = {}
+            orphaned = []
             for version in old_versions:
                 module_path = os.path.join(modules_path, version)
-                try:
-                    result = subprocess.run(
-                        ["pacman", "-Qo", module_path],
-                        capture_output=True,
-                        text=True,
-                        check=True,
-                    )
-                    pkg_line = result.stdout.strip()
-                    pkg_name = pkg_line.split(" is owned by ")[-1].split()[0]
-                    log_and_print(
-                        f"{INFO} Removing kernel package: {pkg_name} (version: {version})",
-                        "info",
-                    )
-                    remove_result = subprocess.run(
-                        ["sudo", "pacman", "-Rns", "--noconfirm", pkg_name],
-                        capture_output=True,
-                        text=True,
-                    )
-                    if remove_result.returncode == 0:
-                        log_and_print(
-                            f"{SUCCESS} Removed old kernel package: {pkg_name}", "info"
-                        )
-                    else:
-                        log_and_print(
-                            f"{FAILURE} Failed to remove package {pkg_name}. Attempting manual cleanup.",
-                            "error",
-                        )
-                        shutil.rmtree(module_path, ignore_errors=True)
-                        log_and_print(
-                            f"{WARNING} Manually removed kernel module: {version}",
-                            "warning",
-                        )
-                except subprocess.CalledProcessError:
+                # Several packages (e.g. out-of-tree modules) can own the
+                # directory; the kernel package is the one shipping vmlinuz.
+                owners = pacman_file_owners(
+                    os.path.join(module_path, "vmlinuz")
+                ) or pacman_file_owners(module_path)
+                if owners:
+                    packages.setdefault(owners[0], []).append(version)
+                else:
+                    orphaned.append(version)
+            for version in orphaned:
+                log_and_print(
+                    f"{WARNING} Kernel version {version} not owned by any package. Removing manually...",
+                    "warning",
+                )
+                shutil.rmtree(os.path.join(modules_path, version), ignore_errors=True)
+                log_and_print(
+                    f"{SUCCESS} Removed orphaned kernel module: {version}", "info"
+                )
+        def remove_manually(pkgs):
+            log_and_print(
+                f"{FAILURE} Failed to remove kernel packages. Attempting manual cleanup.",
+                "error",
+            )
+            for pkg in pkgs:
+                for version in packages[pkg]:
+                    shutil.rmtree(os.path.join(modules_path, version), ignore_errors=True)
                     log_and_print(
-                        f"{WARNING} Kernel version {version} not owned by any package. Removing manually...",
+                        f"{WARNING} Manually removed kernel module: {version}",
                         "warning",
                     )
-                    shutil.rmtree(module_path, ignore_errors=True)
-                    log_and_print(
-                        f"{SUCCESS} Removed orphaned kernel module: {version}", "info"
-                    )
+        pacman_queue(
+            "remove",
+            sorted(packages),
+            on_success=lambda pkgs: log_and_print(
+                f"{SUCCESS} Removed old kernel packages: {pkgs}", "info"
+            ),
+            on_failure=remove_manually,
+        )
     except Exception as e:
         log_and_print(f"{FAILURE} Error during kernel cleanup: {str(e)}", "error")
 ################################
@@ -525,7 +2093,7 @@ def vacuum_journalctl(retention="1d"):
     log_and_print(f"{INFO} Vacuuming journalctl logs older than {retention}...", "info")
     with spinning_spinner():
         try:
-            result = subprocess.run(
+            result = timed_run(
                 ["sudo", "journalctl", f"--vacuum-time={retention}"],
                 check=True,
                 capture_output=True,
@@ -557,7 +2125,7 @@ def update_font_cache():
     log_and_print(f"{INFO} Updating font cache...", "info")
     with spinning_spinner():
         try:
-            result = subprocess.run(
+            result = timed_run(
                 ["sudo", "fc-cache", "-fv"],
                 check=True,
                 capture_output=True,
@@ -578,7 +2146,8 @@ def update_font_cache():
 def clear_trash():
     """
     Clear trash for all users if possible.
-    Enumerates /home/*/.local/share/Trash and /root/.local/share/Trash.
+    Enumerates /home/*/.local/share/Trash and /root/.local/share/Trash and
+    empties them together through the purge engine.
     """
     trash_dirs = []
     home_base = "/home"
@@ -593,21 +2162,11 @@ def clear_trash():
     if not trash_dirs:
         log_and_print(f"{INFO} No trash directories found.", "info")
         return
+    log_and_print(f"{INFO} Clearing trash in {', '.join(trash_dirs)}...", "info")
     with spinning_spinner():
-        for trash_dir in trash_dirs:
-            log_and_print(f"{INFO} Clearing trash in {trash_dir}...", "info")
-            try:
-                for item in os.listdir(trash_dir):
-                    item_path = os.path.join(trash_dir, item)
-                    if os.path.isfile(item_path) or os.path.islink(item_path):
-                        os.unlink(item_path)
-                    elif os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                log_and_print(f"{SUCCESS} Trash cleared for {trash_dir}.", "info")
-            except Exception as e:
-                log_and_print(
-                    f"{FAILURE} Error clearing trash {trash_dir}: {str(e)}", "error"
-                )
+        stats = purge_paths(trash_dirs, keep_root=True)
+    total = report_purge(stats)
+    log_and_print(f"{SUCCESS} Trash cleared, {format_size(total)} freed.", "info")
 ###############################
 # 11. optimize_databases
 ###############################
@@ -624,7 +2183,7 @@ def optimize_databases(skips=None):
             log_and_print(f"{WARNING} Skipping step: {skip_id}", "warning")
             return
         try:
-            subprocess.run(command, check=True, capture_output=True, text=True)
+            timed_run(command, check=True, capture_output=True, text=True)
             log_and_print(f"{SUCCESS} {success_message}", "info")
         except subprocess.CalledProcessError as e:
             log_and_print(f"{FAILURE} {failure_message}: {e.stderr.strip()}", "error")
@@ -693,15 +2252,155 @@ def optimize_databases(skips=None):
 ############################
 # 12. clean_package_cache
 ############################
-def clean_package_cache(retain_versions=2):
+# yay's build/package cache; also pruned by clean_package_cache.
+AUR_CACHE_DIR = "/home/andro/.local/cache/yay"
+PKG_FILE_RE = re.compile(
+    r"^(?P<name>.+)-(?P<version>[^-]+-[^-]+)-(?P<arch>[^-]+)\.pkg\.tar(?:\.\w+)?$"
+)
+def _scan_package_cache(cache_dirs):
+    """
+    One scandir pass over each cache dir (and its immediate subdirectories,
+    where yay keeps per-package builds). Returns (packages, signatures,
+    partials) where packages maps (name, arch) to [(version, path, stat)],
+    signatures maps package path to its .sig path, and partials lists stale
+    download leftovers as (path, stat).
+    """
+    packages = {}
+    signatures = {}
+    partials = []
+    pending = [(d, True) for d in cache_dirs]
+    while pending:
+        directory, descend = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+        names = {entry.name for entry in entries}
+        for entry in entries:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                if descend and not entry.name.startswith("download-"):
+                    pending.append((entry.path, False))
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            if entry.name.endswith(".aria2") or entry.name.startswith("download-"):
+                partials.append((entry.path, st))
+                continue
+            match = PKG_FILE_RE.match(entry.name)
+            if not match:
+                continue
+            key = (match.group("name"), match.group("arch"))
+            packages.setdefault(key, []).append((match.group("version"), entry.path, st))
+            if entry.name + ".sig" in names:
+                signatures[entry.path] = os.path.join(directory, entry.name + ".sig")
+    return packages, signatures, partials
+def plan_package_cache_prune(cache_dirs, keep=2):
+    """
+    Decide what to delete, paccache -rk style: per (name, arch) keep the
+    'keep' newest versions (vercmp order) across all cache dirs, drop the
+    rest with their .sig files, and drop partial downloads.
+    Returns {"remove": [paths], "kept": n, "bytes": n}. Bytes only count an
+    inode once, and only if every hard link to it is being removed, so
+    packages linked between cache dirs are not counted as freed.
+    """
+    packages, signatures, partials = _scan_package_cache(cache_dirs)
+    remove = list(partials)
+    kept = 0
+    for files in packages.values():
+        versions = sorted(
+            {version for version, _, _ in files},
+            key=functools.cmp_to_key(vercmp),
+            reverse=True,
+        )
+        retained = set(versions[:keep])
+        for version, path, st in files:
+            if version in retained:
+                kept += 1
+                continue
+            remove.append((path, st))
+            sig = signatures.get(path)
+            if sig:
+                try:
+                    remove.append((sig, os.lstat(sig)))
+                except OSError:
+                    pass
+    links_removed = collections.Counter()
+    inodes = {}
+    for _, st in remove:
+        key = (st.st_dev, st.st_ino)
+        links_removed[key] += 1
+        inodes[key] = st
+    freed = sum(
+        st.st_blocks * 512
+        for key, st in inodes.items()
+        if links_removed[key] >= st.st_nlink
+    )
+    return {"remove": [path for path, _ in remove], "kept": kept, "bytes": freed}
+def _unlink_quiet(path):
+    try:
+        os.unlink(path)
+        return True
+    except OSError as e:
+        logging.error(f"Failed to remove {path}: {e}")
+        return False
+def prune_package_cache(cache_dirs, keep=2, dry_run=False, workers=PURGE_WORKERS):
     """
-    Clean the package cache using paccache.
-    Provide advanced retention options (retain_versions).
+    Prune package caches natively. With dry_run=True only the plan is
+    computed (no package is opened, only stat'ed). Otherwise files are
+    unlinked on a thread pool at purge I/O priority. Returns the plan with
+    "removed" added.
+    """
+    plan = plan_package_cache_prune(cache_dirs, keep)
+    plan["removed"] = 0
+    if dry_run or not plan["remove"]:
+        return plan
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix="vacuum-prune",
+        initializer=_set_thread_ioprio,
+        initargs=(PURGE_IOPRIO,),
+    ) as pool:
+        plan["removed"] = sum(pool.map(_unlink_quiet, plan["remove"]))
+    record_metric("bytes_freed", plan["bytes"])
+    record_metric("files_touched", plan["removed"])
+    for path in plan["remove"]:
+        logging.info(f"Pruned from package cache: {path}")
+    return plan
+def clean_package_cache(retain_versions=2, dry_run=False, cache_dirs=None):
+    """
+    Prune the pacman package cache and the AUR helper cache natively
+    (paccache -rk equivalent), keeping 'retain_versions' versions per package.
+    A dry-run size report is shown before asking; dry_run=True stops there.
     """
     log_and_print(
         f"{INFO} Cleaning package cache (retain_versions={retain_versions}) ...", "info"
     )
+    if cache_dirs is None:
+        cache_dirs = pacman_cache_dirs()
+        if os.path.isdir(AUR_CACHE_DIR):
+            cache_dirs.append(AUR_CACHE_DIR)
     try:
+        plan = plan_package_cache_prune(cache_dirs, retain_versions)
+        if not plan["remove"]:
+            log_and_print(
+                f"{SUCCESS} Package cache already trimmed ({plan['kept']} package files kept).",
+                "info",
+            )
+            return
+        log_and_print(
+            f"{INFO} {len(plan['remove'])} cached files can go, freeing {format_size(plan['bytes'])} "
+            f"({plan['kept']} package files kept in {', '.join(cache_dirs)}).",
+            "info",
+        )
+        if dry_run:
+            for path in plan["remove"]:
+                print(path)
+            return
         if is_interactive():
             confirm = prompt_with_timeout(
                 "Do you want to proceed with cleaning the package cache? [Y/n]: ",
@@ -717,31 +2416,13 @@ def clean_package_cache(retain_versions=2):
                 f"{INFO} Running in non-interactive mode. Proceeding with cleaning.",
                 "info",
             )
-        cache_dir = "/var/cache/pacman/pkg/"
-        temp_files = [
-            f
-            for f in os.listdir(cache_dir)
-            if f.endswith(".aria2") or f.startswith("download-")
-        ]
-        for temp_file in temp_files:
-            temp_file_path = os.path.join(cache_dir, temp_file)
-            if os.path.isfile(temp_file_path):
-                os.remove(temp_file_path)
-                logging.info(f"Removed temporary file: {temp_file_path}")
-        command = ["sudo", "paccache", f"-rk{retain_versions}"]
-        result = subprocess.run(command, capture_output=True, text=True)
-        if result.returncode == 0:
-            logging.info(result.stdout)
-            log_and_print(
-                f"{SUCCESS} Package cache cleaned with retain_versions={retain_versions}.",
-                "info",
-            )
-        else:
-            logging.error(result.stderr)
-            log_and_print(
-                f"{FAILURE} Error cleaning package cache: {result.stderr.strip()}",
-                "error",
-            )
+        with spinning_spinner():
+            result = prune_package_cache(cache_dirs, retain_versions)
+        log_and_print(
+            f"{SUCCESS} Package cache cleaned with retain_versions={retain_versions}: "
+            f"removed {result['removed']} files, freed {format_size(result['bytes'])}.",
+            "info",
+        )
     except Exception as e:
         log_and_print(f"{FAILURE} Error cleaning package cache: {str(e)}", "error")
 ##############################
@@ -752,12 +2433,12 @@ def clean_aur_dir(aur_dir=None):
     Clean the AUR directory, deleting only uninstalled or old versions of packages.
     Also removes old source directories if they differ from installed versions.
     Uses os.listdir() with explicit absolute paths throughout; does not mutate CWD.
+    Source directories are collected first, decided per directory (policy or
+    prompt, outside the spinner) and then purged together.
     """
     log_and_print(f"{INFO} Cleaning AUR directory...", "info")
     if not aur_dir:
-        aur_dir = os.path.normpath(
-            os.path.expanduser("/home/andro/.local/cache/yay")
-        )
+        aur_dir = os.path.normpath(AUR_CACHE_DIR)
     with spinning_spinner():
         try:
             if not os.path.isdir(aur_dir):
@@ -777,19 +2458,12 @@ def clean_aur_dir(aur_dir=None):
                 match = pkgname_regex.match(f)
                 if match:
                     files[f] = match.groupdict()
-            installed_packages = {}
-            try:
-                expac_data = subprocess.check_output(
-                    ["expac", "-Qs", "%n %v"], universal_newlines=True
-                ).splitlines()
-                for line in expac_data:
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        installed_packages[parts[0]] = parts[1]
-            except subprocess.CalledProcessError as e:
+            installed_packages = {
+                name: info["version"] for name, info in pacman_local_packages().items()
+            }
+            if not installed_packages:
                 log_and_print(
-                    f"{FAILURE} expac not installed or error running expac: {e.stderr}",
-                    "error",
+                    f"{FAILURE} Could not read the pacman local database.", "error"
                 )
                 return
             to_remove = []
@@ -807,72 +2481,272 @@ def clean_aur_dir(aur_dir=None):
                     os.remove(os.path.join(aur_dir, f))
                 except OSError as e:
                     log_and_print(f"{FAILURE} Error deleting file {f}: {e}", "error")
-            for item in os.listdir(aur_dir):
-                item_path = os.path.join(aur_dir, item)
-                if os.path.isdir(item_path):
-                    if item not in installed_packages:
-                        confirm = prompt_with_timeout(
-                            f"Remove old AUR source directory '{item}'? [y/N]: ",
-                            persistent=True,
-                        ).lower()
-                        if confirm == "y":
-                            shutil.rmtree(item_path, ignore_errors=True)
-                            log_and_print(
-                                f"{INFO} Deleted source directory: {item}", "info"
-                            )
-            log_and_print(f"{SUCCESS} AUR directory cleaned.", "info")
+            stale_dirs = sorted(
+                item
+                for item in os.listdir(aur_dir)
+                if os.path.isdir(os.path.join(aur_dir, item))
+                and item not in installed_packages
+            )
         except subprocess.CalledProcessError as e:
             log_and_print(
                 f"{FAILURE} Error: Failed to clean AUR directory: {e.stderr.strip()}",
                 "error",
             )
+            return
+    to_purge = [
+        item
+        for item in stale_dirs
+        if policy_decide(
+            "clean_aur_dir",
+            item,
+            f"Remove old AUR source directory '{item}'? [y/N]: ",
+            default="n",
+        ) == "y"
+    ]
+    if to_purge:
+        with spinning_spinner():
+            stats = purge_paths([os.path.join(aur_dir, item) for item in to_purge])
+        report_purge(stats)
+    log_and_print(f"{SUCCESS} AUR directory cleaned.", "info")
 #####################################
 # 14. handle_pacnew_pacsave
 #####################################
+PACNEW_PLAN_DIR = os.path.join(CACHE_BASE_DIR, "pacnew")
+PACNEW_PLAN_FILE = os.path.join(PACNEW_PLAN_DIR, "plans.json")
+def find_pacman_backup_files(root="/etc"):
+    """Find *.pacnew and *.pacsave under 'root' in one scandir pass."""
+    pacnew, pacsave = [], []
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        if entry.name.endswith(".pacnew"):
+                            pacnew.append(entry.path)
+                        elif entry.name.endswith(".pacsave"):
+                            pacsave.append(entry.path)
+        except OSError as e:
+            logging.debug(f"pacnew scan: skipping {directory}: {e}")
+    return sorted(pacnew), sorted(pacsave)
+def _pristine_config(path, cache_index):
+    """
+    Contents of 'path' as shipped by the version of its owning package that
+    preceded the installed one, read from the newest such tarball in the
+    package cache. This is the merge base for the .pacnew. None if the owner
+    or an older cached package is unknown.
+    """
+    owners = pacman_file_owners(path)
+    if not owners:
+        return None, None
+    name = owners[0]
+    installed = pacman_local_packages().get(name, {}).get("version")
+    candidates = [
+        (version, pkg_path)
+        for (pkg_name, _), files in cache_index.items()
+        if pkg_name == name
+        for version, pkg_path, _ in files
+        if installed is None or vercmp(version, installed) < 0
+    ]
+    candidates.sort(key=functools.cmp_to_key(lambda a, b: vercmp(a[0], b[0])), reverse=True)
+    member_name = path.lstrip("/")
+    for version, pkg_path in candidates:
+        try:
+            with open_pacman_archive(pkg_path) as tar:
+                for member in tar:
+                    if member.name.removeprefix("./") == member_name and member.isfile():
+                        return tar.extractfile(member).read(), f"{name}-{version}"
+        except (OSError, tarfile.TarError) as e:
+            logging.debug(f"pacnew: cannot read {pkg_path}: {e}")
+    return None, None
+def _diff3_merge(current, base, new):
+    """Run 'diff3 -m' on three byte strings; returns (clean, merged_bytes)."""
+    with tempfile.TemporaryDirectory(prefix="vacuum-merge-") as tmp:
+        paths = []
+        for label, data in (("current", current), ("base", base), ("new", new)):
+            p = os.path.join(tmp, label)
+            with open(p, "wb") as f:
+                f.write(data)
+            paths.append(p)
+        result = timed_run(
+            ["diff3", "-m", "-L", "current", "-L", "base", "-L", "pacnew", *paths],
+            capture_output=True,
+        )
+    if result.returncode > 1:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip())
+    return result.returncode == 0, result.stdout
+def _plan_pacnew(pacnew, cache_index, previous):
+    """
+    Work out what to do with one .pacnew:
+      drop    - the current file already matches upstream, or only local edits exist
+      replace - the current file is pristine, only upstream changed
+      merge   - both changed without overlap; a clean 3-way merge is stored
+      review  - conflicting edits, no cached base, or no original
+    The result (and a unified diff of the proposed change) is stored under
+    PACNEW_PLAN_DIR and reused while both files are unchanged.
+    """
+    original = pacnew[: -len(".pacnew")]
+    try:
+        cur_st = os.stat(original)
+        new_st = os.stat(pacnew)
+    except OSError:
+        return {"action": "review", "reason": "original file missing"}
+    key = [cur_st.st_mtime_ns, cur_st.st_size, new_st.st_mtime_ns, new_st.st_size]
+    if previous and previous.get("key") == key:
+        if previous["action"] != "merge" or os.path.exists(previous.get("merged", "")):
+            return previous
+    with open(original, "rb") as f:
+        current = f.read()
+    with open(pacnew, "rb") as f:
+        new = f.read()
+    stem = os.path.join(PACNEW_PLAN_DIR, hashlib.sha1(pacnew.encode()).hexdigest())
+    plan = {"key": key}
+    result = None
+    if current == new:
+        plan.update(action="drop", reason="identical to upstream")
+    else:
+        base, base_pkg = _pristine_config(original, cache_index)
+        plan["base"] = base_pkg
+        if base is None:
+            plan.update(action="review", reason="no cached base version")
+        elif current == base:
+            plan.update(action="replace", reason="only upstream changed")
+            result = new
+        elif new == base:
+            plan.update(action="drop", reason="only local changes")
+        else:
+            clean, merged = _diff3_merge(current, base, new)
+            if clean:
+                plan.update(action="merge", reason="non-overlapping changes", merged=stem + ".merged")
+            else:
+                plan.update(action="review", reason="conflicting changes", conflict=stem + ".conflict")
+            with open(stem + (".merged" if clean else ".conflict"), "wb") as f:
+                f.write(merged)
+            result = merged
+    if result is not None:
+        diff = difflib.unified_diff(
+            current.decode("utf-8", "replace").splitlines(True),
+            result.decode("utf-8", "replace").splitlines(True),
+            fromfile=original,
+            tofile=f"{original} (proposed)",
+        )
+        with open(stem + ".diff", "w") as f:
+            f.writelines(diff)
+        plan["diff"] = stem + ".diff"
+    return plan
+def plan_pacnew_merges(pacnew_files, workers=WALK_WORKERS):
+    """Plan every .pacnew concurrently; returns {pacnew_path: plan}."""
+    os.makedirs(PACNEW_PLAN_DIR, exist_ok=True)
+    try:
+        with open(PACNEW_PLAN_FILE, "r") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    cache_index, _, _ = _scan_package_cache(pacman_cache_dirs())
+    plans = {}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="vacuum-pacnew"
+    ) as pool:
+        futures = {
+            pool.submit(_plan_pacnew, path, cache_index, previous.get(path)): path
+            for path in pacnew_files
+        }
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                plans[path] = future.result()
+            except Exception as e:
+                plans[path] = {"action": "review", "reason": f"planning failed: {e}"}
+    tmp_path = PACNEW_PLAN_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({p: plan for p, plan in plans.items() if "key" in plan}, f, indent=1)
+    os.replace(tmp_path, PACNEW_PLAN_FILE)
+    return plans
+def _install_config(original, content):
+    """Replace 'original' with 'content', keeping mode/owner and a .bak copy."""
+    st = os.stat(original)
+    shutil.copy2(original, original + ".bak")
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(original) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.chmod(tmp_path, st.st_mode & 0o7777)
+        os.chown(tmp_path, st.st_uid, st.st_gid)
+        os.replace(tmp_path, original)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+def apply_pacnew_plan(pacnew, plan):
+    """Carry out a drop/replace/merge plan; returns a summary line."""
+    original = pacnew[: -len(".pacnew")]
+    if plan["action"] == "replace":
+        with open(pacnew, "rb") as f:
+            _install_config(original, f.read())
+    elif plan["action"] == "merge":
+        with open(plan["merged"], "rb") as f:
+            _install_config(original, f.read())
+    os.remove(pacnew)
+    record_metric("files_touched", 1 if plan["action"] == "drop" else 2)
+    return f"Auto-resolved ({plan['action']}, {plan['reason']}): {pacnew}"
 def handle_pacnew_pacsave():
     """
     Automatically handle .pacnew and .pacsave files with single-character prompts:
     - pacnew: (m)erge, (r)eplace, (d)elete, (s)kip
     - pacsave: (R)estore, (d)elete, (s)kip
+    Every file is decided (policy rule, headless default 'skip', or prompt)
+    before any of them is touched.
 
-    The spinner is used only for the initial subprocess discovery phase where no
-    input is expected. All interactive prompt loops execute outside it to prevent
+    Each .pacnew is first planned against its merge base, the file as shipped
+    by the previous package version in the cache: files whose only changes
+    are upstream (or only local) are resolved automatically, non-overlapping
+    edits are merged with diff3, and only real conflicts reach the prompt.
+
+    The spinner is used only for discovery and planning, where no input is
+    expected. All interactive prompt loops execute outside it to prevent
     the spinner thread from corrupting terminal output during user prompts.
     """
     log_and_print(f"{INFO} Handling .pacnew and .pacsave files...", "info")
-    pacnew_files = []
-    pacsave_files = []
     try:
         with spinning_spinner():
-            pacnew_files = subprocess.check_output(
-                ["sudo", "find", "/etc", "-type", "f", "-name", "*.pacnew"],
-                text=True,
-            ).splitlines()
-            pacsave_files = subprocess.check_output(
-                ["sudo", "find", "/etc", "-type", "f", "-name", "*.pacsave"],
-                text=True,
-            ).splitlines()
-            pacnew_files = [f for f in pacnew_files if f.strip()]
-            pacsave_files = [f for f in pacsave_files if f.strip()]
-    except subprocess.CalledProcessError as e:
-        log_and_print(
-            f"{FAILURE} Error finding .pacnew/.pacsave files: {e.stderr.strip()}",
-            "error",
-        )
-        return
+            pacnew_files, pacsave_files = find_pacman_backup_files("/etc")
+            plans = plan_pacnew_merges(pacnew_files) if pacnew_files else {}
     except Exception as ex:
         log_and_print(f"{FAILURE} Unexpected error during discovery: {str(ex)}", "error")
         return
     actions_summary = []
+    for file in pacnew_files:
+        plan = plans[file]
+        if plan["action"] == "review" or policy_lookup("handle_pacnew_pacsave", file):
+            continue
+        try:
+            actions_summary.append(apply_pacnew_plan(file, plan))
+        except Exception as ex:
+            log_and_print(f"{FAILURE} Error auto-resolving {file}: {ex}", "error")
+            plan["action"] = "review"
+    pacnew_files = [f for f in pacnew_files if os.path.exists(f)]
     if pacnew_files:
-        log_and_print(f"{INFO} Found .pacnew files.", "info")
-        for file in pacnew_files:
-            print(f".pacnew file: {file}")
+        log_and_print(f"{INFO} .pacnew files needing review:", "info")
         for file in pacnew_files:
-            action = prompt_with_timeout(
+            plan = plans[file]
+            print(f".pacnew file: {file} ({plan.get('reason', 'policy rule')})")
+            if plan.get("conflict"):
+                print(f"  conflict-marked merge: {plan['conflict']}")
+            if plan.get("diff"):
+                print(f"  proposed diff: {plan['diff']}")
+        pacnew_actions = {
+            file: policy_decide(
+                "handle_pacnew_pacsave",
+                file,
                 f"File: {file}\n(m)erge, (r)eplace, (d)elete, (s)kip? ",
-                persistent=True,
-            ).lower()
+                default="s",
+            )
+            for file in pacnew_files
+        }
+        for file in pacnew_files:
+            action = pacnew_actions[file]
             if action == "m":
                 original_file = file[: -len(".pacnew")]
                 if not os.path.exists(original_file):
@@ -898,7 +2772,7 @@ def handle_pacnew_pacsave():
                         mode="w", dir=parent_dir, delete=False
                     ) as temp_merge:
                         merged_temp = temp_merge.name
-                    merge_result = subprocess.run(
+                    merge_result = timed_run(
                         [merge_tool, "-o", merged_temp, original_file, file],
                         check=False,
                     )
@@ -959,10 +2833,17 @@ def handle_pacnew_pacsave():
         log_and_print(f"{INFO} Found .pacsave files.", "info")
         for file in pacsave_files:
             print(f".pacsave file: {file}")
+        pacsave_actions = {
+            file: policy_decide(
+                "handle_pacnew_pacsave",
+                file,
+                f"File: {file}\n(R)estore, (d)elete, (s)kip? ",
+                default="s",
+            )
+            for file in pacsave_files
+        }
         for file in pacsave_files:
-            action = prompt_with_timeout(
-                f"File: {file}\n(R)estore, (d)elete, (s)kip? ", persistent=True
-            ).lower()
+            action = pacsave_actions[file]
             if action == "r":
                 original_file = file.replace(".pacsave", "")
                 backup_file = original_file + ".bak"
@@ -1013,7 +2894,7 @@ def check_db_dependencies():
     """
     log_and_print(f"{INFO} Auditing pacman database dependency tree...", "info")
     missing_deps = set()
-    result = subprocess.run(["pacman", "-Dk"], capture_output=True, text=True)
+    result = timed_run(["pacman", "-Dk"], capture_output=True, text=True)
     if result.returncode != 0:
         for line in (result.stdout + result.stderr).splitlines():
             # Canonical format: error: 'PKG': 'DEP' is a missing dependency
@@ -1023,52 +2904,405 @@ def check_db_dependencies():
     if missing_deps:
         logging.debug(f"check_db_dependencies: found {len(missing_deps)} unsatisfied: {missing_deps}")
     return missing_deps
-def check_broken_shared_libraries():
+ELF_SCAN_DIRS = ("/usr/bin", "/usr/lib", "/opt")
+# Trees under ELF_SCAN_DIRS that hold no dynamically linked userland objects.
+ELF_SCAN_PRUNE = frozenset({"/usr/lib/modules", "/usr/lib/firmware", "/usr/lib/debug"})
+ELF_CACHE_FILE = os.path.join(CACHE_BASE_DIR, "elf_deps.json")
+ELF_DEFAULT_DIRS = {
+    64: ("/usr/lib", "/lib", "/usr/lib64", "/lib64"),
+    32: ("/usr/lib32", "/lib32"),
+}
+PT_LOAD, PT_DYNAMIC, PT_INTERP = 1, 2, 3
+DT_NEEDED, DT_STRTAB, DT_STRSZ, DT_RPATH, DT_RUNPATH = 1, 5, 10, 15, 29
+def _read_elf_dynamic(path):
+    """
+    Parse the dynamic section of an ELF object without running the loader.
+    Returns (elf_class, needed_sonames, search_dirs) for dynamically linked
+    objects, or None for scripts, static binaries and non-ELF files.
+    search_dirs holds DT_RUNPATH/DT_RPATH with $ORIGIN expanded.
+    """
+    with open(path, "rb") as f:
+        ident = f.read(16)
+        if len(ident) < 16 or ident[:4] != b"\x7fELF" or ident[4] not in (1, 2):
+            return None
+        end = "<" if ident[5] == 1 else ">"
+        is64 = ident[4] == 2
+        if is64:
+            header = struct.unpack(end + "HHIQQQIHHH", f.read(48)[:42])
+            phoff, phentsize, phnum = header[4], header[8], header[9]
+            phdr_fmt, dyn_fmt = end + "IIQQQQQQ", end + "qQ"
+        else:
+            header = struct.unpack(end + "HHIIIIIHHH", f.read(36)[:30])
+            phoff, phentsize, phnum = header[4], header[8], header[9]
+            phdr_fmt, dyn_fmt = end + "IIIIIIII", end + "iI"
+        f.seek(phoff)
+        raw_phdrs = f.read(phentsize * phnum)
+        loads = []
+        dynamic = None
+        is_executable = False
+        for i in range(phnum):
+            fields = struct.unpack_from(phdr_fmt, raw_phdrs, i * phentsize)
+            if is64:
+                p_type, _, p_offset, p_vaddr, _, p_filesz = fields[:6]
+            else:
+                p_type, p_offset, p_vaddr, _, p_filesz = fields[:5]
+            if p_type == PT_LOAD:
+                loads.append((p_vaddr, p_offset, p_filesz))
+            elif p_type == PT_DYNAMIC:
+                dynamic = (p_offset, p_filesz)
+            elif p_type == PT_INTERP:
+                is_executable = True
+        if dynamic is None:
+            return None
+        f.seek(dynamic[0])
+        raw_dyn = f.read(dynamic[1])
+        dyn_size = struct.calcsize(dyn_fmt)
+        needed_offsets = []
+        path_offsets = []
+        strtab_vaddr = strsz = None
+        for i in range(len(raw_dyn) // dyn_size):
+            tag, val = struct.unpack_from(dyn_fmt, raw_dyn, i * dyn_size)
+            if tag == 0:
+                break
+            if tag == DT_NEEDED:
+                needed_offsets.append(val)
+            elif tag in (DT_RPATH, DT_RUNPATH):
+                path_offsets.append(val)
+            elif tag == DT_STRTAB:
+                strtab_vaddr = val
+            elif tag == DT_STRSZ:
+                strsz = val
+        if strtab_vaddr is None or not strsz:
+            return None
+        strtab_offset = next(
+            (off + strtab_vaddr - vaddr for vaddr, off, size in loads
+             if vaddr <= strtab_vaddr < vaddr + size),
+            None,
+        )
+        if strtab_offset is None:
+            return None
+        f.seek(strtab_offset)
+        strtab = f.read(strsz)
+    def string_at(offset):
+        return strtab[offset:strtab.find(b"\0", offset)].decode("utf-8", "replace")
+    origin = os.path.dirname(os.path.realpath(path))
+    search_dirs = []
+    for offset in path_offsets:
+        for entry in string_at(offset).split(":"):
+            entry = entry.replace("${ORIGIN}", origin).replace("$ORIGIN", origin)
+            if entry and entry not in search_dirs:
+                search_dirs.append(entry)
+    if not is_executable and origin not in search_dirs:
+        # Plugins and private libraries are loaded by a host that already has
+        # their directory on its search path; ldd would misreport them.
+        search_dirs.append(origin)
+    return (64 if is64 else 32), [string_at(o) for o in needed_offsets], search_dirs
+def _load_ldso_cache(path="/etc/ld.so.cache"):
+    """
+    Read the sonames known to ld.so.cache, returning {32: set(), 64: set()}.
+    Parses the glibc 'ld.so.cache1.1' format directly and only falls back to a
+    single 'ldconfig -p' call if the file cannot be parsed.
+    """
+    known = {32: set(), 64: set()}
+    magic = b"glibc-ld.so.cache1.1"
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        base = data.find(magic)
+        if base < 0:
+            raise ValueError("no glibc-ld.so.cache1.1 header")
+        nlibs = struct.unpack_from("=I", data, base + 20)[0]
+        for i in range(nlibs):
+            flags, key = struct.unpack_from("=iI", data, base + 48 + i * 24)
+            start = base + key
+            soname = data[start:data.index(b"\0", start)].decode("utf-8", "replace")
+            # The high byte of the flags names a 64-bit ABI (x86-64, AArch64...).
+            known[64 if flags & 0xFF00 else 32].add(soname)
+        return known
+    except (OSError, ValueError, struct.error) as e:
+        logging.warning(f"Could not parse {path} ({e}); falling back to ldconfig -p.")
+    result = timed_run(["ldconfig", "-p"], capture_output=True, text=True)
+    for line in result.stdout.splitlines()[1:]:
+        match = re.match(r"\s*(\S+) \(([^)]*)\)", line)
+        if match:
+            known[64 if "64" in match.group(2) else 32].add(match.group(1))
+    return known
+def _load_elf_cache():
+    """Load the persisted ELF dependency records ({path: record})."""
+    try:
+        with open(ELF_CACHE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+def _save_elf_cache(records):
+    """Atomically persist ELF dependency records."""
+    tmp_path = ELF_CACHE_FILE + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(records, f)
+        os.replace(tmp_path, ELF_CACHE_FILE)
+    except OSError as e:
+        logging.warning(f"Could not write ELF cache {ELF_CACHE_FILE}: {e}")
+def _scan_dir_for_elf_objects(path, cache):
+    """
+    scan_dir callback for _parallel_walk: return (path, record) pairs for the
+    executables and shared objects in 'path'. Records whose (inode, mtime)
+    match the cache are reused; anything else is parsed here, on the pool.
+    A record is [inode, mtime_ns, elf_class, needed, search_dirs]; class 0
+    marks files that are not dynamically linked ELF objects.
+    """
+    subdirs = []
+    found = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in ELF_SCAN_PRUNE:
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if not (st.st_mode & 0o111 or ".so" in entry.name):
+                    continue
+                cached = cache.get(entry.path)
+                if cached and cached[0] == st.st_ino and cached[1] == st.st_mtime_ns:
+                    found.append((entry.path, cached))
+                    continue
+                parsed = _read_elf_dynamic(entry.path)
+                if parsed:
+                    record = [st.st_ino, st.st_mtime_ns, *parsed]
+                else:
+                    record = [st.st_ino, st.st_mtime_ns, 0, [], []]
+                found.append((entry.path, record))
+            except (OSError, struct.error):
+                continue
+    return subdirs, found
+def check_broken_shared_libraries(scan_dirs=ELF_SCAN_DIRS):
     """
-    Scan /usr/bin binaries for broken ELF dynamic link references (missing .so files).
-    Uses ldd in batch mode for speed. Returns a list of missing .so names.
+    Scan executables and shared objects for DT_NEEDED entries that the dynamic
+    loader cannot satisfy. ELF headers are parsed in-process and resolved
+    against ld.so.cache plus each object's RUNPATH/RPATH; nothing is forked
+    per binary. Records are cached on (path, inode, mtime), so repeat audits
+    only parse files that changed. Returns a list of missing .so names.
     """
     log_and_print(f"{INFO} Auditing executable binaries for missing shared libraries (.so)...", "info")
     broken_libs = {}
     try:
-        cmd = "find /usr/bin -maxdepth 2 -type f -executable -exec ldd {} + 2>/dev/null | grep 'not found'"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        for line in result.stdout.splitlines():
-            match = re.search(r"(\S+\.so\S*)\s+=>\s+not found", line)
-            if match:
-                broken_libs.setdefault(match.group(1), True)
+        cache = _load_elf_cache()
+        roots = [(d, cache) for d in scan_dirs if os.path.isdir(d)]
+        records = dict(_parallel_walk(roots, _scan_dir_for_elf_objects))
+        _save_elf_cache(records)
+        known = _load_ldso_cache()
+        resolved = {}
+        for path, (_, _, elf_class, needed, search_dirs) in records.items():
+            if not elf_class:
+                continue
+            for soname in needed:
+                if soname in known[elf_class]:
+                    continue
+                key = (soname, elf_class, tuple(search_dirs))
+                if key not in resolved:
+                    resolved[key] = any(
+                        os.path.exists(os.path.join(d, soname))
+                        for d in (*search_dirs, *ELF_DEFAULT_DIRS[elf_class])
+                    )
+                if not resolved[key]:
+                    broken_libs.setdefault(soname, []).append(path)
+        for soname, users in broken_libs.items():
+            logging.info(f"Missing {soname} needed by: {', '.join(sorted(users)[:10])}")
     except Exception as e:
-        logging.error(f"Error during ldd shared library scan: {e}")
+        logging.error(f"Error during shared library scan: {e}")
     return list(broken_libs.keys())
+SONAME_INDEX_FILE = os.path.join(CACHE_BASE_DIR, "soname_index.sqlite")
+SONAME_RE = re.compile(r"^[^/]+\.so(\.[0-9][0-9.]*)?$")
+def _sync_files_dbs():
+    """Map repo name -> mtime_ns for every pacman files DB (pacman -Fy)."""
+    dbs = {}
+    try:
+        for name in os.listdir(PACMAN_SYNC_DIR):
+            if name.endswith(".files"):
+                path = os.path.join(PACMAN_SYNC_DIR, name)
+                dbs[name[: -len(".files")]] = os.stat(path).st_mtime_ns
+    except OSError:
+        pass
+    return dbs
+def _refresh_soname_index(conn, dbs):
+    """
+    Rebuild the soname table from the files DBs if any of them changed since
+    the last build. Only basenames that look like shared objects are indexed.
+    """
+    stored = dict(conn.execute("SELECT repo, mtime_ns FROM meta"))
+    if stored == dbs:
+        return
+    log_and_print(f"{INFO} Rebuilding soname index from pacman files DBs...", "info")
+    priority = {repo: i for i, repo in enumerate(pacman_repo_order())}
+    with conn:
+        conn.execute("DELETE FROM sonames")
+        conn.execute("DELETE FROM meta")
+        for repo, mtime_ns in dbs.items():
+            rows = []
+            db_path = os.path.join(PACMAN_SYNC_DIR, f"{repo}.files")
+            with open_pacman_archive(db_path) as tar:
+                for member in tar:
+                    if not member.isfile() or not member.name.endswith("/files"):
+                        continue
+                    pkgname = member.name.split("/", 1)[0].rsplit("-", 2)[0]
+                    listing = tar.extractfile(member).read().decode("utf-8", "replace")
+                    for line in listing.splitlines():
+                        soname = line.rsplit("/", 1)[-1]
+                        if ".so" in soname and SONAME_RE.match(soname):
+                            rows.append((soname, pkgname, repo, priority.get(repo, len(priority))))
+            conn.executemany("INSERT INTO sonames VALUES (?, ?, ?, ?)", rows)
+            conn.execute("INSERT INTO meta VALUES (?, ?)", (repo, mtime_ns))
+def resolve_sonames_to_packages(so_names):
+    """
+    Resolve many .so filenames to Arch packages in one lookup pass.
+    Uses a local sqlite index built from /var/lib/pacman/sync/*.files, which
+    is refreshed only when a files DB mtime changes. When several packages
+    ship the same soname the one from the highest-priority repo wins.
+    Returns {so_name: package}; unresolvable names are omitted.
+    """
+    so_names = sorted(set(so_names))
+    dbs = _sync_files_dbs()
+    if not so_names or not dbs:
+        return {}
+    providers = {}
+    try:
+        with closing(sqlite3.connect(SONAME_INDEX_FILE)) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sonames "
+                "(soname TEXT, pkg TEXT, repo TEXT, priority INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sonames_idx ON sonames (soname)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (repo TEXT PRIMARY KEY, mtime_ns INTEGER)"
+            )
+            _refresh_soname_index(conn, dbs)
+            for i in range(0, len(so_names), 500):
+                chunk = so_names[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for soname, pkg in conn.execute(
+                    f"SELECT soname, pkg FROM sonames WHERE soname IN ({placeholders}) "
+                    "ORDER BY priority DESC, pkg DESC",
+                    chunk,
+                ):
+                    providers[soname] = pkg  # last row = highest priority
+    except (sqlite3.Error, OSError, tarfile.TarError) as e:
+        logging.error(f"Soname index lookup failed: {e}")
+    return providers
 def resolve_so_to_package(so_name):
-    """Attempt to resolve a .so filename to an Arch package using pkgfile or pacman -F."""
+    """
+    Attempt to resolve a .so filename to an Arch package.
+    Consults the soname index first and only falls back to pkgfile or
+    pacman -F when the files DBs are unavailable.
+    """
+    provider = resolve_sonames_to_packages([so_name]).get(so_name)
+    if provider:
+        return provider
     if shutil.which("pkgfile"):
-        res = subprocess.run(["pkgfile", so_name], capture_output=True, text=True)
+        res = timed_run(["pkgfile", so_name], capture_output=True, text=True)
         if res.returncode == 0 and res.stdout.strip():
-            return res.stdout.strip().splitlines()[0]
-    res = subprocess.run(["pacman", "-Fq", so_name], capture_output=True, text=True)
+            return res.stdout.strip().splitlines()[0].split("/")[-1]
+    res = timed_run(["pacman", "-Fq", so_name], capture_output=True, text=True)
     if res.returncode == 0 and res.stdout.strip():
         return res.stdout.strip().splitlines()[0].split("/")[-1]
     return None
 def _build_official_pkg_set():
     """
-    Build an O(1)-lookup set of official-repo package names via 'pacman -Slq'.
-    Called once per verify_installed_packages() invocation so that classifying
-    N missing packages costs one subprocess call, not N.
+    Build an O(1)-lookup set of official-repo package names from the sync DBs.
+    The DBs are read in-process once per run, so classifying N missing
+    packages costs no subprocess calls at all.
     """
-    result = subprocess.run(["pacman", "-Slq"], capture_output=True, text=True)
-    if result.returncode != 0:
-        logging.warning("pacman -Slq failed; official-package classification may be inaccurate.")
-        return set()
-    return {line.strip() for line in result.stdout.splitlines() if line.strip()}
+    packages = pacman_sync_packages()
+    if not packages:
+        logging.warning("No sync DBs readable; official-package classification may be inaccurate.")
+    return set(packages)
 
 
+PKG_VERIFY_STATE_FILE = os.path.join(CACHE_BASE_DIR, "pkg_verify_state.json")
+# Problems that warrant a reinstall; mode/owner/mtime drift is only reported.
+PKG_REINSTALL_ISSUES = frozenset({"missing", "modified", "type"})
+def _local_package_dirs(packages=None):
+    """Return local-DB entry dirs, optionally limited to the given package names."""
+    try:
+        dirs = sorted(
+            os.path.join(PACMAN_LOCAL_DIR, d)
+            for d in os.listdir(PACMAN_LOCAL_DIR)
+            if os.path.isfile(os.path.join(PACMAN_LOCAL_DIR, d, "mtree"))
+        )
+    except OSError as e:
+        logging.error(f"Cannot read pacman local DB {PACMAN_LOCAL_DIR}: {e}")
+        return []
+    if packages is None:
+        return dirs
+    wanted = set(packages)
+    return [d for d in dirs if os.path.basename(d).rsplit("-", 2)[0] in wanted]
+def verify_package_files(packages=None, deep=True, workers=None):
+    """
+    Native replacement for 'pacman -Qk' (deep=False) and 'pacman -Qkk'
+    (deep=True) driven by /var/lib/pacman/local/*/mtree.
+    Packages are sharded across a process pool started via forkserver (the
+    caller runs alongside the spinner and other task threads, and forking a
+    threaded process can deadlock on their locks); the workers run
+    pkgverify.verify_package_mtree. A state file under
+    CACHE_BASE_DIR lets packages whose files did not change since the last
+    run be skipped without hashing. Returns {package: [(kind, path), ...]}
+    for every package with at least one issue.
+    """
+    try:
+        with open(PKG_VERIFY_STATE_FILE, "r") as f:
+            previous_state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        previous_state = {}
+    jobs = [
+        (pkg_dir, deep, previous_state.get(os.path.basename(pkg_dir)))
+        for pkg_dir in _local_package_dirs(packages)
+    ]
+    new_state = {} if packages is None else dict(previous_state)
+    problems = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+    ) as pool:
+        for job, (name, state, issues) in zip(
+            jobs, pool.map(pkgverify.verify_package_mtree, jobs, chunksize=16)
+        ):
+            new_state[os.path.basename(job[0])] = state
+            if issues:
+                problems[name] = issues
+    try:
+        tmp_path = PKG_VERIFY_STATE_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(new_state, f)
+        os.replace(tmp_path, PKG_VERIFY_STATE_FILE)
+    except OSError as e:
+        logging.warning(f"Could not write verify state {PKG_VERIFY_STATE_FILE}: {e}")
+    return problems
+def _report_package_problems(problems):
+    """
+    Log integrity problems per package and return the set of packages whose
+    issues warrant a reinstall (see PKG_REINSTALL_ISSUES).
+    """
+    flagged = set()
+    for pkg in sorted(problems):
+        kinds = {}
+        for kind, path in problems[pkg]:
+            kinds.setdefault(kind, []).append(path)
+        summary = ", ".join(f"{len(paths)} {kind}" for kind, paths in sorted(kinds.items()))
+        level = "warning" if PKG_REINSTALL_ISSUES & kinds.keys() else "info"
+        log_and_print(f"{WARNING if level == 'warning' else INFO} {pkg}: {summary}", level)
+        for kind, paths in sorted(kinds.items()):
+            for path in paths[:20]:
+                logging.info(f"{pkg}: {kind}: {path}")
+        if PKG_REINSTALL_ISSUES & kinds.keys():
+            flagged.add(pkg)
+    return flagged
 def verify_installed_packages():
     """
     Verify installed packages via multi-tier audit:
     1) Database Dependency Check  — pacman -Dk
-    2) Shared Library Linkage     — ldd missing .so
-    3) File Integrity Check       — pacman -Qk
+    2) Shared Library Linkage     — native ELF DT_NEEDED scan
+    3) File Integrity Check       — native mtree verification (-Qkk equivalent)
 
     Supports checking a single package or system-wide.
 
@@ -1076,16 +3310,18 @@ def verify_installed_packages():
     - All long-running subprocess calls that produce no user-facing output run
       inside spinning_spinner() contexts. All log_and_print/print calls run
       outside those contexts to prevent stdout races with the spinner thread.
-    - Official-repo membership is resolved via a single 'pacman -Slq' set lookup
+    - Official-repo membership is resolved via one in-process sync-DB read
       rather than per-package 'pacman -Si' calls.
     - Pacman lock is checked before any pacman write operation (keyring update).
     """
     log_and_print(f"{INFO} Starting multi-tier package & dependency verification...", "info")
     print("Choose scan scope:\n1) Single package\n2) System-wide")
-    choice = prompt_with_timeout("Enter your choice (1 or 2): ", persistent=True).strip()
+    choice = policy_decide(
+        "verify_installed_packages", "scope", "Enter your choice (1 or 2): ", default="2"
+    ).strip()
     single_pkg = None
     if choice == "1":
-        single_pkg = input("Enter the package name to check: ").strip()
+        single_pkg = "" if is_headless() else input("Enter the package name to check: ").strip()
         if not single_pkg:
             log_and_print(f"{FAILURE} No package name provided. Exiting.", "error")
             return
@@ -1098,17 +3334,12 @@ def verify_installed_packages():
     if single_pkg:
         # ── Single-package file-integrity path ──────────────────────────────
         log_and_print(f"{INFO} Checking file integrity for: {single_pkg}", "info")
+        if not _local_package_dirs([single_pkg]):
+            log_and_print(f"{FAILURE} Package {single_pkg} is not installed.", "error")
+            return
         with spinning_spinner():
-            result = subprocess.run(
-                ["pacman", "-Qk", single_pkg], capture_output=True, text=True
-            )
-        logging.debug(f"pacman -Qk {single_pkg} rc={result.returncode}")
-        output = result.stdout + result.stderr
-        for line in output.strip().split("\n"):
-            if ": 0 missing files" not in line and line.strip():
-                match = re.match(r"warning: (\S+): .*", line)
-                if match:
-                    missing_packages.add(match.group(1))
+            problems = verify_package_files([single_pkg])
+        missing_packages.update(_report_package_problems(problems))
     else:
         # ── System-wide three-tier audit ────────────────────────────────────
 
@@ -1125,13 +3356,20 @@ def verify_installed_packages():
             log_and_print(f"{SUCCESS} Tier 1: No unsatisfied DB dependencies.", "info")
 
         # Tier 2: Shared-library linkage check — silent subprocess, results after
-        log_and_print(f"{INFO} Tier 2: Scanning /usr/bin for missing shared libraries...", "info")
+        log_and_print(
+            f"{INFO} Tier 2: Scanning {', '.join(ELF_SCAN_DIRS)} for missing shared libraries...",
+            "info",
+        )
         with spinning_spinner():
             broken_sos = check_broken_shared_libraries()
         if broken_sos:
             log_and_print(f"{WARNING} Found missing shared libraries: {broken_sos}", "warning")
+            with spinning_spinner():
+                providers = resolve_sonames_to_packages(broken_sos)
             for so in broken_sos:
-                provider_pkg = resolve_so_to_package(so)
+                provider_pkg = providers.get(so) or (
+                    None if _sync_files_dbs() else resolve_so_to_package(so)
+                )
                 if provider_pkg:
                     log_and_print(
                         f"{INFO} Library {so} provided by package: {provider_pkg}", "info"
@@ -1144,21 +3382,13 @@ def verify_installed_packages():
         else:
             log_and_print(f"{SUCCESS} Tier 2: No broken shared library references.", "info")
 
-        # Tier 3: File integrity via pacman -Qk — long-running, wrapped in spinner
-        log_and_print(f"{INFO} Tier 3: File integrity check (pacman -Qk)...", "info")
+        # Tier 3: File integrity via local-DB mtree — process pool, incremental
+        log_and_print(f"{INFO} Tier 3: File integrity check (mtree, -Qkk equivalent)...", "info")
         with spinning_spinner():
-            result = subprocess.run(["pacman", "-Qk"], capture_output=True, text=True)
-        output = result.stdout + result.stderr
-        for line in output.strip().split("\n"):
-            if ": 0 missing files" not in line and line.strip():
-                match = re.match(r"warning: (\S+): .*", line)
-                if match:
-                    missing_packages.add(match.group(1))
-        if not any(
-            re.match(r"warning: \S+: .*", line)
-            for line in output.splitlines()
-            if ": 0 missing files" not in line
-        ):
+            problems = verify_package_files()
+        flagged = _report_package_problems(problems)
+        missing_packages.update(flagged)
+        if not flagged:
             log_and_print(f"{SUCCESS} Tier 3: All package files intact.", "info")
 
     if not missing_packages:
@@ -1180,19 +3410,20 @@ def verify_installed_packages():
     except IOError as e:
         log_and_print(f"{FAILURE} Error writing pkglist: {str(e)}", "error")
 
-    confirm = prompt_with_timeout(
+    confirm = policy_decide(
+        "verify_installed_packages",
+        "reinstall",
         f"Found {len(missing_packages)} package(s) needing reinstall. Proceed? [y/N]: ",
-        persistent=True,
-    ).lower()
+        default="n",
+    )
     if confirm != "y":
         log_and_print(f"{INFO} Package restoration aborted by user.", "info")
         return
 
     # ── Pacman lock check — BEFORE any write operation ──────────────────────
-    pacman_lock = "/var/lib/pacman/db.lck"
-    if os.path.exists(pacman_lock):
+    if os.path.exists(PACMAN_LOCK_FILE):
         log_and_print(
-            f"{FAILURE} Pacman lock at {pacman_lock} — another operation may be active; aborting safely.",
+            f"{FAILURE} Pacman lock at {PACMAN_LOCK_FILE} — another operation may be active; aborting safely.",
             "error",
         )
         return
@@ -1200,14 +3431,10 @@ def verify_installed_packages():
     # ── Keyring update ──────────────────────────────────────────────────────
     log_and_print(f"{INFO} Updating keyrings before reinstallation...", "info")
     keyring_packages = ["archlinux-keyring"]
-    if subprocess.run(
-        ["pacman", "-Qq", "chaotic-keyring"],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    ).returncode == 0:
+    if "chaotic-keyring" in pacman_local_packages():
         keyring_packages.append("chaotic-keyring")
 
-    keyring_update = subprocess.run(
+    keyring_update = timed_run(
         ["sudo", "pacman", "-S", "--needed", "--noconfirm", *keyring_packages],
         capture_output=True,
         text=True,
@@ -1217,8 +3444,9 @@ def verify_installed_packages():
         log_and_print(f"{FAILURE} Failed to update keyrings.", "error")
         return
     logging.info(keyring_update.stdout)
+    invalidate_pacman_db_cache()
 
-    # ── Classify: official vs AUR — O(1) set lookup, one subprocess total ───
+    # ── Classify: official vs AUR — O(1) set lookup, in-process sync DBs ────
     log_and_print(f"{INFO} Classifying packages against official repos...", "info")
     with spinning_spinner():
         official_pkg_set = _build_official_pkg_set()
@@ -1236,14 +3464,14 @@ def verify_installed_packages():
         log_and_print(
             f"{INFO} Reinstalling official packages: {sorted(official_packages)}", "info"
         )
-        reinstall_packages_pexpect(official_packages)
+        pacman_queue("install", official_packages)
 
     if aur_packages:
         if aur_helper:
             log_and_print(
                 f"{INFO} Reinstalling AUR packages: {sorted(aur_packages)}", "info"
             )
-            reinstall_aur_packages(aur_packages, aur_helper)
+            pacman_queue("install", aur_packages, repo_class="aur")
         else:
             log_and_print(
                 f"{FAILURE} AUR packages detected but no AUR helper found.", "error"
@@ -1266,11 +3494,10 @@ def detect_aur_helper():
     return found_helper
 def is_official_package(package):
     """
-    Check if a package is in official repos by running 'pacman -Si'.
-    If it fails, we assume AUR or non-existent.
+    Check if a package is in official repos via the in-process sync-DB reader.
+    If it is absent, we assume AUR or non-existent.
     """
-    result = subprocess.run(["pacman", "-Si", package], capture_output=True, text=True)
-    return result.returncode == 0 and "Repository" in result.stdout
+    return package in pacman_sync_packages()
 ###########################################
 # 16. reinstall_aur_packages
 ###########################################
@@ -1279,15 +3506,16 @@ def reinstall_aur_packages(packages, aur_helper):
     Reinstall AUR packages in batch using pexpect for automation.
     The log file handle is explicitly closed in a finally block to prevent
     file descriptor leaks across success, failure, and retry paths.
+    Returns True when the helper exited cleanly.
     """
     if not packages:
-        return
+        return True
     package_args = [str(package) for package in packages]
     combined = " ".join(package_args)
     log_and_print(
         f"{INFO} Reinstalling AUR packages with {aur_helper}: {combined}", "info"
     )
-    child = pexpect.spawn(
+    child = timed_spawn(
         aur_helper,
         ["-S", "--noconfirm", *package_args],
         encoding="utf-8",
@@ -1322,18 +3550,22 @@ def reinstall_aur_packages(packages, aur_helper):
                 logging.error(error_msg)
                 handle_pacman_errors(error_msg)
                 break
-        child.close()
+        close_timed_spawn(child)
+        invalidate_pacman_db_cache()
         if child.exitstatus == 0:
             log_and_print(
                 f"{SUCCESS} AUR packages reinstalled successfully: {combined}", "info"
             )
-        else:
-            log_and_print(
-                f"{FAILURE} Failed to reinstall some AUR packages: {combined}", "error"
-            )
+            return True
+        log_and_print(
+            f"{FAILURE} Failed to reinstall some AUR packages: {combined}", "error"
+        )
+        return False
     except Exception as e:
         log_and_print(f"{FAILURE} Error reinstalling AUR packages: {str(e)}", "error")
+        return False
     finally:
+        close_timed_spawn(child)
         log_fh.close()
 ############################################
 # 17. reinstall_packages_pexpect
@@ -1343,9 +3575,10 @@ def reinstall_packages_pexpect(packages, max_retries=3):
     Reinstall a list of official packages using pexpect, in one go, with retry.
     The log file handle is explicitly closed in a finally block inside the inner
     closure to prevent file descriptor leaks on every call, retry, and failure path.
+    Returns True once an attempt succeeds.
     """
     if not packages:
-        return
+        return True
     package_line = " ".join(packages)
     log_and_print(
         f"{INFO} Reinstalling official packages in batch: {package_line}", "info"
@@ -1359,7 +3592,7 @@ def reinstall_packages_pexpect(packages, max_retries=3):
     }
     def run_reinstall_once(pkgs):
         package_args = [str(package) for package in pkgs]
-        child = pexpect.spawn(
+        child = timed_spawn(
             "sudo",
             ["pacman", "-S", "--noconfirm", "--needed", *package_args],
             encoding="utf-8",
@@ -1394,12 +3627,14 @@ def reinstall_packages_pexpect(packages, max_retries=3):
                     logging.error(error_msg)
                     handle_pacman_errors(error_msg)
                     break
-            child.close()
+            close_timed_spawn(child)
+            invalidate_pacman_db_cache()
             return child.exitstatus
         except Exception as e:
             logging.error(str(e))
             return 1
         finally:
+            close_timed_spawn(child)
             log_fh.close()
     success = False
     retries = 0
@@ -1421,6 +3656,7 @@ def reinstall_packages_pexpect(packages, max_retries=3):
             f"{FAILURE} Failed to reinstall packages after {max_retries} attempts: {package_line}",
             "error",
         )
+    return success
 ################################
 # 18. handle_pacman_errors
 ################################
@@ -1462,33 +3698,38 @@ def handle_pacman_errors(error_msg):
 ############################
 def check_failed_cron_jobs(days_back=1):
     """
-    Check for failed cron jobs from 'days_back' days ago.
+    Check for failed cron jobs logged since the previous check.
     Uses 'cronie' — the correct systemd unit name for the cronie daemon on Arch Linux.
+    Reads the journal as a structured stream and persists a cursor, so each
+    run only examines entries written since the last one; 'days_back' bounds
+    the very first run.
     """
     log_and_print(
-        f"{INFO} Checking for failed cron jobs in last {days_back} day(s)...", "info"
+        f"{INFO} Checking for failed cron jobs since last check (first run: {days_back} day(s))...",
+        "info",
     )
     since_arg = f"{days_back} days ago"
     try:
-        cron_logs = subprocess.check_output(
-            ["journalctl", "-u", "cronie", "--since", since_arg],
-            text=True,
-            stderr=subprocess.DEVNULL,
+        total, per_unit, failed_jobs = summarize_journal(
+            iter_journal(["-u", "cronie"], cursor_name="check_failed_cron_jobs", since=since_arg),
+            is_failure_entry,
+            on_match=lambda entry: logging.error(format_journal_entry(entry)),
         )
-        failed_jobs = [
-            line for line in cron_logs.split("\n") if "FAILED" in line.upper()
-        ]
-        if failed_jobs:
+        if total:
             log_and_print(
-                f"{FAILURE} Failed cron jobs detected. Review logs for details.",
+                f"{FAILURE} {total} failed cron job entries detected. Review logs for details.",
                 "error",
             )
+            for unit, count in per_unit.most_common():
+                log_and_print(f"  {unit}: {count}", "error")
             for job in failed_jobs:
-                log_and_print(job, "error")
-            repair = prompt_with_timeout(
+                print(format_journal_entry(job))
+            repair = policy_decide(
+                "check_failed_cron_jobs",
+                "repair",
                 "Do you want to attempt to repair the failed cron jobs? (y/n): ",
-                persistent=True,
-            ).lower()
+                default="n",
+            )
             if repair == "y":
                 log_and_print(
                     f"{INFO} Please check the cron job definitions and logs manually.",
@@ -1496,39 +3737,241 @@ def check_failed_cron_jobs(days_back=1):
                 )
         else:
             log_and_print(f"{SUCCESS} No failed cron jobs detected.", "info")
-    except subprocess.CalledProcessError:
+    except OSError:
         log_and_print(
             f"{INFO} No failed cron jobs detected or logs not accessible.", "info"
         )
 ########################################
 # 20. clear_docker_images
 ########################################
-def clear_docker_images(dry_run=False, remove_volumes=False):
-    """Clear Docker images if Docker is installed."""
-    if shutil.which("docker"):
-        log_and_print(f"{INFO} Clearing Docker images/containers...", "info")
+# Engine API sockets, tried in order; DOCKER_HOST (unix://...) takes precedence.
+DOCKER_SOCKETS = (
+    "/var/run/docker.sock",
+    "/run/podman/podman.sock",
+    f"/run/user/{os.getuid()}/podman/podman.sock",
+)
+DOCKER_KEEP_PER_REPO = 2  # newest tagged images kept per repository
+DOCKER_KEEP_DAYS = 7  # anything created or used more recently is kept
+DOCKER_API_WORKERS = 8
+DOCKER_API_TIMEOUT = 60
+def docker_socket_path():
+    """Path of the Docker/Podman API socket, or None when none is listening."""
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    for path in DOCKER_SOCKETS:
         try:
-            command = ["sudo", "docker", "system", "prune", "-a", "-f"]
-            if remove_volumes:
-                command.append("--volumes")
-            if dry_run:
-                log_and_print(
-                    f"{INFO} [Dry Run] Command would be: {' '.join(command)}", "info"
-                )
-            else:
-                subprocess.run(command, check=True)
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                return path
+        except OSError:
+            continue
+    return None
+def docker_api(method, path, socket_path=None):
+    """
+    One request to the engine API over its unix socket; returns decoded JSON
+    (None for an empty body). Raises OSError on connection failures and
+    RuntimeError on HTTP errors. Each call uses its own connection so calls
+    can run on a thread pool.
+    """
+    socket_path = socket_path or docker_socket_path()
+    if not socket_path:
+        raise FileNotFoundError("no Docker/Podman API socket found")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(DOCKER_API_TIMEOUT)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    conn = http.client.HTTPConnection("localhost", timeout=DOCKER_API_TIMEOUT)
+    conn.sock = sock  # http.client only dials TCP when no socket is set
+    with closing(conn):
+        conn.request(method, path, headers={"Host": "docker", "Connection": "close"})
+        response = conn.getresponse()
+        body = response.read()
+    if response.status >= 400:
+        try:
+            message = json.loads(body).get("message", "")
+        except ValueError:
+            message = body.decode(errors="replace").strip()
+        raise RuntimeError(f"{method} {path}: HTTP {response.status} {message}")
+    return json.loads(body) if body.strip() else None
+def _parse_engine_time(value):
+    """Epoch seconds from an API timestamp (epoch int or RFC 3339 string)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value or value.startswith("0001-"):
+        return 0.0
+    # Trim nanoseconds to what fromisoformat accepts.
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value).replace("Z", "+00:00")
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return 0.0
+def _image_repo(tag):
+    """'registry:5000/app:1.2' -> 'registry:5000/app'; None for '<none>' tags."""
+    if not tag or tag.startswith("<none>"):
+        return None
+    repo, sep, suffix = tag.rpartition(":")
+    return repo if sep and "/" not in suffix else tag
+def docker_inventory(socket_path=None):
+    """
+    Images, containers and volumes with sizes (one /system/df call) plus the
+    last time each stopped container ran, inspected in parallel.
+    """
+    df = docker_api("GET", "/system/df", socket_path) or {}
+    containers = df.get("Containers") or []
+    now = time.time()
+    def last_used(container):
+        if container.get("State") == "running":
+            return now
+        try:
+            info = docker_api("GET", f"/containers/{container['Id']}/json", socket_path)
+        except (OSError, RuntimeError):
+            info = {}
+        finished = _parse_engine_time((info or {}).get("State", {}).get("FinishedAt"))
+        return max(finished, _parse_engine_time(container.get("Created")))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=DOCKER_API_WORKERS) as pool:
+        for container, used in zip(containers, pool.map(last_used, containers)):
+            container["LastUsed"] = used
+    return {
+        "images": df.get("Images") or [],
+        "containers": containers,
+        "volumes": df.get("Volumes") or [],
+    }
+def plan_docker_reclaim(inventory, keep_per_repo=DOCKER_KEEP_PER_REPO,
+                        keep_days=DOCKER_KEEP_DAYS, remove_volumes=False):
+    """
+    Decide what to remove. Containers: stopped ones not used in 'keep_days'.
+    Images: kept when used by a kept container, created or used within
+    'keep_days', or among the 'keep_per_repo' newest of any of their repos.
+    Volumes (opt-in): unreferenced and older than 'keep_days'.
+    Returns {"containers"|"images"|"volumes": [(id, label, bytes)], "bytes": n}.
+    """
+    cutoff = time.time() - keep_days * 86400
+    plan = {"containers": [], "images": [], "volumes": [], "bytes": 0}
+    kept_images = set()
+    image_last_used = collections.defaultdict(float)
+    for container in inventory["containers"]:
+        image_id = container.get("ImageID")
+        image_last_used[image_id] = max(image_last_used[image_id], container["LastUsed"])
+        if container.get("State") == "running" or container["LastUsed"] >= cutoff:
+            kept_images.add(image_id)
+            continue
+        name = (container.get("Names") or [container["Id"][:12]])[0].lstrip("/")
+        size = container.get("SizeRw") or 0
+        plan["containers"].append((container["Id"], name, size))
+    by_repo = collections.defaultdict(list)
+    for image in inventory["images"]:
+        for repo in {_image_repo(tag) for tag in image.get("RepoTags") or []} - {None}:
+            by_repo[repo].append(image)
+    for images in by_repo.values():
+        images.sort(key=lambda i: i.get("Created", 0), reverse=True)
+        kept_images.update(i["Id"] for i in images[:keep_per_repo])
+    for image in inventory["images"]:
+        last = max(_parse_engine_time(image.get("Created")), image_last_used[image["Id"]])
+        if image["Id"] in kept_images or last >= cutoff:
+            continue
+        tags = [t for t in image.get("RepoTags") or [] if _image_repo(t)]
+        size = max((image.get("Size") or 0) - max(image.get("SharedSize") or 0, 0), 0)
+        plan["images"].append((image["Id"], ", ".join(tags) or image["Id"][7:19], size))
+    if remove_volumes:
+        for volume in inventory["volumes"]:
+            usage = volume.get("UsageData") or {}
+            if usage.get("RefCount", 0) == 0 and _parse_engine_time(volume.get("CreatedAt")) < cutoff:
+                plan["volumes"].append((volume["Name"], volume["Name"], max(usage.get("Size", 0), 0)))
+    plan["bytes"] = sum(size for kind in ("containers", "images", "volumes") for _, _, size in plan[kind])
+    return plan
+def execute_docker_reclaim(plan, socket_path=None, workers=DOCKER_API_WORKERS):
+    """
+    Delete the planned objects in parallel through the API. Containers go
+    first so the images they pin become removable. Returns bytes reclaimed.
+    """
+    endpoints = (
+        ("containers", "/containers/{}?v=0"),
+        ("images", "/images/{}?force=1"),
+        ("volumes", "/volumes/{}"),
+    )
+    reclaimed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for kind, endpoint in endpoints:
+            futures = {
+                pool.submit(docker_api, "DELETE", endpoint.format(obj_id), socket_path): (label, size)
+                for obj_id, label, size in plan[kind]
+            }
+            for future in concurrent.futures.as_completed(futures):
+                label, size = futures[future]
+                try:
+                    future.result()
+                except (OSError, RuntimeError) as e:
+                    log_and_print(f"{FAILURE} Error: Failed to remove {kind[:-1]} {label}: {e}", "error")
+                    continue
+                reclaimed += size
+                record_metric("bytes_freed", size)
+                log_and_print(f"{SUCCESS} Removed {kind[:-1]} {label} ({format_size(size)}).", "info")
+    return reclaimed
+def clear_docker_images(dry_run=False, remove_volumes=False,
+                        keep_per_repo=DOCKER_KEEP_PER_REPO, keep_days=DOCKER_KEEP_DAYS):
+    """
+    Reclaim Docker/Podman space under retention rules instead of pruning
+    everything. Falls back to 'docker system prune' when the API socket is
+    not reachable.
+    """
+    socket_path = docker_socket_path()
+    if not socket_path:
+        if shutil.which("docker"):
+            _clear_docker_images_cli(dry_run, remove_volumes)
+        else:
             log_and_print(
-                f"{SUCCESS} Docker images cleared (remove_volumes={remove_volumes}, dry_run={dry_run}).",
-                "info",
+                f"{INFO} Docker is not installed. Skipping Docker image cleanup.", "info"
             )
-        except subprocess.CalledProcessError as e:
+        return
+    log_and_print(f"{INFO} Planning Docker/Podman cleanup via {socket_path}...", "info")
+    try:
+        with spinning_spinner():
+            inventory = docker_inventory(socket_path)
+    except (OSError, RuntimeError, ValueError) as e:
+        log_and_print(f"{FAILURE} Error: Could not query the container engine: {e}", "error")
+        return
+    plan = plan_docker_reclaim(inventory, keep_per_repo, keep_days, remove_volumes)
+    count = sum(len(plan[kind]) for kind in ("containers", "images", "volumes"))
+    if not count:
+        log_and_print(f"{SUCCESS} Nothing to reclaim under the retention rules.", "info")
+        return
+    log_and_print(
+        f"{INFO} Reclaim plan: {len(plan['containers'])} containers, {len(plan['images'])} images, "
+        f"{len(plan['volumes'])} volumes, {format_size(plan['bytes'])} "
+        f"(keeping {keep_per_repo} per repo and anything used in the last {keep_days} days).",
+        "info",
+    )
+    if dry_run:
+        for kind in ("containers", "images", "volumes"):
+            for _, label, size in plan[kind]:
+                log_and_print(f"{INFO} [Dry Run] Would remove {kind[:-1]} {label} ({format_size(size)}).", "info")
+        return
+    reclaimed = execute_docker_reclaim(plan, socket_path)
+    log_and_print(f"{SUCCESS} Reclaimed {format_size(reclaimed)} from the container engine.", "info")
+def _clear_docker_images_cli(dry_run=False, remove_volumes=False):
+    """Blanket 'docker system prune', used when the API socket is unavailable."""
+    log_and_print(f"{INFO} Clearing Docker images/containers...", "info")
+    try:
+        command = ["sudo", "docker", "system", "prune", "-a", "-f"]
+        if remove_volumes:
+            command.append("--volumes")
+        if dry_run:
             log_and_print(
-                f"{FAILURE} Error: Failed to clear Docker images: {e.stderr.strip()}",
-                "error",
+                f"{INFO} [Dry Run] Command would be: {' '.join(command)}", "info"
             )
-    else:
+        else:
+            timed_run(command, check=True)
+        log_and_print(
+            f"{SUCCESS} Docker images cleared (remove_volumes={remove_volumes}, dry_run={dry_run}).",
+            "info",
+        )
+    except subprocess.CalledProcessError as e:
         log_and_print(
-            f"{INFO} Docker is not installed. Skipping Docker image cleanup.", "info"
+            f"{FAILURE} Error: Failed to clear Docker images: {e}",
+            "error",
         )
 ##################################
 # 21. clear_temp_folder
@@ -1537,60 +3980,36 @@ def clear_temp_folder(age_days=2, whitelist=None):
     """
     Clear the temporary folder of files older than 'age_days'.
     If whitelist is provided, skip those files.
+    Age is judged by access time, as 'find -atime' did; directories are kept.
     """
     log_and_print(
         f"{INFO} Clearing the temporary folder (age > {age_days} days)...", "info"
     )
     if whitelist is None:
         whitelist = []
+    if os.path.isfile("/usr/lib/tmpfiles.d/tmp.conf"):
+        log_and_print(
+            f"{WARNING} Systemd tmpfiles might already handle /tmp. Operation could be redundant.",
+            "warning",
+        )
+    cutoff = time.time() - (age_days + 1) * 86400
+    def is_old_file(path, st):
+        return (
+            stat.S_ISREG(st.st_mode)
+            and st.st_atime < cutoff
+            and not any(wl in path for wl in whitelist)
+        )
     with spinning_spinner():
-        try:
-            if os.path.isfile("/usr/lib/tmpfiles.d/tmp.conf"):
-                log_and_print(
-                    f"{WARNING} Systemd tmpfiles might already handle /tmp. Operation could be redundant.",
-                    "warning",
-                )
-            find_command = [
-                "sudo",
-                "find",
-                "/tmp",
-                "-type",
-                "f",
-                "-atime",
-                f"+{age_days}",
-            ]
-            result = subprocess.run(
-                find_command, capture_output=True, text=True, check=True
-            )
-            old_files = result.stdout.strip().split("\n") if result.stdout else []
-            old_files = [
-                f
-                for f in old_files
-                if f.strip() and not any(wl in f for wl in whitelist)
-            ]
-            if not old_files:
-                log_and_print(
-                    f"{SUCCESS} No old files in /tmp older than {age_days} days (excluding whitelist).",
-                    "info",
-                )
-                return
-            log_and_print(
-                f"{INFO} Found {len(old_files)} old files in /tmp, removing now...",
-                "info",
-            )
-            for file_path in old_files:
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    log_and_print(
-                        f"{FAILURE} Failed to remove {file_path}: {e}", "error"
-                    )
-            log_and_print(f"{SUCCESS} Temporary folder cleared.", "info")
-        except subprocess.CalledProcessError as e:
-            log_and_print(
-                f"{FAILURE} Error: Failed to list or remove old files in /tmp: {e.stderr.strip()}",
-                "error",
-            )
+        stats = purge_paths(["/tmp"], file_filter=is_old_file, keep_root=True)
+    result = stats["/tmp"]
+    if not (result["files"] or result["errors"]):
+        log_and_print(
+            f"{SUCCESS} No old files in /tmp older than {age_days} days (excluding whitelist).",
+            "info",
+        )
+        return
+    report_purge(stats)
+    log_and_print(f"{SUCCESS} Temporary folder cleared.", "info")
 ####################################
 # 22. check_rmshit_script
 ####################################
@@ -1640,110 +4059,377 @@ def check_rmshit_script(config_path=None):
     except IOError as e:
         log_and_print(f"{FAILURE} Could not read {config_path}: {e}", "error")
         return
-    new_paths_input = input(
+    new_paths_input = "" if is_headless() else input(
         "Enter any additional paths to clean (space-separated, or leave blank): "
     ).strip()
     if new_paths_input:
         paths_to_clean.extend(new_paths_input.split())
+    confirmed = []
     for path in paths_to_clean:
         expanded_path = os.path.expanduser(path)
-        if not os.path.exists(expanded_path):
+        if not os.path.lexists(expanded_path):
             continue
-        confirm = prompt_with_timeout(
-            f"Remove {expanded_path}? [y/N]: ", persistent=True
-        ).lower()
+        confirm = policy_decide(
+            "check_rmshit_script",
+            expanded_path,
+            f"Remove {expanded_path}? [y/N]: ",
+            default="n",
+        )
         if confirm == "y":
-            if expanded_path in [os.path.expanduser("~"), "/root", "/etc"]:
+            if os.path.normpath(expanded_path) in [os.path.expanduser("~"), "/root", "/etc"]:
                 log_and_print(
                     f"{WARNING} Skipping critical path: {expanded_path}", "warning"
                 )
                 continue
-            try:
-                if os.path.isfile(expanded_path):
-                    os.remove(expanded_path)
-                    log_and_print(f"{INFO} Deleted file: {expanded_path}", "info")
-                elif os.path.isdir(expanded_path):
-                    shutil.rmtree(expanded_path)
-                    log_and_print(
-                        f"{INFO} Deleted directory: {expanded_path}", "info"
-                    )
-            except OSError as e:
-                log_and_print(
-                    f"{FAILURE} Error deleting {expanded_path}: {e}", "error"
-                )
-    log_and_print(f"{SUCCESS} Unnecessary files cleaned up.", "info")
+            confirmed.append(expanded_path)
+    if confirmed:
+        with spinning_spinner():
+            stats = purge_paths(confirmed)
+        total = report_purge(stats)
+        log_and_print(
+            f"{SUCCESS} Unnecessary files cleaned up, {format_size(total)} freed.",
+            "info",
+        )
+    else:
+        log_and_print(f"{SUCCESS} Unnecessary files cleaned up.", "info")
 ######################################
 # 23. remove_old_ssh_known_hosts / is_host_reachable
 ######################################
+SSH_PROBE_CONCURRENCY = 64
+SSH_PROBE_TIMEOUT = 2.0
+SSH_PROBE_CACHE_TTL = 6 * 3600
+SSH_PROBE_CACHE_FILE = os.path.join(CACHE_BASE_DIR, "ssh_host_probe.json")
+def _parse_known_host(host):
+    """'[host]:2222' -> ('host', 2222); 'host' -> ('host', 22)."""
+    match = re.match(r"^\[([^\]]+)\]:(\d+)$", host)
+    if match:
+        return match.group(1), int(match.group(2))
+    return host, 22
+def _known_host_pattern(name, port):
+    """Inverse of _parse_known_host: the form ssh hashes and writes."""
+    return name if port == 22 else f"[{name}]:{port}"
+def _hashed_host_matches(hashed, candidate):
+    """Check a '|1|salt|hash' known_hosts token against a host pattern."""
+    try:
+        _, _, salt, digest = hashed.split("|", 3)
+        return hmac.compare_digest(
+            hmac.digest(base64.b64decode(salt), candidate.encode(), "sha1"),
+            base64.b64decode(digest),
+        )
+    except (ValueError, TypeError):
+        return False
+def _ssh_config_hostnames(config_path="~/.ssh/config"):
+    """Concrete (non-wildcard) Host and HostName values from an ssh config."""
+    names = set()
+    try:
+        with open(os.path.expanduser(config_path), "r") as f:
+            for line in f:
+                parts = line.strip().split(None, 1)
+                if len(parts) == 2 and parts[0].lower() in ("host", "hostname"):
+                    names.update(
+                        n for n in parts[1].split() if not any(c in n for c in "*?!")
+                    )
+    except OSError:
+        pass
+    return names
+async def _probe_host(name, port, semaphore, timeout):
+    """
+    Resolve 'name' and open a TCP connection to its ssh port. A refused
+    connection still proves the host is up; only resolution failures and
+    timeouts count as unreachable.
+    """
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(
+                loop.getaddrinfo(name, port, type=socket.SOCK_STREAM), timeout
+            )
+        except (OSError, asyncio.TimeoutError):
+            logging.info(f"Host {name} does not resolve. Marking unreachable.")
+            return False
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(name, port), timeout
+            )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+            return True
+        except ConnectionRefusedError:
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+async def _probe_hosts(targets, concurrency, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(
+        *(_probe_host(name, port, semaphore, timeout) for name, port in targets)
+    )
+    return dict(zip(targets, results))
+def probe_hosts_reachable(
+    targets, concurrency=SSH_PROBE_CONCURRENCY, timeout=SSH_PROBE_TIMEOUT,
+    ttl=SSH_PROBE_CACHE_TTL,
+):
+    """
+    Probe (name, port) targets concurrently with asyncio and return
+    {target: reachable}. Results are cached in SSH_PROBE_CACHE_FILE and
+    reused while younger than 'ttl' seconds.
+    """
+    targets = sorted(set(targets))
+    now = time.time()
+    try:
+        with open(SSH_PROBE_CACHE_FILE, "r") as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        cache = {}
+    results = {}
+    to_probe = []
+    for target in targets:
+        cached = cache.get(_known_host_pattern(*target))
+        if cached and now - cached[1] < ttl:
+            results[target] = cached[0]
+        else:
+            to_probe.append(target)
+    if to_probe:
+        probed = asyncio.run(_probe_hosts(to_probe, concurrency, timeout))
+        for target, reachable in probed.items():
+            results[target] = reachable
+            cache[_known_host_pattern(*target)] = [reachable, now]
+        cache = {k: v for k, v in cache.items() if now - v[1] < ttl}
+        try:
+            with open(SSH_PROBE_CACHE_FILE, "w") as f:
+                json.dump(cache, f)
+        except OSError as e:
+            logging.warning(f"Could not write probe cache {SSH_PROBE_CACHE_FILE}: {e}")
+    return results
 def is_host_reachable(host):
     """
-    Check if a host is reachable: DNS resolution then single ping.
+    Check if a host is reachable: DNS resolution then a TCP probe of its
+    ssh port (see probe_hosts_reachable).
+    """
+    target = _parse_known_host(host)
+    return probe_hosts_reachable([target]).get(target, False)
+def _known_hosts_field(line):
+    """
+    Return the host-list field of a known_hosts line, or None for lines
+    that must be kept verbatim (comments, @cert-authority/@revoked markers).
     """
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#") or stripped.startswith("@"):
+        return None
+    return stripped.split()[0]
+def remove_old_ssh_known_hosts(known_hosts_path="~/.ssh/known_hosts"):
+    """
+    Remove SSH known hosts entries that are unreachable or do not resolve.
+    Every distinct host across all entries (comma-joined lists deduplicated)
+    is probed once, concurrently. Hashed |1| entries are matched against the
+    plain-text hosts and ~/.ssh/config names; hashed entries that match no
+    known name cannot be probed and are kept. An entry is dropped only when
+    all of its hosts are unreachable. The file is rewritten by streaming
+    into a temporary file in the same directory and renaming it into place.
+    """
+    ssh_known_hosts_file = os.path.expanduser(known_hosts_path)
+    if not os.path.isfile(ssh_known_hosts_file):
+        log_and_print(f"{INFO} No SSH known hosts file found. Skipping.", "info")
+        return
+    log_and_print(f"{INFO} Removing old SSH known hosts entries...", "info")
+    temp_path = None
     try:
-        resolve_result = subprocess.run(
-            ["getent", "hosts", host], capture_output=True, text=True
-        )
-        if resolve_result.returncode != 0:
-            logging.info(f"Host {host} does not resolve. Marking unreachable.")
+        plain_targets = set()
+        hashed_tokens = set()
+        with open(ssh_known_hosts_file, "r") as file:
+            for line in file:
+                field = _known_hosts_field(line)
+                if field is None:
+                    continue
+                for token in field.split(","):
+                    if token.startswith("|1|"):
+                        hashed_tokens.add(token)
+                    elif not any(c in token for c in "*?!"):
+                        plain_targets.add(_parse_known_host(token))
+        candidates = {_known_host_pattern(*t) for t in plain_targets}
+        candidates |= _ssh_config_hostnames()
+        hashed_targets = {}
+        for token in hashed_tokens:
+            match = next(
+                (c for c in candidates if _hashed_host_matches(token, c)), None
+            )
+            if match:
+                hashed_targets[token] = _parse_known_host(match)
+        reachable = probe_hosts_reachable(plain_targets | set(hashed_targets.values()))
+        def keep_entry(field):
+            for token in field.split(","):
+                if token.startswith("|1|"):
+                    target = hashed_targets.get(token)
+                    if target is None or reachable.get(target, False):
+                        return True
+                elif any(c in token for c in "*?!"):
+                    return True
+                elif reachable.get(_parse_known_host(token), False):
+                    return True
             return False
-        ping_cmd = ["ping", "-c", "1", "-W", "1", host]
-        result = subprocess.run(
-            ping_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
-def remove_old_ssh_known_hosts():
-    """Remove SSH known hosts entries that are unreachable or do not resolve."""
-    ssh_known_hosts_file = os.path.expanduser("~/.ssh/known_hosts")
-    if os.path.isfile(ssh_known_hosts_file):
-        log_and_print(f"{INFO} Removing old SSH known hosts entries...", "info")
-        try:
-            with open(ssh_known_hosts_file, "r") as file:
-                lines = file.readlines()
-            new_lines = []
-            for line in lines:
+        removed = 0
+        original_stat = os.stat(ssh_known_hosts_file)
+        with open(ssh_known_hosts_file, "r") as src, tempfile.NamedTemporaryFile(
+            mode="w", dir=os.path.dirname(ssh_known_hosts_file),
+            prefix=".known_hosts.", delete=False,
+        ) as dst:
+            temp_path = dst.name
+            for line in src:
                 if not line.strip():
                     continue
-                host = line.split()[0]
-                if not is_host_reachable(host):
-                    logging.info(f"Removing unreachable or unresolvable host: {host}")
-                else:
-                    new_lines.append(line)
-            with open(ssh_known_hosts_file, "w") as file:
-                file.writelines(new_lines)
-            log_and_print(f"{SUCCESS} Old SSH known hosts entries cleaned.", "info")
-        except Exception as e:
-            log_and_print(
-                f"{FAILURE} Error: Failed to remove old SSH known hosts entries: {str(e)}",
-                "error",
-            )
-    else:
-        log_and_print(f"{INFO} No SSH known hosts file found. Skipping.", "info")
+                field = _known_hosts_field(line)
+                if field is not None and not keep_entry(field):
+                    logging.info(f"Removing unreachable or unresolvable host: {field}")
+                    removed += 1
+                    continue
+                dst.write(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.chmod(temp_path, original_stat.st_mode & 0o7777)
+        os.chown(temp_path, original_stat.st_uid, original_stat.st_gid)
+        os.replace(temp_path, ssh_known_hosts_file)
+        temp_path = None
+        log_and_print(
+            f"{SUCCESS} Old SSH known hosts entries cleaned ({removed} removed).", "info"
+        )
+    except Exception as e:
+        log_and_print(
+            f"{FAILURE} Error: Failed to remove old SSH known hosts entries: {str(e)}",
+            "error",
+        )
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 ###############################
 # 24. remove_orphan_vim_undo_files
 ###############################
-def remove_orphan_vim_undo_files():
-    """Remove orphan Vim undo files (.un~) if the original file does not exist."""
+# Directory names or home-relative paths (globs) never searched for undo files.
+VIM_UNDO_EXCLUDES = (
+    "node_modules", ".git", ".hg", ".svn", "__pycache__", ".venv", "venv",
+    ".tox", ".cache", ".npm", ".cargo", ".rustup", ".mozilla",
+    ".local/share/Trash", ".local/share/Steam", ".local/lib",
+)
+# Vim/Neovim 'undodir' locations; files there are named after the full path
+# of the edited file with '/' replaced by '%'.
+VIM_UNDO_DIRS = (
+    "~/.vim/undo", "~/.vim/.undo", "~/.local/state/nvim/undo",
+    "~/.local/share/nvim/undo",
+)
+VIM_UNDO_CACHE_FILE = os.path.join(CACHE_BASE_DIR, "vim_undo_dirs.json")
+def _undo_file_target(name):
+    """Original file name for an in-tree undo file: '.foo.un~' -> 'foo'."""
+    stem = name[: -len(".un~")]
+    return stem[1:] if stem.startswith(".") else stem
+def _is_undo_excluded(path, name, home_dir, excludes):
+    rel = os.path.relpath(path, home_dir)
+    return any(
+        fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(rel, pattern)
+        for pattern in excludes
+    )
+def _scan_dir_for_undo_files(path, context):
+    """
+    _parallel_walk callback. A directory's mtime changes whenever an entry is
+    added, removed or renamed in it, which covers both new undo files and
+    deleted originals (they are siblings). So when the mtime matches the
+    cached one, the directory is not listed again: its subdirectories come
+    from the cache and its undo files are known to have their originals.
+    """
+    previous, current, home_dir, excludes = context
+    st = os.stat(path)
+    cached = previous.get(path)
+    if cached and cached[0] == st.st_mtime_ns:
+        current[path] = cached
+        return cached[1], []
+    subdirs, undo_files, names = [], [], set()
+    with os.scandir(path) as entries:
+        for entry in entries:
+            names.add(entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                if not _is_undo_excluded(entry.path, entry.name, home_dir, excludes):
+                    subdirs.append(entry.path)
+            elif entry.name.endswith(".un~"):
+                undo_files.append(entry.name)
+    orphans = [
+        os.path.join(path, name)
+        for name in undo_files
+        if _undo_file_target(name) not in names
+    ]
+    # Directories holding orphans are rescanned next run in case removal failed.
+    current[path] = [0 if orphans else st.st_mtime_ns, subdirs]
+    return subdirs, orphans
+def _undodir_orphans(undo_dirs):
+    """
+    Orphans in 'undodir' locations. Originals are grouped by parent directory
+    and each parent is listed once instead of stat'ing every original.
+    """
+    by_parent = {}
+    for undo_dir in undo_dirs:
+        undo_dir = os.path.expanduser(undo_dir)
+        try:
+            entries = os.listdir(undo_dir)
+        except OSError:
+            continue
+        for name in entries:
+            if "%" not in name:
+                continue
+            original = name.replace("%", "/")
+            parent, base = os.path.split(original)
+            by_parent.setdefault(parent, []).append((base, os.path.join(undo_dir, name)))
+    orphans = []
+    for parent, items in by_parent.items():
+        try:
+            present = set(os.listdir(parent))
+        except OSError:
+            present = set()
+        orphans.extend(undo for base, undo in items if base not in present)
+    return orphans
+def find_orphan_vim_undo_files(home_dir=None, undo_dirs=VIM_UNDO_DIRS, excludes=VIM_UNDO_EXCLUDES):
+    """
+    Return orphan undo files: in-tree '.name.un~' files whose 'name' is gone,
+    and undodir entries whose %-encoded original no longer exists. The home
+    walk is parallel, prunes 'excludes' and skips listing directories whose
+    mtime matches the previous run.
+    """
+    home_dir = os.path.abspath(home_dir or os.path.expanduser("~"))
+    try:
+        with open(VIM_UNDO_CACHE_FILE, "r") as f:
+            previous = json.load(f)
+        if previous.get("home") != home_dir or previous.get("excludes") != list(excludes):
+            previous = {}
+    except (OSError, ValueError):
+        previous = {}
+    current = {}
+    context = (previous.get("dirs", {}), current, home_dir, tuple(excludes))
+    orphans = list(_parallel_walk([(home_dir, context)], _scan_dir_for_undo_files))
+    orphans.extend(_undodir_orphans(undo_dirs))
+    tmp_path = VIM_UNDO_CACHE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"home": home_dir, "excludes": list(excludes), "dirs": current}, f)
+    os.replace(tmp_path, VIM_UNDO_CACHE_FILE)
+    return sorted(set(orphans))
+def remove_orphan_vim_undo_files(home_dir=None):
+    """Remove orphan Vim undo files (.un~ and undodir entries) whose original is gone."""
     log_and_print(f"{INFO} Searching for orphan Vim undo files...", "info")
-    home_dir = os.path.expanduser("~")
-    with spinning_spinner():
-        for root, _, files in os.walk(home_dir):
-            for file in files:
-                if file.endswith(".un~"):
-                    original_file = os.path.splitext(os.path.join(root, file))[0]
-                    if not os.path.exists(original_file):
-                        try:
-                            os.remove(os.path.join(root, file))
-                            log_and_print(
-                                f"{SUCCESS} Removed orphan Vim undo file: {file}",
-                                "info",
-                            )
-                        except OSError as e:
-                            log_and_print(
-                                f"{FAILURE} Error: Failed to remove orphan Vim undo file: {e}",
-                                "error",
-                            )
+    home_dir = os.path.abspath(home_dir or os.path.expanduser("~"))
+    orphans = watched_paths("orphans", [home_dir])
+    if orphans is None:
+        with spinning_spinner():
+            orphans = find_orphan_vim_undo_files(home_dir)
+    if not orphans:
+        log_and_print(f"{SUCCESS} No orphan Vim undo files found.", "info")
+        return
+    for path in orphans:
+        try:
+            os.remove(path)
+            record_metric("files_touched")
+            log_and_print(f"{SUCCESS} Removed orphan Vim undo file: {path}", "info")
+        except OSError as e:
+            log_and_print(
+                f"{FAILURE} Error: Failed to remove orphan Vim undo file: {e}",
+                "error",
+            )
 ######################################
 # 25. force_log_rotation
 ######################################
@@ -1756,7 +4442,7 @@ def force_log_rotation(config_path="/etc/logrotate.conf"):
         )
         return
     try:
-        subprocess.run(["sudo", "logrotate", "-f", config_path], check=True)
+        timed_run(["sudo", "logrotate", "-f", config_path], check=True)
         log_and_print(
             f"{SUCCESS} Log rotation forced with config {config_path}.", "info"
         )
@@ -1789,19 +4475,19 @@ def configure_zram():
         return
     with spinning_spinner():
         try:
-            mem_total_output = subprocess.check_output(
+            mem_total_output = timed_check_output(
                 "awk '/MemTotal/ {print int($2 * 1024 * 0.25)}' /proc/meminfo",
                 shell=True,
             ).strip()
             mem_total = int(mem_total_output)
             log_and_print(f"Calculated ZRam size: {mem_total} bytes", "info")
-            zram_device = subprocess.check_output(
+            zram_device = timed_check_output(
                 ["sudo", "zramctl", "--find", "--size", str(mem_total)],
                 text=True,
             ).strip()
             log_and_print(f"Using zram device: {zram_device}", "info")
-            subprocess.run(["sudo", "mkswap", zram_device], check=True)
-            subprocess.run(["sudo", "swapon", zram_device, "-p", "32767"], check=True)
+            timed_run(["sudo", "mkswap", zram_device], check=True)
+            timed_run(["sudo", "swapon", zram_device, "-p", "32767"], check=True)
             log_and_print(
                 f"{SUCCESS} ZRam configured successfully on {zram_device} with size {mem_total} bytes.",
                 "info",
@@ -1820,12 +4506,12 @@ def check_zram_configuration():
         )
         return
     try:
-        zram_status = subprocess.check_output(["zramctl"], text=True).strip()
+        zram_status = timed_check_output(["zramctl"], text=True).strip()
         if zram_status and "NAME" in zram_status:
             log_and_print(
                 f"{SUCCESS} ZRam is configured. Current status:\n{zram_status}", "info"
             )
-            swap_status = subprocess.check_output(["swapon", "--show"], text=True)
+            swap_status = timed_check_output(["swapon", "--show"], text=True)
             if "/dev/zram" in swap_status:
                 log_and_print(
                     f"{SUCCESS} ZRam is actively used as swap:\n{swap_status}", "info"
@@ -1872,7 +4558,7 @@ def adjust_swappiness(value=133, force=False):
         return
     log_and_print(f"{INFO} Adjusting swappiness to {value}...", "info")
     try:
-        subprocess.run(
+        timed_run(
             ["sudo", "sysctl", f"vm.swappiness={value}"], check=True
         )
         log_and_print(f"{SUCCESS} Swappiness adjusted to {value}.", "info")
@@ -1887,16 +4573,18 @@ def adjust_swappiness(value=133, force=False):
 def clear_system_cache(confirm_before=True):
     """Clear PageCache, dentries, and inodes with optional user confirmation."""
     if confirm_before:
-        confirm = prompt_with_timeout(
+        confirm = policy_decide(
+            "clear_system_cache",
+            "drop_caches",
             "Warning: Clearing system caches can degrade performance temporarily. Proceed? [y/N]: ",
-            persistent=True,
+            default="n",
         )
-        if confirm.lower() != "y":
+        if confirm != "y":
             log_and_print(f"{INFO} System cache clearing aborted by user.", "info")
             return
     log_and_print(f"{INFO} Clearing PageCache, dentries, and inodes...", "info")
     try:
-        subprocess.run(
+        timed_run(
             ["sudo", "sh", "-c", "echo 3 > /proc/sys/vm/drop_caches"], check=True
         )
         log_and_print(f"{SUCCESS} System caches cleared.", "info")
@@ -1908,10 +4596,69 @@ def clear_system_cache(confirm_before=True):
 #####################################
 # 30. disable_unused_services
 #####################################
+def _disable_service_systemctl(service):
+    """Per-unit systemctl fallback for disable_unused_services; True if disabled."""
+    status_result = timed_run(
+        ["systemctl", "is-enabled", service],
+        capture_output=True,
+        text=True,
+    )
+    if "enabled" not in status_result.stdout:
+        log_and_print(f"{INFO} {service} is not enabled or not installed.", "info")
+        return False
+    timed_run(["sudo", "systemctl", "disable", "--now", service], check=False)
+    log_and_print(f"{SUCCESS} {service} has been disabled and stopped.", "info")
+    return True
+def _disable_services_dbus(services):
+    """
+    Disable and stop 'services' over one systemd D-Bus connection: one
+    unit-file state query, one DisableUnitFiles and concurrent stop jobs.
+    Returns the services that were disabled.
+    Raises OSError/RuntimeError only while nothing has changed: up to
+    DisableUnitFiles, or when systemd refuses that call. Once the units may
+    be disabled, errors are reported here and the units returned, since the
+    systemctl fallback would see them as disabled and neither stop them nor
+    record them in the backup.
+    """
+    bus = dbus_connect()
+    with closing(bus.sock):
+        states = systemd_unit_file_states(bus, services)
+        enabled = [s for s in services if "enabled" in states.get(s, "")]
+        for service in services:
+            if service not in enabled:
+                log_and_print(f"{INFO} {service} is not enabled or not installed.", "info")
+        if not enabled:
+            return []
+        try:
+            _systemd_call(bus, "DisableUnitFiles", "asb", [enabled, False])
+        except OSError as e:
+            # The bus went away mid-call, so the disable may have applied.
+            log_and_print(f"{FAILURE} Error: Disabling {', '.join(enabled)} over D-Bus failed: {e}", "error")
+            return enabled
+        try:
+            _systemd_call(bus, "Reload")
+            results = systemd_unit_jobs(bus, "StopUnit", enabled)
+        except (OSError, RuntimeError) as e:
+            log_and_print(
+                f"{FAILURE} Error: {', '.join(enabled)} disabled, but stopping them over D-Bus failed: {e}",
+                "error",
+            )
+            return enabled
+    for service in enabled:
+        if results[service] == "done":
+            log_and_print(f"{SUCCESS} {service} has been disabled and stopped.", "info")
+        else:
+            log_and_print(
+                f"{WARNING} {service} has been disabled; stop job result: {results[service]}",
+                "warning",
+            )
+    return enabled
 def disable_unused_services(services=None, reversible=True):
     """
     Disable a list of unused services, checking if installed first.
     Stores a backup of previously enabled services if reversible=True.
+    Talks to systemd over D-Bus, falling back to systemctl per unit when the
+    bus is unreachable or the calls are refused.
     """
     log_and_print(f"{INFO} Disabling unused services...", "info")
     if services is None:
@@ -1930,50 +4677,89 @@ def disable_unused_services(services=None, reversible=True):
         )
         with open(backup_file, "w") as bf:
             bf.write("Previously enabled services:\n")
-    for service in services:
-        try:
-            status_result = subprocess.run(
-                ["systemctl", "is-enabled", service],
-                capture_output=True,
-                text=True,
-            )
-            if "enabled" in status_result.stdout:
-                subprocess.run(
-                    ["sudo", "systemctl", "disable", "--now", service], check=False
-                )
-                log_and_print(
-                    f"{SUCCESS} {service} has been disabled and stopped.", "info"
-                )
-                if reversible and backup_file:
-                    with open(backup_file, "a") as bf:
-                        bf.write(service + "\n")
-            else:
+    try:
+        disabled = _disable_services_dbus(services)
+    except (OSError, RuntimeError) as e:
+        logging.debug(f"systemd D-Bus unavailable, using systemctl: {e}")
+        disabled = []
+        for service in services:
+            try:
+                if _disable_service_systemctl(service):
+                    disabled.append(service)
+            except Exception as e:
                 log_and_print(
-                    f"{INFO} {service} is not enabled or not installed.", "info"
+                    f"{FAILURE} Error disabling {service}: {str(e)}", "error"
                 )
-        except Exception as e:
-            log_and_print(
-                f"{FAILURE} Error disabling {service}: {str(e)}", "error"
-            )
     if reversible and backup_file:
+        with open(backup_file, "a") as bf:
+            bf.writelines(service + "\n" for service in disabled)
         log_and_print(
             f"{INFO} Backup of disabled services stored in {backup_file}", "info"
         )
 ###################################
 # 31. check_and_restart_systemd_units
 ###################################
+def _confirm_unit_restarts(failed_units):
+    return [
+        unit
+        for unit in failed_units
+        if policy_decide(
+            "check_and_restart_systemd_units",
+            unit,
+            f"Restart failed unit {unit}? [y/N]: ",
+            default="n",
+        ) == "y"
+    ]
+def _restart_failed_units_dbus():
+    """
+    D-Bus path for check_and_restart_systemd_units: failed units come from
+    one ListUnitsFiltered call and the chosen restarts run concurrently,
+    each awaited through its JobRemoved signal. Afterwards the failed state
+    is reset for every unit except those whose restart failed.
+    Raises OSError/RuntimeError only before the operator is prompted; once
+    they have answered, errors are reported here instead of falling back to
+    systemctl, which would prompt for the same units again.
+    """
+    bus = dbus_connect()
+    with closing(bus.sock):
+        failed_units = [u for u in systemd_failed_units(bus) if u.endswith(".service")]
+        if not failed_units:
+            log_and_print(f"{SUCCESS} No failed systemd units.", "info")
+            return
+        log_and_print(f"{INFO} Restarting failed systemd units...", "info")
+        to_restart = _confirm_unit_restarts(failed_units)
+        try:
+            results = systemd_unit_jobs(bus, "RestartUnit", to_restart) if to_restart else {}
+            dbus_call_many(bus, [
+                (SYSTEMD_BUS_NAME, SYSTEMD_PATH, SYSTEMD_MANAGER, "ResetFailedUnit", "s", [unit])
+                for unit in failed_units
+                if results.get(unit, "done") == "done"
+            ])
+        except (OSError, RuntimeError) as e:
+            log_and_print(f"{FAILURE} Error: Restarting failed units over D-Bus failed: {e}", "error")
+            return
+    for unit, result in results.items():
+        if result == "done":
+            log_and_print(f"{SUCCESS} Restarted {unit}.", "info")
+        else:
+            log_and_print(f"{FAILURE} Error: Restarting {unit} failed: {result}", "error")
+    log_and_print(f"{SUCCESS} Finished attempting restarts on failed units.", "info")
 def check_and_restart_systemd_units():
-    """Check and optionally restart failed systemd units individually."""
+    """Check and optionally restart failed systemd units."""
     log_and_print(
         f"{INFO} Checking and restarting failed systemd units...", "info"
     )
     try:
-        units_out = subprocess.check_output(["systemctl", "--failed"], text=True)
+        _restart_failed_units_dbus()
+        return
+    except (OSError, RuntimeError) as e:
+        logging.debug(f"systemd D-Bus unavailable, using systemctl: {e}")
+    try:
+        units_out = timed_check_output(["systemctl", "--failed"], text=True)
         if "0 loaded units listed" in units_out:
             log_and_print(f"{SUCCESS} No failed systemd units.", "info")
             return
         log_and_print(f"{INFO} Restarting failed systemd units...", "info")
-        subprocess.run(["sudo", "systemctl", "reset-failed"], check=True)
         lines = units_out.strip().split("\n")[1:]
         failed_units = []
         for line in lines:
@@ -1981,20 +4767,21 @@ def check_and_restart_systemd_units():
                 parts = line.split()
                 if parts and parts[0].endswith(".service"):
                     failed_units.append(parts[0])
-        for unit in failed_units:
-            confirm = prompt_with_timeout(
-                f"Restart failed unit {unit}? [y/N]: ", persistent=True
-            ).lower()
-            if confirm == "y":
-                subprocess.run(
-                    ["sudo", "systemctl", "restart", unit], check=False
-                )
+        to_restart = _confirm_unit_restarts(failed_units)
+        if to_restart:
+            timed_run(
+                ["sudo", "systemctl", "restart", *to_restart], check=False
+            )
+        # Restarted units are active again or still show why they failed.
+        declined = [unit for unit in failed_units if unit not in to_restart]
+        if declined:
+            timed_run(["sudo", "systemctl", "reset-failed", *declined], check=True)
         log_and_print(
             f"{SUCCESS} Finished attempting restarts on failed units.", "info"
         )
-    except subprocess.CalledProcessError as e:
+    except (OSError, subprocess.CalledProcessError) as e:
         log_and_print(
-            f"{FAILURE} Error: Failed to check or restart systemd units: {e.stderr.strip()}",
+            f"{FAILURE} Error: Failed to check or restart systemd units: {e}",
             "error",
         )
 ###################################
@@ -2013,7 +4800,7 @@ def security_audit():
     open_ports = ""
     try:
         log_and_print(f"{INFO} Checking for open ports on all interfaces...", "info")
-        result = subprocess.run(["sudo", "ss", "-tuln"], capture_output=True, text=True)
+        result = timed_run(["sudo", "ss", "-tuln"], capture_output=True, text=True)
         if result.returncode == 0:
             open_ports = result.stdout.strip()
             logging.info("Open ports and listening services:\n" + open_ports)
@@ -2024,7 +4811,7 @@ def security_audit():
                 f"{FAILURE} Error checking open ports: {result.stderr.strip()}", "error"
             )
         log_and_print(f"{INFO} Checking if ExpressVPN (tun0) is active...", "info")
-        tun0_check = subprocess.run(
+        tun0_check = timed_run(
             ["ip", "addr", "show", "dev", "tun0"], capture_output=True, text=True
         )
         tun0_active = tun0_check.returncode == 0
@@ -2048,7 +4835,7 @@ def security_audit():
                 "info",
             )
             try:
-                subprocess.run(nmap_cmd, check=True)
+                timed_run(nmap_cmd, check=True)
                 log_and_print(
                     f"{SUCCESS} Nmap scan completed. Check logs for results.", "info"
                 )
@@ -2082,13 +4869,16 @@ def security_audit():
 def manage_users_and_groups():
     """
     Delegate to external 'grouctl' script if present, otherwise use built-in
-    minimal user/group management.
+    minimal user/group management. Interactive only; skipped when headless.
     """
+    if is_headless():
+        log_and_print(f"{INFO} Skipping user/group management in headless mode.", "info")
+        return
     grouctl_path = shutil.which("grouctl")
     if grouctl_path:
         log_and_print(f"{INFO} Found grouctl script: {grouctl_path}", "info")
         log_and_print(f"{INFO} Launching grouctl for user management...", "info")
-        subprocess.run(["sudo", grouctl_path])
+        timed_run(["sudo", grouctl_path])
     else:
         log_and_print(
             f"{WARNING} grouctl script not found. Falling back to minimal approach...",
@@ -2114,7 +4904,7 @@ def manage_users_and_groups():
                 username = input("Enter username: ").strip()
                 if username:
                     try:
-                        groups = subprocess.check_output(
+                        groups = timed_check_output(
                             ["id", "-nG", username], text=True
                         ).strip()
                         log_and_print(
@@ -2130,7 +4920,7 @@ def manage_users_and_groups():
             elif choice == "2":
                 username = input("Enter username: ").strip()
                 if username:
-                    result = subprocess.run(
+                    result = timed_run(
                         ["cut", "-d:", "-f1", "/etc/group"],
                         capture_output=True,
                         text=True,
@@ -2142,7 +4932,7 @@ def manage_users_and_groups():
                         )
                         if selected_groups:
                             for group in selected_groups:
-                                subprocess.run(
+                                timed_run(
                                     ["sudo", "usermod", "-aG", group, username],
                                     check=False,
                                 )
@@ -2164,7 +4954,7 @@ def manage_users_and_groups():
                 if username:
                     try:
                         groups = (
-                            subprocess.check_output(["id", "-nG", username], text=True)
+                            timed_check_output(["id", "-nG", username], text=True)
                             .strip()
                             .split()
                         )
@@ -2179,7 +4969,7 @@ def manage_users_and_groups():
                         )
                         if selected_groups:
                             for group in selected_groups:
-                                subprocess.run(
+                                timed_run(
                                     ["sudo", "gpasswd", "-d", username, group],
                                     check=False,
                                 )
@@ -2205,7 +4995,7 @@ def manage_users_and_groups():
                         "network", "power",
                     ]
                     for group in standard_groups:
-                        subprocess.run(
+                        timed_run(
                             ["sudo", "usermod", "-aG", group, username], check=False
                         )
                     log_and_print(
@@ -2219,7 +5009,7 @@ def manage_users_and_groups():
                 if not os.path.isfile(wheel_sudoers):
                     with open(wheel_sudoers, "w") as wf:
                         wf.write("%wheel ALL=(ALL) ALL\n")
-                    subprocess.run(
+                    timed_run(
                         ["sudo", "chmod", "440", wheel_sudoers], check=False
                     )
                     log_and_print(
@@ -2245,7 +5035,7 @@ def select_items_from_list(items, prompt):
     try:
         if shutil.which("fzf"):
             fzf_command = ["fzf", "-m", "--prompt", prompt]
-            result = subprocess.run(
+            result = timed_run(
                 fzf_command, input="\n".join(items), capture_output=True, text=True
             )
             if result.returncode == 0:
@@ -2286,154 +5076,338 @@ def configure_firewall():
                 "error",
             )
             return
-        confirm_reset = prompt_with_timeout(
-            "Do you want to reset UFW to default settings? [y/N]: ", persistent=True
-        ).lower()
+        confirm_reset = policy_decide(
+            "configure_firewall",
+            "reset",
+            "Do you want to reset UFW to default settings? [y/N]: ",
+            default="n",
+        )
         if confirm_reset == "y":
-            subprocess.run(["sudo", "ufw", "reset"], check=False)
+            timed_run(["sudo", "ufw", "reset"], check=False)
             log_and_print(f"{INFO} UFW settings reset to default.", "info")
-        subprocess.run(
+        timed_run(
             ["sudo", "ufw", "default", "deny", "incoming"], check=False
         )
-        subprocess.run(
+        timed_run(
             ["sudo", "ufw", "default", "allow", "outgoing"], check=False
         )
         log_and_print(
             f"{INFO} Set default policies: deny incoming, allow outgoing.", "info"
         )
-        ssh_confirm = prompt_with_timeout(
-            "Do you want to allow SSH connections? [Y/n]: ", persistent=True
-        ).lower()
+        ssh_confirm = policy_decide(
+            "configure_firewall",
+            "allow_ssh",
+            "Do you want to allow SSH connections? [Y/n]: ",
+            default="y",
+        )
         if ssh_confirm != "n":
-            subprocess.run(["sudo", "ufw", "allow", "ssh"], check=False)
+            timed_run(["sudo", "ufw", "allow", "ssh"], check=False)
             log_and_print(f"{INFO} SSH connections allowed.", "info")
         else:
-            subprocess.run(["sudo", "ufw", "deny", "ssh"], check=False)
+            timed_run(["sudo", "ufw", "deny", "ssh"], check=False)
             log_and_print(f"{INFO} SSH connections denied.", "info")
-        subprocess.run(["sudo", "ufw", "--force", "enable"], check=False)
+        timed_run(["sudo", "ufw", "--force", "enable"], check=False)
         log_and_print(f"{SUCCESS} UFW enabled.", "info")
-        subprocess.run(["sudo", "ufw", "status", "verbose"], check=False)
+        timed_run(["sudo", "ufw", "status", "verbose"], check=False)
     except Exception as e:
         log_and_print(f"{FAILURE} Error configuring firewall: {str(e)}", "error")
 ####################################
 # 35. monitor_system_logs
 ####################################
-def monitor_system_logs(priority=3, services=None):
+def monitor_system_logs(priority=3, services=None, follow=False):
     """
     Monitor system logs for errors or warnings of a given priority or higher.
     Optionally filter by specific service names.
+    The journal is consumed as a structured JSON stream and filtered on
+    PRIORITY and _SYSTEMD_UNIT/SYSLOG_IDENTIFIER; counts are aggregated per
+    unit in constant memory. A persisted cursor means each run only reports
+    entries written since the previous one. follow=True keeps streaming new
+    entries until interrupted. The cursor is kept per priority and service
+    filter, so a filtered run never advances the cursor of a wider one.
     """
     if services is None:
         services = []
+    cursor_name = f"monitor_system_logs-p{priority}"
+    if services:
+        key = "\0".join(sorted(services)).encode("utf-8", "surrogateescape")
+        cursor_name += "-" + hashlib.sha1(key).hexdigest()[:12]
     log_and_print(
         f"{INFO} Monitoring system logs (priority >= {priority})...", "info"
     )
+    def matches(entry):
+        try:
+            if int(entry.get("PRIORITY", 7)) > priority:
+                return False
+        except ValueError:
+            return False
+        if services:
+            unit = journal_unit(entry)
+            return any(svc in unit for svc in services)
+        return True
+    def emit(entry):
+        line = format_journal_entry(entry)
+        logging.info(line)
+        if follow:
+            print(line)
     try:
-        cmd = ["journalctl", f"-p{priority}", "-xb"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            logs = result.stdout.strip()
-            if logs:
-                if services:
-                    filtered = [
-                        line
-                        for line in logs.split("\n")
-                        if any(svc in line for svc in services)
-                    ]
-                    if filtered:
-                        log_and_print(
-                            f"{INFO} Filtered system logs (services={services}):",
-                            "info",
-                        )
-                        for line in filtered:
-                            print(line)
-                        logging.info(
-                            "Filtered system logs:\n" + "\n".join(filtered)
-                        )
-                    else:
-                        log_and_print(
-                            f"{SUCCESS} No relevant logs found for services={services}.",
-                            "info",
-                        )
-                else:
-                    log_and_print(f"{INFO} System errors/warnings found:", "info")
-                    print(logs)
-                    logging.info("System errors:\n" + logs)
-            else:
-                log_and_print(
-                    f"{SUCCESS} No system errors detected at priority >= {priority}.",
-                    "info",
-                )
+        total, per_unit, sample = summarize_journal(
+            iter_journal(
+                ["-p", str(priority), "-b"],
+                cursor_name=cursor_name,
+                follow=follow,
+            ),
+            matches,
+            on_match=emit,
+        )
+    except KeyboardInterrupt:
+        log_and_print(f"{INFO} Stopped following system logs.", "info")
+        return
+    except Exception as e:
+        log_and_print(f"{FAILURE} Error monitoring system logs: {str(e)}", "error")
+        return
+    if not total:
+        if services:
+            log_and_print(
+                f"{SUCCESS} No relevant logs found for services={services}.", "info"
+            )
         else:
-            logging.error(result.stderr)
             log_and_print(
-                f"{FAILURE} Error monitoring system logs: {result.stderr.strip()}",
-                "error",
+                f"{SUCCESS} No new system errors at priority >= {priority}.", "info"
             )
-    except Exception as e:
-        log_and_print(f"{FAILURE} Error monitoring system logs: {str(e)}", "error")
+        return
+    log_and_print(
+        f"{INFO} {total} new system errors/warnings (services={services or 'all'}):",
+        "info",
+    )
+    for unit, count in per_unit.most_common():
+        log_and_print(f"  {count:>6}  {unit}", "info")
+    log_and_print(f"{INFO} Most recent {len(sample)} entries:", "info")
+    for entry in sample:
+        print(format_journal_entry(entry))
 ####################################
 # 36. generate_system_report
 ####################################
-def generate_system_report(output_format="json", output_file=None):
+REPORT_CACHE_FILE = os.path.join(CACHE_BASE_DIR, "system_report_cache.json")
+REPORT_LAST_FILE = os.path.join(CACHE_BASE_DIR, "system_report_last.json")
+def _read_boot_id():
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+def _report_timestamp():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+def _load_json_file(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+def _save_json_file(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+def _collect_uname():
+    return dict(zip(("sysname", "nodename", "release", "version", "machine"), os.uname()))
+def _collect_os_release():
+    """/etc/os-release as a dict (what lsb_release reports, without the fork)."""
+    release = {}
+    for path in ("/etc/os-release", "/usr/lib/os-release"):
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    key, sep, value = line.strip().partition("=")
+                    if sep and not key.startswith("#"):
+                        release[key] = value.strip().strip("\"'")
+            break
+        except OSError:
+            continue
+    return release
+def _collect_meminfo():
+    """/proc/meminfo with every value converted to bytes where it has a unit."""
+    meminfo = {}
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields = value.split()
+            if not fields:
+                continue
+            amount = int(fields[0])
+            if len(fields) > 1 and fields[1] == "kB":
+                amount *= 1024
+            meminfo[key.strip()] = amount
+    return meminfo
+def _collect_cpuinfo():
+    """/proc/cpuinfo as one dict per logical processor."""
+    processors = []
+    current = {}
+    with open("/proc/cpuinfo", "r") as f:
+        for line in f:
+            if not line.strip():
+                if current:
+                    processors.append(current)
+                    current = {}
+                continue
+            key, _, value = line.partition(":")
+            key = key.strip()
+            value = value.strip()
+            if key == "flags" or key == "bugs" or key == "Features":
+                current[key] = value.split()
+            else:
+                current[key] = int(value) if value.isdigit() else value
+    if current:
+        processors.append(current)
+    return {"count": len(processors), "processors": processors}
+def _collect_lshw():
+    if not shutil.which("lshw"):
+        return "lshw not installed"
+    result = timed_run(
+        ["sudo", "lshw", "-json"], capture_output=True, text=True, check=True
+    )
+    try:
+        return json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return result.stdout.strip()
+def _collect_inxi():
+    if not shutil.which("inxi"):
+        return "inxi not installed"
+    return timed_run(
+        ["inxi", "-Fxxxz"], capture_output=True, text=True
+    ).stdout.strip()
+# section -> (collector, cached for the lifetime of the boot)
+REPORT_COLLECTORS = {
+    "uname": (_collect_uname, False),
+    "os_release": (_collect_os_release, False),
+    "hardware": (_collect_lshw, True),
+    "inxi": (_collect_inxi, True),
+    "meminfo": (_collect_meminfo, False),
+    "cpuinfo": (_collect_cpuinfo, False),
+}
+# Left out when deciding what changed for a delta: they move between any two
+# runs (clock scaling, page cache) without the system having changed.
+REPORT_VOLATILE_FIELDS = {"cpuinfo": frozenset({"cpu MHz"})}
+# meminfo is nearly all live counters, so only its sizes are compared.
+REPORT_MEMINFO_COMPARED = frozenset(
+    {"MemTotal", "SwapTotal", "Hugepagesize", "HugePages_Total", "VmallocTotal", "CmaTotal"}
+)
+def _report_volatile(path):
+    """True if the field at 'path' (section, key, ...) is ignored by deltas."""
+    section, key = path[0], path[-1]
+    if section == "meminfo":
+        return len(path) == 2 and key not in REPORT_MEMINFO_COMPARED
+    return key in REPORT_VOLATILE_FIELDS.get(section, ())
+def _report_delta(old, new, path=()):
+    """
+    Recursive diff of two report dicts: changed or added keys keep their new
+    value, removed keys map to None, unchanged and volatile keys are dropped.
+    Equal-length lists of dicts (cpuinfo processors) are diffed element by
+    element and reported as {index: changes}.
+    """
+    changes = {}
+    for key, value in new.items():
+        if path and _report_volatile(path + (key,)):
+            continue
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = _report_delta(old[key], value, path + (key,))
+            if nested:
+                changes[key] = nested
+        elif (
+            isinstance(value, list)
+            and isinstance(old[key], list)
+            and len(value) == len(old[key])
+            and all(isinstance(v, dict) for v in value + old[key])
+        ):
+            nested = {}
+            for i, (old_item, new_item) in enumerate(zip(old[key], value)):
+                item_changes = _report_delta(old_item, new_item, path + (key,))
+                if item_changes:
+                    nested[str(i)] = item_changes
+            if nested:
+                changes[key] = nested
+        elif value != old[key]:
+            changes[key] = value
+    for key in old.keys() - new.keys():
+        if not (path and _report_volatile(path + (key,))):
+            changes[key] = None
+    return changes
+def generate_system_report(output_format="json", output_file=None, delta=False, refresh=False):
     """
     Generate a structured report of system information.
     Default output: logs/system_report.json (JSON format).
-    Includes uname, lsb_release, lshw (if available), inxi (if available),
-    /proc/meminfo, and /proc/cpuinfo.
+    Includes uname, os-release, lshw (if available), inxi (if available),
+    /proc/meminfo, and /proc/cpuinfo, parsed into JSON structures.
+    Collectors run concurrently. lshw and inxi are cached per boot (keyed on
+    the kernel boot ID) unless refresh=True. With delta=True only the
+    sections that changed since the previous report are written.
     """
     log_and_print(
-        f"{INFO} Generating system information report (format={output_format})...",
+        f"{INFO} Generating system information report (format={output_format}, delta={delta})...",
         "info",
     )
     if not output_file:
-        output_file = os.path.join(LOG_BASE_DIR, "system_report.json")
+        name = "system_report.delta.json" if delta else "system_report.json"
+        output_file = os.path.join(LOG_BASE_DIR, name)
+    boot_id = _read_boot_id()
+    cache = _load_json_file(REPORT_CACHE_FILE)
+    if refresh or cache.get("boot_id") != boot_id:
+        cache = {"boot_id": boot_id, "sections": {}}
+    cached = cache.setdefault("sections", {})
     report = {}
-    uname_result = subprocess.run(["uname", "-a"], capture_output=True, text=True)
-    report["uname"] = uname_result.stdout.strip()
-    try:
-        lsb_result = subprocess.run(
-            ["lsb_release", "-a"], capture_output=True, text=True
-        )
-        report["lsb_release"] = lsb_result.stdout.strip()
-    except FileNotFoundError:
-        report["lsb_release"] = "lsb_release not found"
-    if shutil.which("lshw"):
-        try:
-            lshw_result = subprocess.run(
-                ["sudo", "lshw", "-json"], capture_output=True, text=True, check=True
-            )
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=len(REPORT_COLLECTORS), thread_name_prefix="vacuum-report"
+    ) as pool:
+        futures = {}
+        for section, (collector, per_boot) in REPORT_COLLECTORS.items():
+            if per_boot and section in cached:
+                report[section] = cached[section]
+                continue
+            futures[pool.submit(collector)] = (section, per_boot)
+        for future in concurrent.futures.as_completed(futures):
+            section, per_boot = futures[future]
             try:
-                report["hardware"] = json.loads(lshw_result.stdout)
-            except json.JSONDecodeError:
-                report["hardware_raw"] = lshw_result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            log_and_print(
-                f"{FAILURE} Error running lshw: {e.stderr.strip()}", "error"
-            )
-    else:
-        report["hardware"] = "lshw not installed"
-    if shutil.which("inxi"):
-        inxi_result = subprocess.run(
-            ["inxi", "-Fxxxz"], capture_output=True, text=True
+                report[section] = future.result()
+            except Exception as e:
+                log_and_print(f"{FAILURE} Error collecting {section}: {e}", "error")
+                report[section] = f"error: {e}"
+                continue
+            if per_boot:
+                cached[section] = report[section]
+    report = {section: report[section] for section in REPORT_COLLECTORS}
+    previous = _load_json_file(REPORT_LAST_FILE)
+    for path, data in (
+        (REPORT_CACHE_FILE, cache),
+        (REPORT_LAST_FILE, {"generated_at": _report_timestamp(), "report": report}),
+    ):
+        try:
+            _save_json_file(path, data)
+        except OSError as e:
+            logging.warning(f"Could not write report cache {path}: {e}")
+    output = report
+    if delta:
+        changes = _report_delta(previous.get("report", {}), report)
+        output = {
+            "since": previous.get("generated_at"),
+            "generated_at": _report_timestamp(),
+            "changes": changes,
+        }
+        log_and_print(
+            f"{INFO} {len(changes)} section(s) changed since {output['since'] or 'never'}.",
+            "info",
         )
-        report["inxi"] = inxi_result.stdout.strip()
-    else:
-        report["inxi"] = "inxi not installed"
-    with open("/proc/meminfo", "r") as meminfo:
-        report["meminfo"] = meminfo.read()
-    with open("/proc/cpuinfo", "r") as cpuinfo:
-        report["cpuinfo"] = cpuinfo.read()
     try:
         if output_format.lower() == "json":
             with open(output_file, "w") as outfile:
-                json.dump(report, outfile, indent=2)
+                json.dump(output, outfile, indent=2)
             log_and_print(
                 f"{SUCCESS} System report saved as JSON: {output_file}", "info"
             )
         else:
             with open(output_file, "w") as outfile:
-                outfile.write(str(report))
+                outfile.write(str(output))
             log_and_print(
                 f"{SUCCESS} System report saved as text: {output_file}", "info"
             )
@@ -2443,21 +5417,119 @@ def generate_system_report(output_format="json", output_file=None):
 # 37. is_interactive
 ############################
 def is_interactive():
-    return sys.stdin.isatty()
+    return sys.stdin.isatty() and not is_headless()
 ############################
 # 38. run_all_tasks
 ############################
-def run_all_tasks():
+# Most tasks block on subprocesses or disk, not CPU, so the pool is sized by
+# how much concurrent I/O is tolerable rather than by core count.
+TASK_POOL_WORKERS = 8
+def _task_conflicts(key_a, key_b):
     """
-    Run all maintenance tasks in numeric order (1 through 31).
+    Two tasks conflict when one writes a resource the other reads or writes.
+    Tasks missing from TASK_RESOURCES are treated as exclusive ('*').
+    Headless runs never stop at the terminal, so "prompt" is not shared then.
     """
-    for key in [str(k) for k in range(1, 32)]:
-        try:
+    reads_a, writes_a = TASK_RESOURCES.get(key_a, (frozenset(), frozenset({"*"})))
+    reads_b, writes_b = TASK_RESOURCES.get(key_b, (frozenset(), frozenset({"*"})))
+    if is_headless():
+        writes_a = writes_a - {"prompt"}
+        writes_b = writes_b - {"prompt"}
+    if "*" in writes_a or "*" in writes_b:
+        return True
+    return bool(
+        writes_a & writes_b or writes_a & reads_b or writes_b & reads_a
+    )
+def _build_task_dag(keys):
+    """
+    Map each task key to the set of earlier keys it must wait for.
+    Only conflicting pairs get an edge, and edges always point back in menu
+    order, so conflicting tasks keep their original relative order.
+    """
+    return {
+        key: {prev for prev in keys[:i] if _task_conflicts(key, prev)}
+        for i, key in enumerate(keys)
+    }
+def _run_task_timed(key):
+    """Run one menu task, returning (key, status, elapsed_seconds)."""
+    start = time.monotonic()
+    status = "ok"
+    try:
+        with task_telemetry(key, menu_options[key].__name__):
             menu_options[key]()
-        except KeyError as e:
-            log_and_print(
-                format_message(f"Error executing task {key}: {e}", RED), "error"
-            )
+    except Exception as e:
+        status = "error"
+        log_and_print(
+            format_message(f"Error executing task {key}: {e}", RED), "error"
+        )
+    return key, status, time.monotonic() - start
+def _print_task_timing_report(keys, timings, wall_time):
+    """Log a per-task timing table followed by wall vs. serial totals."""
+    log_and_print(f"{INFO} Task timing report:", "info")
+    for key in keys:
+        if key not in timings:
+            continue
+        status, elapsed = timings[key]
+        name = getattr(menu_options.get(key), "__name__", "?")
+        marker = SUCCESS if status == "ok" else FAILURE
+        log_and_print(f"  {marker} {key:>2}) {name:<34} {elapsed:8.2f}s", "info")
+    serial_time = sum(elapsed for _, elapsed in timings.values())
+    log_and_print(
+        f"{SUCCESS} {len(timings)} task(s) finished in {wall_time:.2f}s wall "
+        f"({serial_time:.2f}s if run serially).",
+        "info",
+    )
+def run_task_graph(keys, max_workers=None):
+    """
+    Run the given menu tasks on a thread pool, respecting TASK_RESOURCES.
+    A task is started as soon as every earlier task it conflicts with has
+    finished; everything touching the pacman DB therefore stays serialized.
+    Package operations queued by the tasks are committed together after the
+    last task finishes (see pacman_transaction).
+    Returns {key: (status, elapsed_seconds)}.
+    """
+    keys = list(keys)
+    deps = _build_task_dag(keys)
+    max_workers = max_workers or TASK_POOL_WORKERS
+    if _TELEMETRY["profile_dir"]:
+        # cProfile cannot run two profilers at once (sys.monitoring on 3.12+).
+        max_workers = 1
+    pending = list(keys)
+    running = {}
+    done = set()
+    timings = {}
+    wall_start = time.monotonic()
+    _SPINNER_SUPPRESSED.set()
+    try:
+        with pacman_transaction(), concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vacuum-task"
+        ) as pool:
+            while pending or running:
+                for key in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if deps[key] <= done:
+                        pending.remove(key)
+                        running[pool.submit(_run_task_timed, key)] = key
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    key, status, elapsed = future.result()
+                    del running[future]
+                    done.add(key)
+                    timings[key] = (status, elapsed)
+    finally:
+        _SPINNER_SUPPRESSED.clear()
+    _print_task_timing_report(keys, timings, time.monotonic() - wall_start)
+    return timings
+def run_all_tasks():
+    """
+    Run all maintenance tasks (1 through 31) through the dependency-aware
+    scheduler. Non-conflicting tasks run concurrently; conflicting ones keep
+    their numeric order.
+    """
+    run_task_graph([str(k) for k in range(1, 32)])
 ############################
 # MENU DEFINITIONS
 ############################
@@ -2495,11 +5567,913 @@ menu_options = {
     "31": generate_system_report,
     "0": run_all_tasks,
 }
+# Resources each task reads and writes, keyed like menu_options.
+# "pacman_db" is written by anything that takes /var/lib/pacman/db.lck;
+# "prompt" is written by every task that may stop for operator input.
+TASK_RESOURCES = {
+    "1": (frozenset({"logs"}), frozenset({"pacman_db", "pkg_cache", "rootfs", "etc", "prompt"})),
+    "2": (frozenset({"journal"}), frozenset({"cron", "prompt"})),
+    "3": (frozenset({"rootfs", "home"}), frozenset({"fs_links", "prompt"})),
+    "4": (frozenset({"modules"}), frozenset({"pacman_db", "rootfs", "modules", "prompt"})),
+    "5": (frozenset(), frozenset({"journal"})),
+    "6": (frozenset({"pacman_db"}), frozenset({"pkg_cache", "prompt"})),
+    "7": (frozenset(), frozenset({"fonts"})),
+    "8": (frozenset(), frozenset({"trash"})),
+    "9": (frozenset({"network"}), frozenset({"pacman_db", "pkg_cache", "keyring", "locate_db"})),
+    "10": (frozenset({"pacman_db"}), frozenset({"pkg_cache", "aur_cache", "prompt"})),
+    "11": (frozenset({"pacman_db"}), frozenset({"aur_cache", "prompt"})),
+    "12": (frozenset({"pacman_db", "pkg_cache"}), frozenset({"etc", "prompt"})),
+    "13": (frozenset({"network", "keyring"}), frozenset({"pacman_db", "pkg_cache", "rootfs", "etc", "prompt"})),
+    "14": (frozenset({"journal"}), frozenset({"prompt"})),
+    "15": (frozenset(), frozenset({"docker"})),
+    "16": (frozenset(), frozenset({"tmp"})),
+    "17": (frozenset(), frozenset({"home", "trash", "prompt"})),
+    "18": (frozenset({"network"}), frozenset({"ssh_known_hosts"})),
+    "19": (frozenset(), frozenset({"home"})),
+    "20": (frozenset(), frozenset({"var_log"})),
+    "21": (frozenset(), frozenset({"swap"})),
+    "22": (frozenset(), frozenset({"swap"})),
+    "23": (frozenset(), frozenset({"sysctl"})),
+    "24": (frozenset(), frozenset({"vm", "prompt"})),
+    "25": (frozenset(), frozenset({"systemd"})),
+    "26": (frozenset(), frozenset({"systemd", "prompt"})),
+    "27": (frozenset({"network"}), frozenset()),
+    "28": (frozenset(), frozenset({"etc", "prompt"})),
+    "29": (frozenset(), frozenset({"network", "prompt"})),
+    "30": (frozenset({"journal"}), frozenset()),
+    "31": (frozenset({"pacman_db", "etc"}), frozenset({"report"})),
+}
+################################
+# DAEMON
+################################
+DAEMON_SOCKET = os.environ.get("VACUUM_SOCKET", "/run/vacuum.sock")
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+IN_DIR_CHANGES = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+_INOTIFY_EVENT = struct.Struct("iIII")
+_DAEMON_FACTS = {}
+_DAEMON_FACTS_LOCK = threading.Lock()
+_DAEMON_RUN_LOCK = threading.Lock()
+_DAEMON_STARTED = time.time()
+def _libc():
+    if not hasattr(_libc, "_cached"):
+        _libc._cached = ctypes.CDLL(None, use_errno=True)
+    return _libc._cached
+def inotify_open():
+    """Non-blocking inotify descriptor (inotify_init1 via ctypes)."""
+    fd = _libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return fd
+def inotify_watch(fd, path, mask):
+    """Add a watch; returns the watch descriptor or -1 if 'path' is missing."""
+    wd = _libc().inotify_add_watch(fd, os.fsencode(path), mask)
+    if wd < 0:
+        logging.debug(f"inotify: cannot watch {path}: {os.strerror(ctypes.get_errno())}")
+    return wd
+def inotify_events(fd):
+    """Drain pending events as (wd, mask, name) tuples."""
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return
+    offset = 0
+    while offset + _INOTIFY_EVENT.size <= len(data):
+        wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+        offset += _INOTIFY_EVENT.size
+        name = data[offset:offset + name_len].rstrip(b"\0").decode("utf-8", "surrogateescape")
+        offset += name_len
+        yield wd, mask, name
+def inotify_unwatch(fd, wd):
+    _libc().inotify_rm_watch(fd, wd)
+# fanotify with FAN_REPORT_DFID_NAME (Linux 5.9+): filesystem-wide marks that
+# report the parent directory handle and entry name of each change.
+FAN_CLOEXEC = 0x1
+FAN_NONBLOCK = 0x2
+FAN_REPORT_DFID_NAME = 0x400 | 0x800
+FAN_MARK_ADD = 0x1
+FAN_MARK_FILESYSTEM = 0x100
+FAN_MOVED_FROM = 0x40
+FAN_MOVED_TO = 0x80
+FAN_CREATE = 0x100
+FAN_DELETE = 0x200
+FAN_Q_OVERFLOW = 0x4000
+FAN_ONDIR = 0x40000000
+FAN_EVENT_INFO_TYPE_DFID_NAME = 2
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+_FANOTIFY_EVENT = struct.Struct("IBBHQii")
+_AT_FDCWD = -100
+def fanotify_open():
+    """Non-blocking fanotify descriptor reporting directory handles and names."""
+    fd = _libc().fanotify_init(
+        FAN_CLOEXEC | FAN_NONBLOCK | FAN_REPORT_DFID_NAME, os.O_RDONLY
+    )
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return fd
+def fanotify_mark_filesystem(fd, path, mask):
+    """Watch the whole filesystem holding 'path'; raises OSError when refused."""
+    libc = _libc()
+    libc.fanotify_mark.argtypes = [
+        ctypes.c_int, ctypes.c_uint, ctypes.c_uint64, ctypes.c_int, ctypes.c_char_p,
+    ]
+    if libc.fanotify_mark(fd, FAN_MARK_ADD | FAN_MARK_FILESYSTEM, mask,
+                          _AT_FDCWD, os.fsencode(path)) < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), path)
+def fanotify_events(fd, mount_fds):
+    """
+    Drain pending events as (directory, name, mask) tuples. Directory
+    handles are opened against the mount fd of their filesystem, keyed by
+    fsid in 'mount_fds'; unresolvable handles yield directory None.
+    """
+    try:
+        data = os.read(fd, 256 * 1024)
+    except BlockingIOError:
+        return
+    libc = _libc()
+    offset = 0
+    while offset + _FANOTIFY_EVENT.size <= len(data):
+        event_len, _, _, metadata_len, mask, _, _ = _FANOTIFY_EVENT.unpack_from(data, offset)
+        info = offset + metadata_len
+        end = offset + event_len
+        offset = end
+        if mask & FAN_Q_OVERFLOW:
+            yield None, None, mask
+            continue
+        while info + 4 <= end:
+            info_type, _, info_len = struct.unpack_from("BBH", data, info)
+            if info_len == 0:
+                break
+            if info_type == FAN_EVENT_INFO_TYPE_DFID_NAME:
+                fsid = struct.unpack_from("II", data, info + 4)
+                handle_bytes, _ = struct.unpack_from("Ii", data, info + 12)
+                handle = data[info + 12:info + 20 + handle_bytes]
+                name = data[info + 20 + handle_bytes:info + info_len].split(b"\0", 1)[0]
+                directory = None
+                mount_fd = mount_fds.get(fsid)
+                if mount_fd is not None:
+                    dir_fd = libc.open_by_handle_at(mount_fd, handle, os.O_PATH | os.O_CLOEXEC)
+                    if dir_fd >= 0:
+                        try:
+                            directory = os.readlink(f"/proc/self/fd/{dir_fd}")
+                        finally:
+                            os.close(dir_fd)
+                yield directory, os.fsdecode(name), mask
+            info += info_len
+def _statfs_fsid(path):
+    """(val[0], val[1]) of statfs().f_fsid, as fanotify reports it."""
+    fsid = os.statvfs(path).f_fsid
+    return fsid & 0xFFFFFFFF, (fsid >> 32) & 0xFFFFFFFF
+# Live sets kept by the daemon's watcher, so tasks can skip their full scans.
+# 'complete' is False until a scan succeeds, and again during the rescan
+# after an event queue overflow. Once inotify has run out of watches some
+# subtrees go unseen, so 'watch_limited' is set for good and 'complete'
+# stays False.
+WATCH_EVENTS = FAN_CREATE | FAN_DELETE | FAN_MOVED_FROM | FAN_MOVED_TO | FAN_ONDIR
+WATCH_ROOTS = ("/",)
+_WATCH_STATE = {
+    "lock": threading.Lock(),
+    "backend": None,
+    "complete": False,
+    "roots": [],
+    "homes": [],
+    "broken": set(),
+    "link_target": {},
+    "target_links": collections.defaultdict(set),
+    "orphans": set(),
+    "rescanning": False,
+    "replay": [],
+    "watch_limited": False,
+}
+def _watch_homes():
+    """Home directories of regular users, plus root's."""
+    homes = {os.path.expanduser("~root")}
+    for entry in pwd.getpwall():
+        if entry.pw_uid >= 1000 and os.path.isdir(entry.pw_dir):
+            homes.add(entry.pw_dir)
+    return sorted(homes)
+def _under(path, prefixes):
+    return any(path == p or path.startswith(p.rstrip("/") + "/") for p in prefixes)
+def _new_watch_index():
+    return {
+        "broken": set(),
+        "link_target": {},
+        "target_links": collections.defaultdict(set),
+        "orphans": set(),
+    }
+def _link_hops(link):
+    """
+    Every path whose creation or removal can change whether 'link' resolves:
+    its lexical target, each symlink followed on the way (so links to links
+    and links through symlinked directories are covered) and the final
+    entry, as real paths. None when 'link' is not a symlink.
+    """
+    try:
+        target = os.readlink(link)
+    except OSError:
+        return None
+    hops = {os.path.normpath(os.path.join(os.path.dirname(link), target))}
+    resolved = "/" if target.startswith("/") else os.path.realpath(os.path.dirname(link))
+    parts = collections.deque(p for p in target.split("/") if p and p != ".")
+    follows = 0
+    while parts:
+        part = parts.popleft()
+        if part == "..":
+            resolved = os.path.dirname(resolved)
+            continue
+        entry = os.path.join(resolved, part)
+        try:
+            st = os.lstat(entry)
+        except OSError:
+            hops.add(entry)  # resolution stops here; creating it can fix the link
+            break
+        if stat.S_ISLNK(st.st_mode):
+            hops.add(entry)
+            follows += 1
+            try:
+                if follows > 40:  # SYMLOOP_MAX
+                    break
+                target = os.readlink(entry)
+            except OSError:
+                break
+            if target.startswith("/"):
+                resolved = "/"
+            parts.extendleft(reversed([p for p in target.split("/") if p and p != "."]))
+            continue
+        resolved = entry
+    else:
+        hops.add(resolved)
+    return hops
+def _watch_track_link(link, index=None):
+    """(Re)index one symlink by every hop of its resolution and update the broken set."""
+    index = index or _WATCH_STATE
+    old = index["link_target"].pop(link, ())
+    for hop in old:
+        index["target_links"][hop].discard(link)
+    hops = _link_hops(link)
+    if hops is None:
+        index["broken"].discard(link)
+        return
+    index["link_target"][link] = hops
+    for hop in hops:
+        index["target_links"][hop].add(link)
+    if os.path.exists(link):
+        index["broken"].discard(link)
+    else:
+        index["broken"].add(link)
+def _watch_forget(path, is_dir):
+    """Drop tracked links and orphans at 'path' (and below it for directories)."""
+    state = _WATCH_STATE
+    links = [path] if not is_dir else [
+        link for link in state["link_target"] if _under(link, [path])
+    ]
+    for link in links:
+        for hop in state["link_target"].pop(link, ()):
+            state["target_links"][hop].discard(link)
+        state["broken"].discard(link)
+    if is_dir:
+        state["orphans"] = {o for o in state["orphans"] if not _under(o, [path])}
+    else:
+        state["orphans"].discard(path)
+def _watch_recheck_targets(path, is_dir):
+    """
+    Re-evaluate links whose resolution passes through 'path', or through
+    anything below it for directories. Links to a link that changed are
+    indexed under it too, so whole chains are rechecked.
+    """
+    state = _WATCH_STATE
+    links = set(state["target_links"].get(path, ()))
+    if is_dir:
+        prefix = path.rstrip("/") + "/"
+        for hop, linked in state["target_links"].items():
+            if hop.startswith(prefix):
+                links.update(linked)
+    for link in links:
+        _watch_track_link(link)
+def _watch_undo_excluded(path):
+    """
+    True if find_orphan_vim_undo_files never reaches 'path': a directory
+    between a watched home and 'path' matches VIM_UNDO_EXCLUDES.
+    """
+    for home in _WATCH_STATE["homes"]:
+        if not _under(path, [home]):
+            continue
+        directory = os.path.dirname(path)
+        while directory != home and _under(directory, [home]):
+            if _is_undo_excluded(directory, os.path.basename(directory), home, VIM_UNDO_EXCLUDES):
+                return True
+            directory = os.path.dirname(directory)
+    return False
+def _watch_check_undo(directory, name, index=None):
+    """
+    Update the orphan set for an undo file or for an original that changed.
+    In-tree undo files below VIM_UNDO_EXCLUDES are never orphans, as in
+    find_orphan_vim_undo_files; undodir entries are not subject to them.
+    """
+    state = _WATCH_STATE
+    index = index or state
+    if name.endswith(".un~"):
+        undo = os.path.join(directory, name)
+        original = os.path.join(directory, _undo_file_target(name))
+        if _watch_undo_excluded(undo):
+            index["orphans"].discard(undo)
+        elif os.path.lexists(undo) and not os.path.lexists(original):
+            index["orphans"].add(undo)
+        else:
+            index["orphans"].discard(undo)
+        return
+    path = os.path.join(directory, name)
+    exists = os.path.lexists(path)
+    candidates = []
+    if not _watch_undo_excluded(path):
+        candidates += [os.path.join(directory, f".{name}.un~"), os.path.join(directory, f"{name}.un~")]
+    for home in state["homes"]:
+        if _under(path, [home]) or _under(directory, [home]):
+            candidates += [
+                os.path.join(home, undo_dir[2:], path.replace("/", "%"))
+                for undo_dir in VIM_UNDO_DIRS
+            ]
+    for undo in candidates:
+        if exists or not os.path.lexists(undo):
+            index["orphans"].discard(undo)
+        else:
+            index["orphans"].add(undo)
+def _scan_dir_for_watch(path, context):
+    """_parallel_walk callback: every symlink and undo file below the roots."""
+    root_dev, excludes = context
+    subdirs, found = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_symlink():
+                    found.append(("link", entry.path))
+                elif entry.is_dir(follow_symlinks=False):
+                    if (
+                        entry.name in SNAPSHOT_DIR_NAMES
+                        or entry.path in WALK_PRUNE_PATHS
+                        or entry.name in excludes
+                    ):
+                        continue
+                    if root_dev is not None and entry.stat(follow_symlinks=False).st_dev != root_dev:
+                        continue
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(".un~"):
+                    found.append(("undo", entry.path))
+            except OSError:
+                continue
+    return subdirs, found
+def _watch_scan(roots, one_filesystem=True, index=None):
+    """
+    Index every symlink and undo file under 'roots' into 'index' (the live
+    sets by default, in which case the caller holds the lock).
+    """
+    walk_roots = []
+    for root in roots:
+        try:
+            walk_roots.append((root, (os.stat(root).st_dev if one_filesystem else None, ())))
+        except OSError:
+            continue
+    for kind, path in _parallel_walk(walk_roots, _scan_dir_for_watch):
+        if kind == "link":
+            _watch_track_link(path, index)
+        elif _under(path, _WATCH_STATE["homes"]):
+            _watch_check_undo(*os.path.split(path), index)
+def watch_rescan():
+    """
+    Rebuild the live sets from a full scan of the watched roots. The scan
+    fills a fresh index without holding the lock, so clients are not
+    blocked meanwhile; events that arrive during it are replayed on the new
+    index when it is swapped in. A failed scan keeps the old sets, marked
+    incomplete, and so does a successful one while watches are missing.
+    """
+    state = _WATCH_STATE
+    with state["lock"]:
+        if not state["rescanning"]:  # else watch_rescan_async is already recording
+            state["replay"] = []
+        state["complete"] = False
+        state["rescanning"] = True
+    index = _new_watch_index()
+    ok = False
+    try:
+        _watch_scan(state["roots"], index=index)
+        for home in state["homes"]:
+            if not _under(home, state["roots"]):
+                _watch_scan([home], one_filesystem=False, index=index)
+            for undo_dir in VIM_UNDO_DIRS:
+                undo_dir = os.path.join(home, undo_dir[2:])
+                try:
+                    names = os.listdir(undo_dir)
+                except OSError:
+                    continue
+                for name in names:
+                    if "%" in name and not os.path.lexists(name.replace("%", "/")):
+                        index["orphans"].add(os.path.join(undo_dir, name))
+        ok = True
+    except Exception as e:
+        log_and_print(f"{FAILURE} Error: watcher scan failed, tasks will scan themselves: {e}", "error")
+    with state["lock"]:
+        replay, state["replay"] = state["replay"], []
+        state["rescanning"] = False
+        if ok:
+            state.update(index)
+            for event in replay:
+                _watch_apply_event(*event)
+        state["complete"] = ok and not state["watch_limited"]
+def watch_rescan_async():
+    """Start watch_rescan on a worker thread unless one is already running."""
+    with _WATCH_STATE["lock"]:
+        if _WATCH_STATE["rescanning"]:
+            return
+        _WATCH_STATE["rescanning"] = True
+        _WATCH_STATE["replay"] = []
+        _WATCH_STATE["complete"] = False
+    threading.Thread(target=watch_rescan, name="vacuum-watch-rescan", daemon=True).start()
+def _watch_apply_event(directory, name, created, is_dir):
+    """Apply one event to the live sets (caller holds the lock)."""
+    state = _WATCH_STATE
+    path = os.path.join(directory, name)
+    if created:
+        if os.path.islink(path):
+            _watch_track_link(path)
+        elif is_dir:
+            _watch_scan([path], one_filesystem=False)
+    else:
+        _watch_forget(path, is_dir)
+    _watch_recheck_targets(path, is_dir)
+    if _under(path, state["homes"]):
+        _watch_check_undo(directory, name)
+def watch_handle_event(directory, name, created, is_dir):
+    """Apply one create/delete/move event to the live sets."""
+    state = _WATCH_STATE
+    path = os.path.join(directory, name)
+    if not _under(path, state["roots"]) and not _under(path, state["homes"]):
+        return
+    with state["lock"]:
+        _watch_apply_event(directory, name, created, is_dir)
+        if state["rescanning"]:
+            state["replay"].append((directory, name, created, is_dir))
+def _inotify_watch_tree(fd, root, wds):
+    """
+    Watch every directory under 'root'. Returns False once the watch limit
+    is hit, which also marks the live sets as permanently incomplete.
+    """
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [
+            d for d in dirnames
+            if d not in SNAPSHOT_DIR_NAMES and os.path.join(dirpath, d) not in WALK_PRUNE_PATHS
+        ]
+        wd = _libc().inotify_add_watch(fd, os.fsencode(dirpath), IN_DIR_CHANGES | IN_MOVE_SELF)
+        if wd < 0:
+            if ctypes.get_errno() == errno.ENOSPC:
+                log_and_print(
+                    f"{WARNING} inotify watch limit reached at {dirpath}; "
+                    "raise fs.inotify.max_user_watches for complete tracking.",
+                    "warning",
+                )
+                with _WATCH_STATE["lock"]:
+                    _WATCH_STATE["watch_limited"] = True
+                    _WATCH_STATE["complete"] = False
+                return False
+            continue
+        wds[wd] = dirpath
+    return True
+def start_watcher(roots=("/",), homes=None):
+    """
+    Start tracking dangling symlinks under 'roots' and orphaned Vim undo
+    files under 'homes'. Uses filesystem-wide fanotify marks when the kernel
+    allows them and recursive inotify watches otherwise. Returns
+    (fd, handler) for the daemon's selector; handler drains the fd.
+    """
+    state = _WATCH_STATE
+    state["homes"] = list(homes if homes is not None else _watch_homes())
+    state["watch_limited"] = False
+    mount_points = []
+    for root in roots:
+        for mount_point in _local_mount_roots(root):
+            if mount_point not in mount_points:
+                mount_points.append(mount_point)
+    state["roots"] = list(roots)
+    try:
+        fd = fanotify_open()
+        mount_fds = {}
+        for mount_point in mount_points + state["homes"]:
+            fsid = _statfs_fsid(mount_point)
+            if fsid in mount_fds:
+                continue
+            fanotify_mark_filesystem(fd, mount_point, WATCH_EVENTS)
+            mount_fds[fsid] = os.open(mount_point, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+        state["backend"] = "fanotify"
+        def handle():
+            for directory, name, mask in fanotify_events(fd, mount_fds):
+                if mask & FAN_Q_OVERFLOW:
+                    watch_rescan_async()
+                    return
+                if directory is None:
+                    # Parent already gone: its own removal event covers it.
+                    continue
+                created = bool(mask & (FAN_CREATE | FAN_MOVED_TO))
+                watch_handle_event(directory, name, created, bool(mask & FAN_ONDIR))
+    except OSError as e:
+        logging.info(f"fanotify unavailable ({e}); tracking with inotify")
+        fd = inotify_open()
+        wds = {}
+        state["backend"] = "inotify"
+        for root in mount_points + state["homes"]:
+            if not _inotify_watch_tree(fd, root, wds):
+                break
+        def handle():
+            for wd, mask, name in inotify_events(fd):
+                if mask & IN_Q_OVERFLOW:
+                    watch_rescan_async()
+                    return
+                if mask & IN_IGNORED:
+                    wds.pop(wd, None)
+                    continue
+                directory = wds.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                is_dir = bool(mask & IN_ISDIR)
+                created = bool(mask & (IN_CREATE | IN_MOVED_TO))
+                if is_dir and not created:
+                    for stale in [w for w, p in wds.items() if _under(p, [path])]:
+                        inotify_unwatch(fd, stale)
+                        wds.pop(stale, None)
+                elif is_dir:
+                    _inotify_watch_tree(fd, path, wds)
+                watch_handle_event(directory, name, created, is_dir)
+    watch_rescan()
+    log_and_print(
+        f"{INFO} Tracking {len(state['broken'])} broken symlinks and "
+        f"{len(state['orphans'])} orphan undo files via {state['backend']}.",
+        "info",
+    )
+    return fd, handle
+def watched_paths(kind, prefixes=None):
+    """
+    Live 'broken' symlinks or undo 'orphans' from the watcher, in this
+    process or a running daemon, limited to 'prefixes'. Returns None when
+    no complete live set is available and the caller has to scan.
+    """
+    state = _WATCH_STATE
+    if state["backend"]:
+        with state["lock"]:
+            paths = sorted(state[kind]) if state["complete"] else None
+    else:
+        try:
+            reply = daemon_request({"op": "watched", "kind": kind})
+        except (OSError, ValueError):
+            return None
+        paths = reply.get("paths") if reply.get("ok") else None
+    if paths is None:
+        return None
+    # Re-check: entries can go stale between the event and this call.
+    if kind == "broken":
+        paths = [p for p in paths if os.path.islink(p) and not os.path.exists(p)]
+    else:
+        paths = [p for p in paths if os.path.lexists(p)]
+    return [p for p in paths if prefixes is None or _under(p, prefixes)]
+def _forget_aur_helper():
+    detect_aur_helper.__dict__.pop("_cached_helper", None)
+def _forget_facts(*names):
+    with _DAEMON_FACTS_LOCK:
+        for name in names:
+            _DAEMON_FACTS.pop(name, None)
+def _invalidate_pacman_state():
+    invalidate_pacman_db_cache()
+    _forget_facts("packages")
+# (path, mask, invalidator). pacman drops db.lck when a transaction ends; the
+# local and sync DB directories cover writes made without the lock file.
+DAEMON_WATCHES = (
+    (os.path.dirname(PACMAN_LOCAL_DIR), IN_DELETE, _invalidate_pacman_state),
+    (PACMAN_LOCAL_DIR, IN_DIR_CHANGES, _invalidate_pacman_state),
+    (PACMAN_SYNC_DIR, IN_CLOSE_WRITE | IN_MOVED_TO, _invalidate_pacman_state),
+    ("/usr/lib/modules", IN_DIR_CHANGES, lambda: _forget_facts("kernels")),
+    ("/usr/bin", IN_CREATE | IN_DELETE | IN_MOVED_TO, _forget_aur_helper),
+)
+def daemon_facts():
+    """Facts every task start used to recompute, served from memory."""
+    with _DAEMON_FACTS_LOCK:
+        if "kernels" not in _DAEMON_FACTS:
+            try:
+                _DAEMON_FACTS["kernels"] = sorted(os.listdir("/usr/lib/modules"))
+            except OSError:
+                _DAEMON_FACTS["kernels"] = []
+        if "packages" not in _DAEMON_FACTS:
+            _DAEMON_FACTS["packages"] = len(pacman_local_packages())
+        facts = dict(_DAEMON_FACTS)
+    facts.update(
+        aur_helper=detect_aur_helper(),
+        running_kernel=os.uname().release,
+        boot_id=_read_boot_id(),
+        uptime=round(time.time() - _DAEMON_STARTED, 1),
+        pid=os.getpid(),
+    )
+    return facts
+def _warm_daemon_state():
+    """Load the pacman DBs, file-owner index and helper lookup up front."""
+    pacman_local_packages()
+    pacman_sync_packages()
+    pacman_file_owners("/")
+    daemon_facts()
+def _peer_allowed(conn):
+    """
+    SO_PEERCRED check: root only. Runs are privileged and unprompted
+    (service disabling, firewall reset, kernel removal), so anything short
+    of root has to come in through sudo like the interactive script.
+    """
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid == 0
+def _send_json(conn, message):
+    conn.sendall((json.dumps(message) + "\n").encode())
+class _DaemonOutput:
+    """
+    stdout for a daemon run. Task threads write concurrently, so frames are
+    sent under a lock; once the client is gone, output is dropped instead
+    of raising inside the tasks.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.closed = False
+    def write(self, text):
+        with self.lock:
+            if not self.closed:
+                try:
+                    _send_json(self.conn, {"output": text})
+                except OSError:
+                    self.closed = True
+        return len(text)
+    def flush(self):
+        pass
+def _daemon_run(conn, request):
+    """
+    Run tasks headless, streaming their console output to the client.
+    Prompts are answered from the daemon's own policy file; a client
+    cannot supply one.
+    """
+    if "policy" in request:
+        _send_json(conn, {"ok": False, "error": "the daemon only uses its own policy file"})
+        return
+    keys, error = _resolve_task_keys(request.get("tasks", []), request.get("run_all", False))
+    if error:
+        _send_json(conn, {"ok": False, "error": error})
+        return
+    sink = _DaemonOutput(conn)
+    with _DAEMON_RUN_LOCK:
+        load_policy(_POLICY["path"], headless=True)
+        with redirect_stdout(sink):
+            timings = run_task_graph(keys)
+    if sink.closed:
+        return
+    _send_json(conn, {
+        "ok": all(status == "ok" for status, _ in timings.values()),
+        "timings": timings,
+    })
+def _daemon_handle(conn):
+    with closing(conn):
+        if not _peer_allowed(conn):
+            _send_json(conn, {"ok": False, "error": "permission denied"})
+            return
+        for line in conn.makefile("r"):
+            try:
+                request = json.loads(line)
+                op = request.get("op")
+                if op == "ping":
+                    _send_json(conn, {"ok": True, "pid": os.getpid()})
+                elif op == "facts":
+                    _send_json(conn, {"ok": True, "facts": daemon_facts()})
+                elif op == "run":
+                    _daemon_run(conn, request)
+                elif op == "watched":
+                    kind = request.get("kind")
+                    if kind not in ("broken", "orphans"):
+                        _send_json(conn, {"ok": False, "error": f"unknown kind {kind!r}"})
+                    elif not (_WATCH_STATE["backend"] and _WATCH_STATE["complete"]):
+                        _send_json(conn, {"ok": False, "error": "watcher not running"})
+                    else:
+                        with _WATCH_STATE["lock"]:
+                            paths = sorted(_WATCH_STATE[kind])
+                        _send_json(conn, {"ok": True, "paths": paths,
+                                          "backend": _WATCH_STATE["backend"]})
+                else:
+                    _send_json(conn, {"ok": False, "error": f"unknown op {op!r}"})
+            except (ValueError, AttributeError) as e:
+                _send_json(conn, {"ok": False, "error": f"bad request: {e}"})
+            except (BrokenPipeError, ConnectionResetError):
+                return
+def run_daemon(socket_path=DAEMON_SOCKET, watch=False):
+    """
+    Serve JSON-lines requests on a Unix socket as a long-running root
+    service. State the tasks rely on (pacman DBs, owner index, AUR helper,
+    installed kernels) stays loaded and is dropped by inotify events when
+    the underlying files change. Runs are headless and serialized.
+    With watch=True, broken symlinks and orphaned undo files are tracked
+    live (start_watcher) and served to the tasks instead of full scans.
+    """
+    load_policy(_POLICY["path"], headless=True)
+    _warm_daemon_state()
+    inotify_fd = inotify_open()
+    invalidators = {}
+    for path, mask, invalidate in DAEMON_WATCHES:
+        wd = inotify_watch(inotify_fd, path, mask)
+        if wd >= 0:
+            invalidators[wd] = invalidate
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(16)
+    server.setblocking(False)
+    log_and_print(f"{SUCCESS} vacuum daemon listening on {socket_path}", "info")
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ, "accept")
+    selector.register(inotify_fd, selectors.EVENT_READ, "inotify")
+    watch_fd = None
+    if watch:
+        watch_fd, handle_watch = start_watcher(WATCH_ROOTS)
+        selector.register(watch_fd, selectors.EVENT_READ, "watch")
+    try:
+        while True:
+            for key, _ in selector.select():
+                if key.data == "accept":
+                    try:
+                        conn, _ = server.accept()
+                    except BlockingIOError:
+                        continue
+                    except OSError as e:
+                        # EMFILE/ENFILE leave the connection queued and the
+                        # socket readable; back off instead of spinning.
+                        logging.warning(f"vacuum daemon: accept failed: {e}")
+                        if e.errno in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM):
+                            time.sleep(0.1)
+                        continue
+                    conn.setblocking(True)
+                    threading.Thread(
+                        target=_daemon_handle, args=(conn,), daemon=True,
+                        name="vacuum-client",
+                    ).start()
+                    continue
+                if key.data == "watch":
+                    handle_watch()
+                    continue
+                fired = set()
+                for wd, mask, name in inotify_events(inotify_fd):
+                    if mask & IN_Q_OVERFLOW:
+                        fired.update(invalidators.values())
+                    elif wd in invalidators:
+                        fired.add(invalidators[wd])
+                for invalidate in fired:
+                    invalidate()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        selector.close()
+        server.close()
+        os.close(inotify_fd)
+        if watch_fd is not None:
+            os.close(watch_fd)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+def daemon_request(request, socket_path=DAEMON_SOCKET, on_output=None):
+    """
+    Send one request to a running daemon. Streamed output chunks go to
+    on_output; the final reply is returned. Raises OSError when no daemon
+    is listening.
+    """
+    with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode())
+        for line in client.makefile("r"):
+            reply = json.loads(line)
+            if "output" in reply:
+                if on_output:
+                    on_output(reply["output"])
+                continue
+            return reply
+    raise ConnectionError("daemon closed the connection without replying")
 ################################
 # main
 ################################
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="System maintenance tasks (interactive menu by default)."
+    )
+    parser.add_argument(
+        "--policy", help=f"policy file answering prompts (default: {POLICY_FILE})"
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="never prompt; unanswered questions take their default",
+    )
+    parser.add_argument(
+        "--task",
+        action="append",
+        default=[],
+        metavar="TASK",
+        help="run a task by menu number or function name (repeatable)",
+    )
+    parser.add_argument(
+        "--run-all", action="store_true", help="run every task and exit"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help=f"serve requests on {DAEMON_SOCKET} with warm state",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="with --daemon, track broken symlinks and orphan undo files live",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="run --task/--run-all locally even if a daemon is listening",
+    )
+    parser.add_argument(
+        "--facts", action="store_true", help="print the daemon's cached facts"
+    )
+    parser.add_argument(
+        "--prom-textfile",
+        metavar="PATH",
+        help="also write per-task metrics for the node_exporter textfile collector",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="dump a cProfile .prof file per task into DIR (tasks then run one at a time)",
+    )
+    return parser.parse_args(argv)
+def _resolve_task_key(name):
+    """Menu key for a menu number or task function name, or None."""
+    if name in menu_options:
+        return name
+    for key, func in menu_options.items():
+        if func.__name__ == name:
+            return key
+    return None
+def _resolve_task_keys(names, run_all=False):
+    """Ordered, de-duplicated task keys, or (None, error message)."""
+    keys = [str(k) for k in range(1, 32)] if run_all else []
+    for name in names:
+        key = _resolve_task_key(str(name))
+        if key is None or key == "0":
+            return None, f"Unknown task: {name}"
+        keys.append(key)
+    return list(dict.fromkeys(keys)), None
+def run_via_daemon(args):
+    """
+    Thin-client path: hand --task/--run-all (headless) or --facts to a running
+    daemon. Returns an exit code, or None when no daemon is reachable.
+    Only root may talk to the daemon, and runs use the daemon's policy, so
+    main() only takes this path as root and without --policy.
+    """
+    if args.facts:
+        request = {"op": "facts"}
+    else:
+        request = {"op": "run", "tasks": args.task, "run_all": args.run_all}
+    try:
+        reply = daemon_request(
+            request, on_output=lambda text: print(text, end="", flush=True)
+        )
+    except OSError:
+        return None
+    if args.facts and reply.get("ok"):
+        print(json.dumps(reply["facts"], indent=2))
+    elif reply.get("error"):
+        log_and_print(f"{FAILURE} {reply['error']}", "error")
+    return 0 if reply.get("ok") else 1
 def main():
     """Display the main menu and handle user input."""
+    args = parse_args()
+    setup_logging()
+    load_policy(args.policy, headless=True if args.headless else None)
+    _TELEMETRY["prom_textfile"] = args.prom_textfile
+    _TELEMETRY["profile_dir"] = args.profile
+    use_daemon = is_headless() and (args.task or args.run_all) and not args.no_daemon
+    if os.geteuid() == 0 and (args.facts or (use_daemon and not args.policy)):
+        exit_code = run_via_daemon(args)
+        if exit_code is not None:
+            sys.exit(exit_code)
+        if args.facts:
+            log_and_print(f"{FAILURE} No vacuum daemon at {DAEMON_SOCKET}.", "error")
+            sys.exit(1)
     if os.geteuid() != 0:
         try:
             print("Attempting to escalate privileges via sudo...")
@@ -2508,6 +6482,19 @@ def main():
         except subprocess.CalledProcessError as e:
             print(f"Error escalating privileges: {e}")
             sys.exit(e.returncode)
+    if args.daemon:
+        run_daemon(watch=args.watch)
+        sys.exit(0)
+    if args.run_all or args.task:
+        keys, error = _resolve_task_keys(args.task, args.run_all)
+        if error:
+            log_and_print(f"{FAILURE} {error}", "error")
+            sys.exit(2)
+        timings = run_task_graph(keys)
+        sys.exit(0 if all(status == "ok" for status, _ in timings.values()) else 1)
+    if is_headless():
+        log_and_print(f"{FAILURE} --headless needs --task or --run-all.", "error")
+        sys.exit(2)
     while True:
         os.system("clear")
         print(f"{GREEN}#{NC} --- {GREEN}//{NC} Vacuum {GREEN}//{NC}")
@@ -2567,7 +6554,11 @@ def main():
             break
         elif command in menu_options:
             try:
-                menu_options[command]()
+                if command == "0":
+                    menu_options[command]()
+                else:
+                    with task_telemetry(command, menu_options[command].__name__):
+                        menu_options[command]()
             except Exception as e:
                 log_and_print(
                     format_message(f"Error executing option: {e}", RED), "error"
@@ -1,49 +1,18 @@
 import os
-import hashlib
-from collections import defaultdict
 from tqdm import tqdm
 
-
-def md5sum(file_path):
-    """Calculate the MD5 checksum for a file with error handling."""
-    try:
-        with open(file_path, "rb") as f:
-            hash_md5 = hashlib.md5()
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    except OSError as e:
-        print(f"Error reading file {file_path}: {e}")
-        return None
+import dupfinder
 
 
 def find_duplicates(directory):
-    """Find duplicate files in the given directory with progress bar for feedback."""
-    sizes = defaultdict(list)
-    hashes = defaultdict(list)
-    files_processed = 0
-
-    for dirpath, _, filenames in os.walk(directory):
-        for filename in tqdm(filenames, desc="Scanning files"):
-            file_path = os.path.join(dirpath, filename)
-            try:
-                file_size = os.path.getsize(file_path)
-                sizes[file_size].append(file_path)
-                files_processed += 1
-            except OSError as e:
-                print(f"Error accessing file {file_path}: {e}")
-
-    print(f"Total files scanned: {files_processed}")
-
-    for size, files in tqdm(sizes.items(), desc="Calculating checksums"):
-        if len(files) < 2:
-            continue
-        for file_path in files:
-            file_hash = md5sum(file_path)
-            if file_hash is not None:
-                hashes[(size, file_hash)].append(file_path)
-
-    return {file_hash: files for file_hash, files in hashes.items() if len(files) > 1}
+    """
+    Find duplicate files in the given directory.
+    Uses the shared dupfinder engine: files are grouped by size, then by a
+    partial hash, and only the remaining candidates are hashed in full.
+    """
+    duplicates = dupfinder.find_duplicates(directory)
+    print(f"Found {sum(map(len, duplicates.values()))} files in duplicate groups")
+    return duplicates
 
 
 def keep_newest_and_largest(duplicates):
@@ -64,13 +33,29 @@ def keep_newest_and_largest(duplicates):
                 print(f"Skipped: {file_path}")
 
 
+def link_to_newest_and_largest(duplicates):
+    """Keep every path, but reflink (or hardlink) each duplicate to the newest and largest file."""
+    for file_hash, files in tqdm(duplicates.items(), desc="Linking duplicates"):
+        files.sort(
+            key=lambda x: (os.path.getctime(x), os.path.getsize(x)), reverse=True
+        )
+        for file_path, how in dupfinder.link_duplicates(files[0], files[1:]).items():
+            if how:
+                print(f"Linked ({how}): {file_path} -> {files[0]}")
+            else:
+                print(f"Could not link: {file_path}")
+
+
 if __name__ == "__main__":
     directory = input("Enter the directory to search for duplicates: ")
     duplicates = find_duplicates(directory)
     if duplicates:
-        print(
-            f"Found {len(duplicates)} groups of duplicates. Reviewing files for deletion..."
-        )
-        keep_newest_and_largest(duplicates)
+        print(f"Found {len(duplicates)} groups of duplicates.")
+        response = input("Link duplicates in place instead of deleting them? (y/n): ")
+        if response.lower() == "y":
+            link_to_newest_and_largest(duplicates)
+        else:
+            print("Reviewing files for deletion...")
+            keep_newest_and_largest(duplicates)
     else:
         print("No duplicates found.")
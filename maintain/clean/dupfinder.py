@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+In-process duplicate file finder shared by jdupes.py, dedup_keeping_newest.py
+and dirmaid4.py.
+
+Candidates are narrowed in three stages so most files are never read in full:
+    1) group by size (one stat per file, no reads)
+    2) group by a hash of the first and last 4 KiB
+    3) group by a full-content hash
+Stages 2 and 3 run on a thread pool; the hash functions release the GIL on
+large buffers. Hardlinks to an already seen (dev, inode) are skipped, since
+removing them reclaims nothing.
+
+Hashes are cached in sqlite keyed on (dev, inode, size, mtime_ns, ctime_ns),
+so a re-scan of a mostly unchanged tree only reads new or modified files.
+ctime catches in-place edits whose mtime was restored with utime(), since
+it cannot be set from user space. Cache
+rows for files that vanished from a scanned tree are evicted after the scan;
+--verify rehashes a random sample of cached entries to catch silent changes.
+
+link_duplicates reclaims a group's space without removing any path: the
+kernel dedupes the copies into shared extents (FIDEDUPERANGE, which
+compares the bytes itself) on btrfs/XFS, with a byte-compared hardlink as
+the fallback on other filesystems.
+
+Optional speedups:
+    - xxhash (xxh3_128) or blake3 for stage 3, else hashlib.blake2b
+"""
+
+import os
+import sys
+import time
+import errno
+import fcntl
+import struct
+import sqlite3
+import filecmp
+import logging
+import hashlib
+import argparse
+import concurrent.futures
+from collections import defaultdict, deque
+
+try:
+    import xxhash
+
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    import blake3
+
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------
+PARTIAL_BLOCK = 4096  # bytes hashed from each end in stage 2
+READ_BUFFER = 1024 * 1024  # stage 3 read size
+HASH_WORKERS = min(32, (os.cpu_count() or 4) * 2)
+HASH_CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "dupfinder",
+    "hashes.sqlite",
+)
+VERIFY_SAMPLE = 100
+
+# FIDEDUPERANGE: struct file_dedupe_range, followed by one
+# struct file_dedupe_range_info per destination.
+FIDEDUPERANGE = 0xC0189436
+FILE_DEDUPE_RANGE_SAME = 0
+_DEDUPE_HEADER = struct.Struct("=QQHHI")  # src_offset, src_length, dest_count
+_DEDUPE_INFO = struct.Struct("=qQQiI")  # dest_fd, dest_offset, bytes_deduped, status
+DEDUPE_CHUNK = 16 * 1024 * 1024  # btrfs caps a single dedupe at 16 MiB
+DEDUPE_MAX_DESTS = (4096 - _DEDUPE_HEADER.size) // _DEDUPE_INFO.size  # one page
+_DEDUPE_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV}
+
+
+# -------------------------------------------------------------------
+# Hashing
+# -------------------------------------------------------------------
+def new_hasher():
+    """Fastest available full-content hash object."""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128()
+    if BLAKE3_AVAILABLE:
+        return blake3.blake3()
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_algorithm():
+    """Name of the stage 3 hash, e.g. for cache keys and logs."""
+    if XXHASH_AVAILABLE:
+        return "xxh3_128"
+    if BLAKE3_AVAILABLE:
+        return "blake3"
+    return "blake2b-128"
+
+
+def partial_hash(path, size):
+    """Hash of the first and last PARTIAL_BLOCK bytes (whole file if small)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb", buffering=0) as f:
+        digest.update(f.read(PARTIAL_BLOCK))
+        if size > PARTIAL_BLOCK:
+            f.seek(max(PARTIAL_BLOCK, size - PARTIAL_BLOCK))
+            digest.update(f.read(PARTIAL_BLOCK))
+    return digest.hexdigest()
+
+
+def full_hash(path):
+    """Full-content hash, read in READ_BUFFER chunks into one reused buffer."""
+    digest = new_hasher()
+    buf = bytearray(READ_BUFFER)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+# -------------------------------------------------------------------
+# Hash cache
+# -------------------------------------------------------------------
+def open_hash_cache(cache_path=HASH_CACHE_FILE):
+    """Open (creating if needed) the shared sqlite hash cache."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    conn = sqlite3.connect(cache_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(hashes)")}
+    if columns and "ctime_ns" not in columns:
+        # Rows from before ctime was recorded cannot be trusted; start over.
+        with conn:
+            conn.execute("DROP TABLE hashes")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS hashes (
+            dev INTEGER NOT NULL,
+            ino INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            ctime_ns INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            partial TEXT,
+            algo TEXT,
+            full TEXT,
+            seen REAL NOT NULL,
+            PRIMARY KEY (dev, ino)
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS hashes_path ON hashes (path)")
+    return conn
+
+
+def _cache_lookup(conn, stats):
+    """
+    Cached (partial, full) digests for {path: stat_result}, valid only while
+    size, mtime_ns and ctime_ns still match; full is None if it used another
+    algorithm.
+    """
+    algo = hash_algorithm()
+    found = {}
+    for path, st in stats.items():
+        row = conn.execute(
+            "SELECT size, mtime_ns, ctime_ns, partial, algo, full FROM hashes "
+            "WHERE dev = ? AND ino = ?",
+            (st.st_dev, st.st_ino),
+        ).fetchone()
+        if row and row[:3] == (st.st_size, st.st_mtime_ns, st.st_ctime_ns):
+            found[path] = (row[3], row[5] if row[4] == algo else None)
+    return found
+
+
+def _cache_store(conn, stats, partials, fulls):
+    """Upsert the digests computed in this run."""
+    algo = hash_algorithm()
+    now = time.time()
+    rows = [
+        (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns, path,
+         partials.get(path), algo if path in fulls else None, fulls.get(path), now)
+        for path, st in stats.items()
+        if path in partials or path in fulls
+    ]
+    with conn:
+        conn.executemany(
+            """INSERT INTO hashes (dev, ino, size, mtime_ns, ctime_ns, path, partial, algo, full, seen)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (dev, ino) DO UPDATE SET
+                   size = excluded.size, mtime_ns = excluded.mtime_ns,
+                   ctime_ns = excluded.ctime_ns,
+                   path = excluded.path, seen = excluded.seen,
+                   partial = COALESCE(excluded.partial,
+                       CASE WHEN hashes.size = excluded.size AND hashes.mtime_ns = excluded.mtime_ns
+                                 AND hashes.ctime_ns = excluded.ctime_ns
+                            THEN hashes.partial END),
+                   algo = COALESCE(excluded.algo,
+                       CASE WHEN hashes.size = excluded.size AND hashes.mtime_ns = excluded.mtime_ns
+                                 AND hashes.ctime_ns = excluded.ctime_ns
+                            THEN hashes.algo END),
+                   full = COALESCE(excluded.full,
+                       CASE WHEN hashes.size = excluded.size AND hashes.mtime_ns = excluded.mtime_ns
+                                 AND hashes.ctime_ns = excluded.ctime_ns
+                            THEN hashes.full END)""",
+            rows,
+        )
+
+
+def _cache_evict(conn, roots, walked):
+    """
+    Drop rows recorded under the scanned 'roots' whose (dev, inode) the walk
+    no longer found: the file was deleted or replaced.
+    """
+    stale = []
+    for root in roots:
+        prefix = root.rstrip("/") + "/"
+        for dev, ino in conn.execute(
+            "SELECT dev, ino FROM hashes WHERE path >= ? AND path < ?",
+            (prefix, prefix[:-1] + "0"),  # '0' sorts right after '/'
+        ):
+            if (dev, ino) not in walked:
+                stale.append((dev, ino))
+    if stale:
+        with conn:
+            conn.executemany("DELETE FROM hashes WHERE dev = ? AND ino = ?", stale)
+        logger.info(f"Evicted {len(stale)} cache entries for vanished files")
+    return len(stale)
+
+
+def verify_hash_cache(sample=VERIFY_SAMPLE, cache_path=HASH_CACHE_FILE, workers=HASH_WORKERS):
+    """
+    Rehash a random sample of cached full digests. Entries whose file is gone
+    or changed are evicted; a digest mismatch on an unchanged size, mtime and
+    ctime (silent corruption) is reported and evicted.
+    Returns (checked, mismatches).
+    """
+    conn = open_hash_cache(cache_path)
+    rows = conn.execute(
+        "SELECT dev, ino, size, mtime_ns, ctime_ns, path, full FROM hashes "
+        "WHERE algo = ? ORDER BY RANDOM() LIMIT ?",
+        (hash_algorithm(), sample),
+    ).fetchall()
+
+    def check(row):
+        dev, ino, size, mtime_ns, ctime_ns, path, full = row
+        try:
+            st = os.stat(path)
+        except OSError:
+            return "gone"
+        if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns) != (
+            dev, ino, size, mtime_ns, ctime_ns
+        ):
+            return "gone"
+        return "ok" if full_hash(path) == full else "mismatch"
+
+    mismatches = 0
+    evict = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for row, outcome in zip(rows, pool.map(check, rows)):
+            if outcome == "ok":
+                continue
+            if outcome == "mismatch":
+                mismatches += 1
+                logger.warning(f"Cached hash mismatch (content changed in place): {row[5]}")
+            evict.append(row[:2])
+    with conn:
+        conn.executemany("DELETE FROM hashes WHERE dev = ? AND ino = ?", evict)
+    conn.close()
+    logger.info(f"Verified {len(rows)} cached hashes: {mismatches} mismatches")
+    return len(rows), mismatches
+
+
+# -------------------------------------------------------------------
+# Scanning
+# -------------------------------------------------------------------
+def iter_files(paths, follow_symlinks=False, seen=None):
+    """
+    Yield (path, stat_result) for every regular file below 'paths'.
+    Each (dev, inode) is reported once; later hardlinks to it are skipped.
+    Pass a set as 'seen' to collect the (dev, inode) keys walked.
+    """
+    seen = set() if seen is None else seen
+    stack = [os.path.abspath(os.path.expanduser(str(p))) for p in paths]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError as e:
+            logger.warning(f"Cannot read directory {current}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=follow_symlinks):
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=follow_symlinks):
+                        continue
+                    st = entry.stat(follow_symlinks=follow_symlinks)
+                except OSError as e:
+                    logger.warning(f"Cannot stat {entry.path}: {e}")
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key in seen:
+                    logger.debug(f"Skipping hardlink: {entry.path}")
+                    continue
+                seen.add(key)
+                yield entry.path, st
+
+
+def iter_duplicates(paths, min_size=1, workers=HASH_WORKERS, follow_symlinks=False,
+                    cache_path=HASH_CACHE_FILE):
+    """
+    Yield (digest, [paths...]) duplicate groups below 'paths' as soon as each
+    size class is resolved, instead of after the whole scan. Files smaller
+    than 'min_size' bytes are ignored (empty files by default). Digests are
+    reused from and saved to the cache at 'cache_path' (None disables it).
+
+    At most workers * 4 hashes are in flight, and new ones are only queued
+    while the caller keeps consuming, so a slow consumer throttles the reads.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    roots = [os.path.abspath(os.path.expanduser(str(p))) for p in paths]
+
+    by_size = defaultdict(list)
+    stats = {}
+    walked = set()
+    for path, st in iter_files(roots, follow_symlinks, seen=walked):
+        if st.st_size >= min_size:
+            by_size[st.st_size].append(path)
+            stats[path] = st
+    by_size = {size: members for size, members in by_size.items() if len(members) > 1}
+    stats = {path: stats[path] for members in by_size.values() for path in members}
+    logger.info(f"Stage 1: {len(walked)} files, {len(stats)} share a size")
+
+    conn = None
+    cached = {}
+    if cache_path:
+        try:
+            conn = open_hash_cache(cache_path)
+            cached = _cache_lookup(conn, stats)
+        except sqlite3.Error as e:
+            logger.warning(f"Hash cache unavailable ({cache_path}): {e}")
+            conn = None
+    computed = {"partial": {}, "full": {}}
+    buckets = {size: defaultdict(list) for size in by_size}  # current stage only
+    outstanding = defaultdict(int)
+    tasks = deque()
+    ready = deque()
+    groups = 0
+
+    def stage(size, kind, members):
+        """Queue one stage for a size class; cached digests skip the read."""
+        for path in members:
+            digest = (cached.get(path) or (None, None))[0 if kind == "partial" else 1]
+            if digest:
+                buckets[size][digest].append(path)
+            else:
+                tasks.append((kind, size, path))
+                outstanding[size] += 1
+        if not outstanding[size]:
+            advance(size, kind)
+
+    def advance(size, kind):
+        """A size class finished 'kind': start stage 3 or emit its groups."""
+        found = [(d, sorted(m)) for d, m in buckets[size].items() if len(m) > 1]
+        buckets[size] = defaultdict(list)
+        # Files no larger than both partial blocks were hashed in full already.
+        if kind == "partial" and size > 2 * PARTIAL_BLOCK:
+            if found:
+                stage(size, "full", [path for _, members in found for path in members])
+            return
+        for digest, members in found:
+            ready.append((f"{size}-{digest}", members))
+        del buckets[size]
+
+    def run(kind, path, size):
+        return partial_hash(path, size) if kind == "partial" else full_hash(path)
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        for size, members in by_size.items():
+            stage(size, "partial", members)
+        in_flight = {}
+        while tasks or in_flight or ready:
+            while ready:
+                groups += 1
+                yield ready.popleft()
+            while tasks and len(in_flight) < workers * 4:
+                kind, size, path = tasks.popleft()
+                in_flight[pool.submit(run, kind, path, size)] = (kind, size, path)
+            if not in_flight:
+                continue
+            done, _ = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                kind, size, path = in_flight.pop(future)
+                try:
+                    digest = future.result()
+                except OSError as e:
+                    logger.warning(f"Cannot read {path}: {e}")
+                else:
+                    buckets[size][digest].append(path)
+                    computed[kind][path] = digest
+                outstanding[size] -= 1
+                if not outstanding[size]:
+                    advance(size, kind)
+        logger.info(
+            f"Stage 3: {groups} duplicate groups ({hash_algorithm()}, "
+            f"{len(computed['full'])} files read in full, {len(cached)} cache hits)"
+        )
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        if conn is not None:
+            try:
+                _cache_store(conn, stats, computed["partial"], computed["full"])
+                _cache_evict(conn, roots, walked)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not update hash cache: {e}")
+            finally:
+                conn.close()
+
+
+def find_duplicates(paths, min_size=1, workers=HASH_WORKERS, follow_symlinks=False,
+                    cache_path=HASH_CACHE_FILE):
+    """
+    Find files with identical content below 'paths' (a path or a list).
+    Returns {digest: [paths...]} with each group sorted by path; see
+    iter_duplicates for the options.
+    """
+    return dict(iter_duplicates(paths, min_size, workers, follow_symlinks, cache_path))
+
+
+# -------------------------------------------------------------------
+# Linking duplicates
+# -------------------------------------------------------------------
+def _dedupe_batch(src_fd, offset, length, dest_fds):
+    """
+    One FIDEDUPERANGE call sharing [offset, offset + length) of src_fd with
+    the same range of every fd in dest_fds. The kernel locks both ranges and
+    compares them byte for byte before sharing. Returns a list of
+    (status, bytes_deduped) per destination.
+    """
+    buf = bytearray(
+        _DEDUPE_HEADER.pack(offset, length, len(dest_fds), 0, 0)
+        + b"".join(_DEDUPE_INFO.pack(fd, offset, 0, 0, 0) for fd in dest_fds)
+    )
+    fcntl.ioctl(src_fd, FIDEDUPERANGE, buf, True)
+    results = []
+    for i in range(len(dest_fds)):
+        _, _, deduped, status, _ = _DEDUPE_INFO.unpack_from(
+            buf, _DEDUPE_HEADER.size + i * _DEDUPE_INFO.size
+        )
+        results.append((status, deduped))
+    return results
+
+
+def reflink_group(keeper, others):
+    """
+    Share the extents of 'keeper' with every file in 'others' (btrfs, XFS).
+    Calls are batched: each chunk of up to DEDUPE_CHUNK bytes is deduped into
+    up to DEDUPE_MAX_DESTS files at once. Returns (linked, unsupported, failed):
+    files whose content the kernel now shares, files on a filesystem (or
+    device) without dedupe support, and files it refused, e.g. because the
+    content differs.
+    """
+    linked, unsupported, failed = [], [], []
+    src_fd = os.open(keeper, os.O_RDONLY)
+    dest_fds = {}
+    try:
+        size = os.fstat(src_fd).st_size
+        for path in others:
+            try:
+                if os.path.getsize(path) != size:
+                    failed.append(path)
+                    continue
+                try:
+                    dest_fds[path] = os.open(path, os.O_RDWR)
+                except PermissionError:
+                    # The owner may dedupe into a file opened read-only.
+                    dest_fds[path] = os.open(path, os.O_RDONLY)
+            except OSError as e:
+                logger.warning(f"Cannot open {path} for dedupe: {e}")
+                failed.append(path)
+
+        active = list(dest_fds)
+        offset = 0
+        while active and offset < size:
+            length = min(DEDUPE_CHUNK, size - offset)
+            still_active = []
+            for i in range(0, len(active), DEDUPE_MAX_DESTS):
+                batch = active[i:i + DEDUPE_MAX_DESTS]
+                try:
+                    results = _dedupe_batch(
+                        src_fd, offset, length, [dest_fds[p] for p in batch]
+                    )
+                except OSError as e:
+                    if e.errno in _DEDUPE_UNSUPPORTED:
+                        unsupported.extend(batch)
+                    else:
+                        logger.warning(f"Dedupe against {keeper} failed: {e}")
+                        failed.extend(batch)
+                    continue
+                for path, (status, deduped) in zip(batch, results):
+                    if status == FILE_DEDUPE_RANGE_SAME and deduped == length:
+                        still_active.append(path)
+                    elif status < 0 and -status in _DEDUPE_UNSUPPORTED:
+                        unsupported.append(path)
+                    else:
+                        failed.append(path)
+            active = still_active
+            offset += length
+        linked.extend(active)
+    finally:
+        os.close(src_fd)
+        for fd in dest_fds.values():
+            os.close(fd)
+    return linked, unsupported, failed
+
+
+def hardlink_group(keeper, others):
+    """
+    Replace every file in 'others' with a hardlink to 'keeper', after a byte
+    comparison. The link is made under a temporary name and renamed over the
+    duplicate, so its path never disappears. The duplicate's own owner, mode
+    and times are lost. Returns (linked, failed).
+    """
+    linked, failed = [], []
+    keeper_stat = os.stat(keeper)
+    for path in others:
+        try:
+            st = os.stat(path)
+            if (st.st_dev, st.st_ino) == (keeper_stat.st_dev, keeper_stat.st_ino):
+                linked.append(path)
+                continue
+            if st.st_dev != keeper_stat.st_dev or not filecmp.cmp(keeper, path, shallow=False):
+                failed.append(path)
+                continue
+            directory, name = os.path.split(path)
+            tmp = os.path.join(directory, f".{name}.dupfinder-{os.getpid()}")
+            os.link(keeper, tmp)
+            try:
+                os.replace(tmp, path)
+            except OSError:
+                os.unlink(tmp)
+                raise
+            linked.append(path)
+        except OSError as e:
+            logger.warning(f"Cannot hardlink {path} to {keeper}: {e}")
+            failed.append(path)
+    return linked, failed
+
+
+def link_duplicates(keeper, others, mode="auto"):
+    """
+    Reclaim the space of 'others' without removing any path: reflink them to
+    'keeper' where the filesystem supports it and, in "auto" mode, hardlink
+    the rest. 'mode' is "auto", "reflink" or "hardlink". Returns
+    {path: "reflink" | "hardlink" | None}, None meaning left untouched.
+    """
+    result = dict.fromkeys(others)
+    remaining = list(others)
+    if mode in ("auto", "reflink"):
+        linked, unsupported, failed = reflink_group(keeper, remaining)
+        result.update(dict.fromkeys(linked, "reflink"))
+        remaining = unsupported if mode == "auto" else []
+        for path in failed:
+            logger.warning(f"Not deduplicated (content differs or dedupe refused): {path}")
+    if mode in ("auto", "hardlink") and remaining:
+        linked, _ = hardlink_group(keeper, remaining)
+        result.update(dict.fromkeys(linked, "hardlink"))
+    return result
+
+
+# -------------------------------------------------------------------
+# Command line
+# -------------------------------------------------------------------
+def main():
+    """Print duplicate groups jdupes-style: one path per line, blank line between."""
+    parser = argparse.ArgumentParser(description="Find duplicate files.")
+    parser.add_argument("directories", nargs="*", metavar="DIR")
+    parser.add_argument("--cache", default=HASH_CACHE_FILE, help="hash cache database")
+    parser.add_argument("--no-cache", action="store_true", help="hash everything afresh")
+    parser.add_argument(
+        "--link",
+        choices=("auto", "reflink", "hardlink"),
+        help="link each group's copies to its first path instead of printing it",
+    )
+    parser.add_argument(
+        "--verify",
+        nargs="?",
+        type=int,
+        const=VERIFY_SAMPLE,
+        metavar="N",
+        help=f"rehash N random cached entries (default {VERIFY_SAMPLE}) and report mismatches",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    if args.verify is not None:
+        _, mismatches = verify_hash_cache(args.verify, args.cache)
+        if not args.directories:
+            sys.exit(1 if mismatches else 0)
+    if not args.directories:
+        parser.error("no directories given")
+    cache_path = None if args.no_cache else args.cache
+    for _, members in iter_duplicates(args.directories, cache_path=cache_path):
+        if args.link:
+            for path, how in link_duplicates(members[0], members[1:], args.link).items():
+                print(f"{how or 'unchanged'}: {path} -> {members[0]}", flush=True)
+        else:
+            print("\n".join(members), end="\n\n", flush=True)
+
+
+if __name__ == "__main__":
+    main()
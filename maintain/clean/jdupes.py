@@ -2,20 +2,32 @@
 # -*- coding: utf-8 -*-
 
 """
-A Python script to find duplicate files using jdupes, with a menu-driven interface,
+A Python script to find duplicate files, with a menu-driven interface,
 configuration management, and idempotent duplicate handling.
 
-Requirements:
-    - jdupes installed on the system (https://github.com/jbruchon/jdupes)
+Duplicates are found in-process by the shared engine in dupfinder.py
+(size -> partial hash -> full hash); the jdupes binary is not required.
+Setting "backend": "jdupes" in the config uses jdupes instead, with its
+output parsed as it streams.
 """
 
+import os
+import re
 import sys
+import errno
+import queue
+import shutil
 import logging
+import tempfile
+import threading
 import subprocess
 import json
 from pathlib import Path
+from contextlib import closing
 import datetime
 
+from dupfinder import iter_duplicates, link_duplicates
+
 # -------------------------------------------------------------------
 # Global Variables & Configuration
 # -------------------------------------------------------------------
@@ -24,11 +36,20 @@ APP_VERSION = "1.0"
 CONFIG_FILE = "jdupes_config.json"
 MOVED_FILES_LOG = "moved_files.log"
 LOG_FILE = "jdupes_wrapper.log"
+PLAN_FILE = "duplicates_plan.json"
+GROUP_QUEUE_SIZE = 256  # groups buffered between the scan and planning
 
 # Default configuration
 DEFAULT_CONFIG = {
     "duplicates_dir": "duplicates",
     "scan_directories": [],
+    "backend": "native",  # or "jdupes"
+    "action": "move",  # or "delete", or "link" (reflink/hardlink in place)
+    # Keeper policy, most important first: preferred_roots, newest, oldest,
+    # largest, shortest_path. Ties fall through to the next entry.
+    "keep_policy": ["preferred_roots", "shortest_path"],
+    "preferred_roots": [],
+    "protect_patterns": [],  # regexes; matching files are never touched
 }
 
 config = {}
@@ -37,7 +58,7 @@ already_moved = set()  # To store duplicates already moved for idempotency
 # -------------------------------------------------------------------
 # Configure Logging
 # -------------------------------------------------------------------
-LOG_FORMAT = "% (asctime)s - %(levelname)s - %(message)s"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 logging.basicConfig(
     filename=LOG_FILE,
     level=logging.INFO,
@@ -49,7 +70,7 @@ logger = logging.getLogger(__name__)
 # Console handler for logging to stdout
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(logging.Formatter("% (levelname)s - %(message)s"))
+console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
 logger.addHandler(console_handler)
 
 
@@ -61,7 +82,7 @@ def run_command(cmd):
     Execute a system command and return its (returncode, stdout, stderr).
     Logs both stdout and stderr streams and returns them along with the code.
     """
-    logger.info(f"Running command: {'. '.join(cmd)}")
+    logger.info(f"Running command: {' '.join(cmd)}")
 
     try:
         result = subprocess.run(
@@ -76,21 +97,24 @@ def run_command(cmd):
             logger.warning(f"Command stderr: {result.stderr.strip()}")
         return result.returncode, result.stdout, result.stderr
     except Exception as e:
-        logger.error(f"Failed to run command {'. '.join(cmd)}: {e}")
+        logger.error(f"Failed to run command {' '.join(cmd)}: {e}")
         return 1, "", str(e)
 
 
 def ensure_jdupes_installed():
     """
     Check if jdupes is installed by calling 'jdupes --version'.
-    If not installed or if there's an error, logs and exits the script.
+    Only the optional "jdupes" backend needs it; returns True if it runs.
     """
+    if shutil.which("jdupes") is None:
+        logger.warning("jdupes is not installed or not found in PATH.")
+        return False
     retcode, _, _ = run_command(["jdupes", "--version"])
     if retcode == 0:
         logger.info("jdupes is installed.")
-    else:
-        logger.error("jdupes is not installed or not found in PATH. Exiting.")
-        sys.exit(1)
+        return True
+    logger.warning("jdupes is installed but 'jdupes --version' failed.")
+    return False
 
 
 def load_config():
@@ -112,6 +136,8 @@ def load_config():
             f"Config file not found. Creating default config at {CONFIG_FILE}..."
         )
         save_config()
+    for key, value in DEFAULT_CONFIG.items():
+        config.setdefault(key, value)
 
     # Ensure duplicates directory exists
     dup_dir = Path(config["duplicates_dir"]).expanduser().resolve()
@@ -172,9 +198,11 @@ def main_menu():
     print("====================================")
     print("1) Configure Directories to Scan")
     print("2) Configure Duplicates Folder")
-    print("3) Run Duplicate Scan & Process")
-    print("4) Help & Learning")
-    print("5) Exit")
+    print("3) Run Duplicate Scan & Build Plan")
+    print("4) Configure Keeper Policy")
+    print("5) Execute Saved Plan")
+    print("6) Help & Learning")
+    print("7) Exit")
     print("====================================")
     choice = input("Select an option: ").strip()
     return choice
@@ -238,82 +266,306 @@ def configure_duplicates_folder():
         print(f"No changes made. Destination remains: {config['duplicates_dir']}")
 
 
+def configure_keeper_policy():
+    """Allows user to set the keeper policy, preferred roots and protect list."""
+    print(f"\nAvailable policies: {', '.join(KEEPER_POLICIES)}")
+    print(f"Current keeper policy: {' > '.join(config['keep_policy']) or 'None'}")
+    print(f"Preferred roots: {config['preferred_roots'] or 'None'}")
+    print(f"Protect patterns: {config['protect_patterns'] or 'None'}")
+    print(f"Action: {config['action']}")
+    print("Leave any prompt blank to keep the current value.")
+
+    policy = input("Keeper policy (space-separated, most important first) > ").split()
+    unknown = [p for p in policy if p not in KEEPER_POLICIES]
+    if unknown:
+        print(f"Unknown policies ignored: {', '.join(unknown)}")
+    policy = [p for p in policy if p in KEEPER_POLICIES]
+    if policy:
+        config["keep_policy"] = policy
+
+    roots = input("Preferred roots (space-separated, 'clear' to remove) > ").strip()
+    if roots.lower() == "clear":
+        config["preferred_roots"] = []
+    elif roots:
+        config["preferred_roots"] = [
+            str(Path(r).expanduser().resolve()) for r in roots.split()
+        ]
+
+    patterns = input("Protect regexes (space-separated, 'clear' to remove) > ").strip()
+    if patterns.lower() == "clear":
+        config["protect_patterns"] = []
+    elif patterns:
+        valid = []
+        for rx in patterns.split():
+            try:
+                re.compile(rx)
+                valid.append(rx)
+            except re.error as e:
+                print(f"Invalid regex ignored: {rx} ({e})")
+        config["protect_patterns"] = valid
+
+    action = input("Action for duplicates (move/delete/link) > ").strip().lower()
+    if action in ("move", "delete", "link"):
+        config["action"] = action
+    elif action:
+        print(f"Unknown action ignored: {action}")
+
+    save_config()
+    logger.info(
+        f"Keeper policy set: {config['keep_policy']}, action: {config['action']}"
+    )
+    print("Keeper policy updated.")
+
+
 def show_educational_info():
-    """Displays help and educational information about jdupes."""
+    """Displays help and educational information about duplicate handling."""
     print("\n==================== HELP & LEARNING ====================")
-    print("This script automates the process of scanning directories for duplicate ")
-    print("files using the 'jdupes' tool, then safely moves duplicates into a ")
-    print("designated folder to help organize or remove them.\n")
-    print("Below are some pointers if you want to manage or run jdupes manually:")
-    print("---------------------------------------------------------")
-    print("1) Installing jdupes (Arch Linux):")
-    print("   sudo pacman -S jdupes")
-    print("")
-    print("2) Basic jdupes usage:")
-    print("   jdupes /path/to/dir1 /path/to/dir2")
-    print("   - This scans the specified directories for duplicates and displays them.")
+    print("This script scans directories for duplicate files and resolves them in")
+    print("bulk: one file per group is kept and the others are moved, deleted or")
+    print("linked according to your keeper policy.\n")
+    print("1) How duplicates are found (dupfinder.py, no external tools needed):")
+    print("   - Files are grouped by size; unique sizes are never read.")
+    print("   - Same-size files are compared by a hash of their first and last 4 KiB.")
+    print("   - Only the remaining candidates are hashed in full.")
+    print("   - Hashes are cached, so re-scanning an unchanged tree is fast.")
     print("")
-    print("3) Additional jdupes arguments:")
-    print("   - -r : recursive scan of subdirectories")
-    print("   - -L : hardlink duplicates instead of listing them")
-    print("   - -m : summarize certain output (varies by version)")
+    print("2) Keeper policy (option 4):")
+    print("   - preferred_roots, newest, oldest, largest, shortest_path, in order;")
+    print("     ties fall through to the next rule.")
+    print("   - protect_patterns (regexes) mark files that are never touched.")
     print("")
-    print("4) Manual duplicate cleanup:")
-    print("   - Move or remove identified duplicates at your discretion.")
-    print("   - Always verify crucial data backups before removal.")
+    print("3) Plans:")
+    print(f"   - Every scan writes {PLAN_FILE}, listing the keeper of each group")
+    print("     and what happens to the others. Review or edit it, then run it")
+    print("     now or later with option 5.")
+    print("   - The 'link' action keeps every path and reclaims the space instead:")
+    print("     duplicates become reflinks (btrfs/XFS) or hardlinks (elsewhere).")
     print("")
-    print("5) Encouraging Manual Review:")
-    print(
-        "   - You can safely run 'jdupes' with '-n' or '-X size+=5k' filters to refine which duplicates to consider."
-    )
-    print("   - Run 'man jdupes' or 'jdupes --help' to learn more advanced usage.")
+    print("4) Using jdupes instead (optional):")
+    print('   - Set "backend": "jdupes" in the config file to scan with jdupes.')
+    print("   - Install it on Arch Linux with: sudo pacman -S jdupes")
+    print("   - Without jdupes in PATH, the built-in scanner is used.")
     print("")
-    print("6) For advanced or custom workflows, integrate jdupes in scripts or use")
-    print("   the C library that jdupes provides. This wrapper is an example of how")
-    print("   to orchestrate jdupes results into automated actions.\n")
+    print("5) Always verify crucial data backups before deleting anything.\n")
     print("=========================================================\n")
     input("Press Enter to return to the main menu.")
 
 
 # -------------------------------------------------------------------
-# Duplicate Processing Functions
+# Duplicate Scanning Functions
 # -------------------------------------------------------------------
-def process_duplicate_group(group_files):
+def iter_jdupes_groups(scan_dirs):
     """
-    Processes a group of duplicate files. The first file is kept, others are handled.
+    Run jdupes and yield each duplicate group as soon as its terminating
+    blank line is printed, without buffering the whole output.
     """
-    if not group_files:
-        return
+    # -r: recursive, -A: print all sets without prompting, -o name: sort by name
+    cmd = ["jdupes", "-r", "-A", "-o", "name"] + scan_dirs
+    logger.info(f"Executing command: {' '.join(cmd)}")
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=stderr, text=True, bufsize=1
+        )
+        complete = False
+        try:
+            group = []
+            for line in proc.stdout:
+                if line.strip():
+                    group.append(line.strip())
+                    continue
+                if len(group) > 1:
+                    yield group
+                group = []
+            if len(group) > 1:
+                yield group
+            complete = True
+        finally:
+            if not complete:
+                proc.kill()
+            proc.stdout.close()
+            ret = proc.wait()
+            if complete and ret != 0:
+                stderr.seek(0)
+                logger.error(f"Error running jdupes (code {ret}): {stderr.read().strip()}")
+
+
+def iter_duplicate_groups(scan_dirs):
+    """Yield duplicate groups from the configured backend."""
+    if config.get("backend") == "jdupes":
+        if ensure_jdupes_installed():
+            yield from iter_jdupes_groups(scan_dirs)
+            return
+        logger.warning("Using the built-in scanner instead.")
+    for _, group in iter_duplicates(scan_dirs):
+        yield group
 
-    keep_file = Path(group_files[0]).expanduser().resolve()
-    logger.debug(f"Keeping file: {keep_file}")
 
-    duplicates_to_handle = group_files[1:]
-    if not duplicates_to_handle:
-        return
+# -------------------------------------------------------------------
+# Keeper Policies & Plans
+# -------------------------------------------------------------------
+def resolve_preferred_roots():
+    """The configured preferred roots as real paths; resolved once per plan."""
+    return [str(Path(r).expanduser().resolve()) for r in config.get("preferred_roots", [])]
+
+
+def _preferred_root_rank(path, roots):
+    """Index of the first of 'roots' containing 'path' (lower wins)."""
+    for rank, root in enumerate(roots):
+        if path == root or path.startswith(root.rstrip("/") + "/"):
+            return rank
+    return len(roots)
+
+
+# Sort keys (path, stat, resolved preferred roots): the file that sorts first
+# in a group is kept.
+KEEPER_POLICIES = {
+    "preferred_roots": lambda path, st, roots: _preferred_root_rank(path, roots),
+    "newest": lambda path, st, roots: -st.st_mtime_ns,
+    "oldest": lambda path, st, roots: st.st_mtime_ns,
+    "largest": lambda path, st, roots: -st.st_size,
+    "shortest_path": lambda path, st, roots: (len(path), path.count("/")),
+}
 
-    print(f"\nFound duplicates for: {keep_file}")
-    for i, dup_file in enumerate(duplicates_to_handle):
-        print(f"  {i+1}. {dup_file}")
 
-    print("\nHow would you like to handle these duplicates?")
-    print("1) Move to duplicates folder")
-    print("2) Delete permanently")
-    print("3) Skip (do nothing)")
-    choice = input("Select an option: ").strip()
+def protect_patterns():
+    """
+    Compiled protect_patterns from the config. Raises ValueError naming the
+    first invalid regex, since the config file may be edited by hand.
+    """
+    compiled = []
+    for rx in config.get("protect_patterns", []):
+        try:
+            compiled.append(re.compile(rx))
+        except (re.error, TypeError) as e:
+            raise ValueError(f"invalid protect pattern {rx!r}: {e}") from None
+    return compiled
 
-    if choice == "1":
-        move_duplicates(duplicates_to_handle)
-    elif choice == "2":
-        delete_duplicates(duplicates_to_handle)
-    elif choice == "3":
-        print("Skipping these duplicates.")
-    else:
-        print("Invalid choice. Skipping these duplicates.")
+
+def choose_keeper(group_files, policy, protect, roots):
+    """
+    Split a group into (keeper, to_handle, protected, stats) by the ordered
+    keeper policy; ties fall through to the next policy and finally to the
+    path. Files matching a 'protect' regex are never handled. 'roots' are
+    the preferred roots from resolve_preferred_roots().
+    """
+    stats = {}
+    for path in group_files:
+        try:
+            stats[path] = os.stat(path)
+        except OSError as e:
+            logger.warning(f"File vanished before planning (skipping): {path}: {e}")
+    if len(stats) < 2:
+        return None, [], [], stats
+    ranked = sorted(
+        stats,
+        key=lambda p: tuple(KEEPER_POLICIES[name](p, stats[p], roots) for name in policy) + (p,),
+    )
+    keeper = ranked[0]
+    protected = [p for p in ranked[1:] if any(rx.search(p) for rx in protect)]
+    to_handle = [p for p in ranked[1:] if p not in protected]
+    return keeper, to_handle, protected, stats
+
+
+def _fingerprint(st):
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _unchanged(path, recorded):
+    """True if 'path' still has the size and mtime recorded in the plan."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return "size" in recorded and _fingerprint(st) == {
+        "size": recorded["size"], "mtime_ns": recorded.get("mtime_ns")
+    }
+
+
+def _free_name(name, taken):
+    """First of name, 1_name, 2_name, ... not in 'taken' (which is updated)."""
+    candidate, count = name, 1
+    while candidate in taken:
+        candidate = f"{count}_{name}"
+        count += 1
+    taken.add(candidate)
+    return candidate
 
 
-def move_duplicates(files_to_move):
-    """Moves a list of files to the configured duplicates directory."""
+def build_plan(groups, action=None):
+    """
+    Apply the configured keeper policy to every group at once and return a
+    plan: which file each group keeps and where the others go. Destination
+    names are chosen against a single listing of the duplicates folder.
+    Every file's size and mtime are recorded so execute_plan can skip files
+    that changed since.
+    """
+    action = action or config.get("action", "move")
+    policy = [p for p in config.get("keep_policy", []) if p in KEEPER_POLICIES]
+    protect = protect_patterns()
+    roots = resolve_preferred_roots()
+    duplicates_dir = Path(config["duplicates_dir"]).expanduser().resolve()
+    try:
+        taken = set(os.listdir(duplicates_dir))
+    except OSError:
+        taken = set()
+
+    plan = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "action": action,
+        "duplicates_dir": str(duplicates_dir),
+        "keep_policy": policy,
+        "groups": [],
+    }
+    for group_files in groups:
+        group_files = [str(Path(p).expanduser().resolve()) for p in group_files]
+        keeper, to_handle, protected, stats = choose_keeper(group_files, policy, protect, roots)
+        if not to_handle:
+            continue
+        entries = []
+        for src in to_handle:
+            if src in already_moved:
+                continue
+            dest = None
+            if action == "move":
+                dest = str(duplicates_dir / _free_name(Path(src).name, taken))
+            entries.append({"src": src, "dest": dest, **_fingerprint(stats[src])})
+        if entries:
+            plan["groups"].append({
+                "keep": keeper,
+                "keep_stat": _fingerprint(stats[keeper]),
+                "handle": entries,
+                "protected": protected,
+            })
+    return plan
+
+
+def save_plan(plan, plan_file=PLAN_FILE):
+    """Write the plan as JSON so it can be reviewed or edited before running."""
+    with open(plan_file, "w") as f:
+        json.dump(plan, f, indent=2)
+    logger.info(f"Plan with {len(plan['groups'])} groups written to {plan_file}.")
+
+
+def load_plan(plan_file=PLAN_FILE):
+    with open(plan_file, "r") as f:
+        return json.load(f)
+
+
+def summarize_plan(plan):
+    files = [entry for group in plan["groups"] for entry in group["handle"]]
+    size = sum(entry.get("size", 0) for entry in files)
+    protected = sum(len(group["protected"]) for group in plan["groups"])
+    print(
+        f"\nPlan: {len(plan['groups'])} groups, {len(files)} files to {plan['action']} "
+        f"({size / (1024 * 1024):.1f} MiB), {protected} protected."
+    )
+
+
+# -------------------------------------------------------------------
+# Duplicate Processing Functions
+# -------------------------------------------------------------------
+def move_duplicates(entries):
+    """Moves plan entries ({"src", "dest"}) into the duplicates directory."""
     duplicates_dir = Path(config["duplicates_dir"]).expanduser().resolve()
     if not duplicates_dir.is_dir():
         logger.error(
@@ -322,76 +574,141 @@ def move_duplicates(files_to_move):
         print(
             f"ERROR: Duplicates directory '{duplicates_dir}' is invalid. Check config."
         )
-        return
-
-    for src_path_str in files_to_move:
-        src_path = Path(src_path_str).expanduser().resolve()
+        return 0
 
+    moved = 0
+    for entry in entries:
+        src_path = Path(entry["src"])
         if str(src_path) in already_moved:
             logger.info(f"Skipping (already moved): {src_path}")
             continue
-
         if not src_path.is_file():
             logger.warning(f"File not found or not a file (skipping): {src_path}")
-            print(f"WARNING: File does not exist (skipping): {src_path}")
             continue
 
-        filename = src_path.name
-        destination = duplicates_dir / filename
-
-        # Handle naming conflicts by appending a number
-        count = 1
-        while destination.exists():
-            destination = duplicates_dir / f"{count}_{filename}"
-            count += 1
-
+        destination = Path(entry["dest"])
+        if destination.exists():
+            # Only if something appeared there after the plan was made.
+            destination = destination.parent / _free_name(
+                destination.name, set(os.listdir(destination.parent))
+            )
         try:
-            src_path.rename(destination)  # atomic move
+            try:
+                src_path.rename(destination)  # atomic move
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.move(str(src_path), str(destination))
             already_moved.add(str(src_path))
+            moved += 1
             logger.info(f"Moved {src_path} -> {destination}")
-            print(f"Moved {src_path} -> {destination}")
         except Exception as e:
             logger.error(f"Failed to move {src_path}: {e}")
-            print(f"ERROR: Could not move {src_path}. Check logs for details.")
+    return moved
 
 
-def delete_duplicates(files_to_delete):
-    """Deletes a list of files permanently."""
-    confirm = (
-        input("Are you sure you want to PERMANENTLY DELETE these files? (yes/no): ")
-        .strip()
-        .lower()
-    )
-    if confirm != "yes":
-        print("Deletion cancelled.")
-        return
-
-    for file_path_str in files_to_delete:
-        file_path = Path(file_path_str).expanduser().resolve()
-
+def delete_duplicates(entries):
+    """Deletes plan entries permanently."""
+    deleted = 0
+    for entry in entries:
+        file_path = Path(entry["src"])
         if str(file_path) in already_moved:
             logger.info(f"Skipping deletion (already moved): {file_path}")
             continue
-
         if not file_path.is_file():
             logger.warning(
                 f"File not found or not a file (skipping deletion): {file_path}"
             )
-            print(f"WARNING: File does not exist (skipping deletion): {file_path}")
             continue
-
         try:
-            file_path.unlink()  # Delete the file
+            file_path.unlink()
             already_moved.add(str(file_path))  # Mark as processed
+            deleted += 1
             logger.info(f"Deleted {file_path}")
-            print(f"Deleted {file_path}")
         except Exception as e:
             logger.error(f"Failed to delete {file_path}: {e}")
-            print(f"ERROR: Could not delete {file_path}. Check logs for details.")
+    return deleted
+
+
+def link_duplicate_groups(groups):
+    """
+    Replaces duplicates with reflinks to their group's keeper (hardlinks on
+    filesystems without dedupe support); every path stays in place.
+    """
+    linked = 0
+    for group in groups:
+        sources = [
+            entry["src"] for entry in group["handle"] if Path(entry["src"]).is_file()
+        ]
+        for src, how in link_duplicates(group["keep"], sources).items():
+            if how:
+                linked += 1
+                logger.info(f"Linked ({how}) {src} -> {group['keep']}")
+            else:
+                logger.warning(f"Could not link {src} to {group['keep']}")
+    return linked
+
+
+def execute_plan(plan):
+    """
+    Runs every entry of a plan in one pass. A plan can be run long after it
+    was made, so a group is skipped when its keeper changed or is gone, and
+    so is any file whose size or mtime no longer match the plan.
+    """
+    groups = []
+    planned = 0
+    for group in plan["groups"]:
+        planned += len(group["handle"])
+        if not _unchanged(group["keep"], group.get("keep_stat", {})):
+            logger.warning(f"Keeper {group['keep']} changed or is gone; skipping its group.")
+            continue
+        handle = []
+        for entry in group["handle"]:
+            if _unchanged(entry["src"], entry):
+                handle.append(entry)
+            else:
+                logger.warning(f"Changed since planning (skipping): {entry['src']}")
+        if handle:
+            groups.append(dict(group, handle=handle))
+    entries = [entry for group in groups for entry in group["handle"]]
+    if plan["action"] == "link":
+        done = link_duplicate_groups(groups)
+    elif plan["action"] == "delete":
+        done = delete_duplicates(entries)
+    else:
+        done = move_duplicates(entries)
+    save_moved_files_log()
+    print(f"{plan['action'].capitalize().rstrip('e')}ed {done}/{planned} files.")
+    logger.info(f"Plan executed: {plan['action']} {done}/{planned} files.")
+
+
+def confirm_and_execute_plan(plan):
+    """Show the plan summary and ask once whether to run it."""
+    summarize_plan(plan)
+    if not plan["groups"]:
+        print("Nothing to do.")
+        return
+    prompt = f"Execute now (yes), or keep {PLAN_FILE} for review (no)? "
+    if plan["action"] == "delete":
+        prompt = f"PERMANENTLY DELETE these files now (yes), or keep {PLAN_FILE} for review (no)? "
+    if input(prompt).strip().lower() == "yes":
+        execute_plan(plan)
+    else:
+        print(f"Plan saved to {PLAN_FILE}. Run it later from the menu.")
+
+
+def run_saved_plan():
+    """Executes a previously saved (and possibly edited) plan file."""
+    try:
+        plan = load_plan()
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"ERROR: Could not read {PLAN_FILE}: {e}")
+        return
+    confirm_and_execute_plan(plan)
 
 
 def run_duplicate_scan_and_process():
-    """Runs jdupes and processes the found duplicates."""
+    """Scans the configured directories and plans duplicate handling in bulk."""
     scan_dirs = config["scan_directories"]
 
     if not scan_dirs:
@@ -409,39 +726,61 @@ def run_duplicate_scan_and_process():
             print(f"WARNING: Directory not found or inaccessible: {dir_path}\n")
             return
 
-    # Construct jdupes command
-    # -r: recursive, -A: print all sets without prompting, -o name: sort by name
-    cmd = ["jdupes", "-r", "-A", "-o", "name"] + scan_dirs
-    logger.info(f"Executing command: {'. '.join(cmd)}")
-    print("\nRunning jdupes for duplicates scan...")
-    print("(This may take a while depending on data size.)")
-
-    ret, stdout, stderr = run_command(cmd)
-
-    if ret != 0:
-        logger.error(f"Error running jdupes: {stderr.strip()}")
-        print(f"ERROR: jdupes command failed. Check logs for details.\n")
+    try:
+        protect_patterns()
+    except ValueError as e:
+        logger.error(f"Fix the config before scanning: {e}")
+        print(f"ERROR: {e}. Fix it with option 4 or in {CONFIG_FILE}.\n")
         return
 
-    lines = stdout.strip().splitlines()
-    current_duplicate_group = []
-    for line in lines:
-        if not line.strip():  # Blank line separates groups
-            if len(current_duplicate_group) > 1:
-                process_duplicate_group(current_duplicate_group)
-            current_duplicate_group = []
-        else:
-            current_duplicate_group.append(line.strip())
+    logger.info(f"Scanning for duplicates in: {', '.join(scan_dirs)}")
+    print("\nRunning duplicates scan...")
+    print("(This may take a while depending on data size.)")
 
-    # Process the last group if not empty
-    if len(current_duplicate_group) > 1:
-        process_duplicate_group(current_duplicate_group)
+    # The scan runs in a thread and hands groups over through a bounded
+    # queue, so planning starts with the first group; when planning
+    # falls behind, the full queue blocks the scan.
+    # If planning fails, 'stop' makes the scan give up instead of blocking
+    # on the full queue while holding its cache connection.
+    groups = queue.Queue(maxsize=GROUP_QUEUE_SIZE)
+    finished = object()
+    stop = threading.Event()
+
+    def hand_over(item):
+        while not stop.is_set():
+            try:
+                groups.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
 
-    print(
-        "\nDuplicate processing complete. Check log and duplicates folder for moved/deleted files.\n"
-    )
-    logger.info("jdupes scan and duplicate processing complete.")
-    save_moved_files_log()
+    def scan():
+        try:
+            with closing(iter_duplicate_groups(scan_dirs)) as found:
+                for group in found:
+                    if not hand_over(group):
+                        return
+        except Exception as e:
+            logger.error(f"Duplicate scan failed: {e}")
+        finally:
+            hand_over(finished)
+
+    def drain():
+        while True:
+            group = groups.get()
+            if group is finished:
+                return
+            yield group
+
+    threading.Thread(target=scan, name="duplicate-scan", daemon=True).start()
+    try:
+        plan = build_plan(drain())
+    finally:
+        stop.set()
+    save_plan(plan)
+    logger.info("Duplicate scan and planning complete.")
+    confirm_and_execute_plan(plan)
 
 
 # -------------------------------------------------------------------
@@ -449,7 +788,6 @@ def run_duplicate_scan_and_process():
 # -------------------------------------------------------------------
 def main():
     """Main script execution flow."""
-    ensure_jdupes_installed()
     load_config()
     load_moved_files_log()
 
@@ -462,8 +800,12 @@ def main():
         elif choice == "3":
             run_duplicate_scan_and_process()
         elif choice == "4":
-            show_educational_info()
+            configure_keeper_policy()
         elif choice == "5":
+            run_saved_plan()
+        elif choice == "6":
+            show_educational_info()
+        elif choice == "7":
             logger.info(f"Exiting {APP_NAME}. User requested exit.")
             print(f"\nExiting {APP_NAME}. Goodbye!\n")
             break
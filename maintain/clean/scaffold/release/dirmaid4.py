@@ -21,7 +21,8 @@ FEATURES:
 
 DEPENDENCIES (Arch-based):
 --------------------------
-- pacman or yay for system tools (jdupes, unrar, libarchive).
+- pacman or yay for system tools (unrar, libarchive).
+- dupfinder.py from maintain/clean for duplicate detection.
 - Python modules: rich, py7zr, rarfile, pyyaml.
 
 USAGE:
@@ -33,6 +34,7 @@ or
 """
 
 import os
+import sys
 import shutil
 import mimetypes
 import hashlib
@@ -52,6 +54,13 @@ from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt
 
+try:
+    from dupfinder import find_duplicates
+except ImportError:
+    # Running from the source tree: the engine lives in maintain/clean.
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from dupfinder import find_duplicates
+
 try:
     import yaml
 
@@ -145,7 +154,7 @@ def check_and_install_dependencies():
         )
         return
 
-    sys_packages = [("jdupes", "jdupes"), ("unrar", "unrar"), ("bsdtar", "libarchive")]
+    sys_packages = [("unrar", "unrar"), ("bsdtar", "libarchive")]
     for bin_name, pkg_name in sys_packages:
         if not shutil.which(bin_name):
             console.print(f"[bold yellow]Installing {pkg_name}...[/bold yellow]")
@@ -318,55 +327,33 @@ def dry_run(action, source, destination=None, extra=None):
 
 def find_and_handle_duplicates(directory):
     """
-    Uses jdupes to find duplicates, then prompts user for conflict resolution
-    for each discovered set.
+    Finds duplicates with the shared dupfinder engine, then prompts user for
+    conflict resolution for each discovered set.
     """
     dir_path = Path(directory)
     if not dir_path.is_dir():
         console.print(f"[bold red]{directory} invalid.[/bold red]")
         return
 
-    try:
-        cmd = ["jdupes", "-r", "-n", "-A", "-m", str(dir_path)]
-        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        if proc.returncode == 0 and proc.stdout:
-            lines = proc.stdout.strip().split("\n")
-            duplicates_blocks = []
-            block = []
-            for line in lines:
-                if not line.strip():
-                    if block:
-                        duplicates_blocks.append(block)
-                        block = []
-                else:
-                    block.append(line)
-            if block:
-                duplicates_blocks.append(block)
-
-            for block in duplicates_blocks:
-                if len(block) <= 1:
-                    continue
-                console.print("[bold green]Duplicate set found:[/bold green]")
-                for f in block:
-                    console.print(f"  {f}")
-                base_file = Path(block[0])
-                for dupf in block[1:]:
-                    new_file = Path(dupf)
-                    new_path = handle_duplicates_conflict(new_file, base_file)
-                    if new_path and new_path != new_file:
-                        try:
-                            new_file.rename(new_path)
-                            console.print(f"Moved => {new_path}")
-                        except Exception as e:
-                            console.print(f"[bold red]Rename error: {e}[/bold red]")
-        else:
-            console.print(
-                "[bold yellow]No duplicates or none found by jdupes.[/bold yellow]"
-            )
-    except FileNotFoundError:
-        console.print(
-            "[bold red]jdupes not installed. Install or implement fallback approach.[/bold red]"
-        )
+    duplicates_blocks = list(find_duplicates(dir_path).values())
+    if not duplicates_blocks:
+        console.print("[bold yellow]No duplicates found.[/bold yellow]")
+        return
+
+    for block in duplicates_blocks:
+        console.print("[bold green]Duplicate set found:[/bold green]")
+        for f in block:
+            console.print(f"  {f}")
+        base_file = Path(block[0])
+        for dupf in block[1:]:
+            new_file = Path(dupf)
+            new_path = handle_duplicates_conflict(new_file, base_file)
+            if new_path and new_path != new_file:
+                try:
+                    new_file.rename(new_path)
+                    console.print(f"Moved => {new_path}")
+                except Exception as e:
+                    console.print(f"[bold red]Rename error: {e}[/bold red]")
 
 
 ###############################################################################